@@ -0,0 +1,102 @@
+"""
+Attribute access and call overhead of SteamMarketLimited, against the previous __getattribute__ interception.
+
+Usage: python benchmarks/bench_attribute_access.py [--number 200000]
+"""
+import argparse
+import timeit
+from typing import Any, Callable, ClassVar, Tuple
+
+import requests
+from steampy.models import Currency, GameOptions
+
+from steam_inv_dumper.markets.steam.market import SteamMarketLimited
+
+
+class NoopLimiter:
+    def acquire(self) -> bool:
+        return True
+
+
+class CurrentMarket(SteamMarketLimited):
+    def fetch_price(self, item_hash_name: str, game: GameOptions, currency: str = "1") -> dict:
+        return {}
+
+
+class LegacyMarket(SteamMarketLimited):
+    """
+    Previous implementation: every attribute access goes through __getattribute__, and the intercepted methods
+    get a new rate limited closure at each access.
+    """
+
+    # Nothing wrapped at class creation, so that only __getattribute__ limits fetch_price.
+    rate_limited_methods: ClassVar[Tuple[str, ...]] = ()
+
+    def fetch_price(self, item_hash_name: str, game: GameOptions, currency: str = "1") -> dict:
+        return {}
+
+    def limiter_function(self, func: Callable) -> Callable:
+        def new_func(*args: Any, **kwargs: Any) -> Any:
+            self._rate_limiter.acquire()
+            out = func(*args, **kwargs)
+            return out
+
+        return new_func
+
+    def __getattribute__(self, item: str) -> Any:
+        attribute = super().__getattribute__(item)
+        try:
+            if (callable(attribute)) & (
+                attribute.__name__
+                in [
+                    "fetch_price",
+                    "fetch_price_history",
+                    "get_my_market_listings",
+                    "create_sell_order",
+                    "create_buy_order",
+                    "buy_item",
+                    "cancel_sell_order",
+                    "cancel_buy_order",
+                ]
+            ):
+                return self.limiter_function(attribute)
+            else:
+                return attribute
+        except AttributeError:
+            return attribute
+
+
+def build(cls: type) -> SteamMarketLimited:
+    return cls(
+        session=requests.Session(),
+        steamguard={"steamid": "7656"},
+        session_id="session",
+        currency=Currency.EURO,
+        rate_limiter=NoopLimiter(),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200_000, help="Iterations of each statement")
+    args = parser.parse_args()
+
+    statements = {
+        "plain attribute (_session)": "market._session",
+        "property (currency)": "market.currency",
+        "unlimited method call": "market._set_login_executed({}, 'session')",
+        "rate limited call (fetch_price)": "market.fetch_price('Case', None)",
+    }
+    print(f"{'statement':<34} {'before ns':>10} {'after ns':>10}")
+    for name, statement in statements.items():
+        before, after = (
+            min(timeit.repeat(statement, globals={"market": build(cls)}, number=args.number, repeat=5))
+            / args.number
+            * 1e9
+            for cls in (LegacyMarket, CurrentMarket)
+        )
+        print(f"{name:<34} {before:>10.1f} {after:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
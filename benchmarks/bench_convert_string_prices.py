@@ -0,0 +1,69 @@
+"""
+Micro-benchmark of convert_string_prices against the previous regex loop implementation.
+
+Usage: python benchmarks/bench_convert_string_prices.py [--number 20000]
+"""
+import argparse
+import re
+import timeit
+
+from steam_inv_dumper.utils.steam_prices_utils import (
+    _parse_price,
+    convert_string_prices,
+    convert_string_prices_batch,
+)
+
+PRICES = [
+    "2,42€",
+    "4,234.35 pуб.",
+    "1 234,56 pуб.",
+    "R$ 1.234,56",
+    "$1,234.56 USD",
+    "¥ 1,234",
+    "CHF 1'234.56",
+    "Rp 1 234 567",
+    "2.-- HK$",
+    "€ 2,31",
+]
+
+
+def legacy_convert_string_prices(price: str) -> int:
+    if not price:
+        return 0
+    price = str(price)
+    pattern = r"\D*(\d*)(\.|,)?(\d*)"
+
+    while True:
+        tokens = re.search(pattern, price, re.UNICODE)
+        # Every group of the pattern is optional, so it always matches.
+        assert tokens is not None
+        if len(tokens.group(3)) > 2:
+            price = price.replace(tokens.group(2), "")
+        else:
+            hundreds = int(tokens.group(1)) * 100
+            cents_as_string = tokens.group(3)
+            cents = int(cents_as_string) if cents_as_string else 0
+            return hundreds + cents
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000, help="Repetitions over the sample prices")
+    number = parser.parse_args().number
+    calls = number * len(PRICES)
+
+    parse_uncached = _parse_price.__wrapped__
+
+    cases = {
+        "legacy": lambda: [legacy_convert_string_prices(price) for price in PRICES],
+        "parser, uncached": lambda: [parse_uncached(price) for price in PRICES],
+        "parser, warm cache": lambda: [convert_string_prices(price) for price in PRICES],
+        "parser, batch": lambda: convert_string_prices_batch(PRICES),
+    }
+    for name, case in cases.items():
+        elapsed = timeit.timeit(case, number=number)
+        print(f"{name:<20} {elapsed * 1e9 / calls:8.0f} ns/price")
+
+
+if __name__ == "__main__":
+    main()
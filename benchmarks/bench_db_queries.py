@@ -0,0 +1,174 @@
+"""
+Latency of the hot database queries on a synthetic sales database, without and with the secondary indexes.
+
+Usage: python benchmarks/bench_db_queries.py [--events 1000000] [--repeat 20] [--path bench.sqlite]
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.engine import Engine
+
+from steam_inv_dumper.db.db import (
+    _DECL_BASE,
+    Event,
+    Item,
+    Listing,
+    listing_status_update,
+)
+from steam_inv_dumper.db.migrations import _create_missing_indexes
+
+SKUS = [f"Case {number}" for number in range(300)]
+ACCOUNTS = [f"account{number}" for number in range(12)]
+EVENTS_PER_LISTING = 2
+CHUNK = 50_000
+
+
+def populate(engine: Engine, n_events: int) -> int:
+    """
+    Fills the database with one item and one listing per EVENTS_PER_LISTING events.
+    :return: number of listings.
+    """
+    n_listings = n_events // EVENTS_PER_LISTING
+    start = datetime(2020, 1, 1)
+    random.seed(0)
+    with engine.begin() as connection:
+        connection.execute(text("PRAGMA synchronous=OFF"))
+        for offset in range(0, n_listings, CHUNK):
+            ids = range(offset, min(offset + CHUNK, n_listings))
+            connection.execute(
+                Item.__table__.insert(),
+                [
+                    {
+                        "account": ACCOUNTS[i % len(ACCOUNTS)],
+                        "amount": 1,
+                        "classid": "1",
+                        "item_id": str(i),
+                        "instanceid": "0",
+                        "market_hash_name": SKUS[i % len(SKUS)],
+                        "market_name": SKUS[i % len(SKUS)],
+                        "market_tradable_restriction": 7,
+                        "sold": i < n_listings * 0.9,
+                    }
+                    for i in ids
+                ],
+            )
+            connection.execute(
+                Listing.__table__.insert(),
+                [
+                    {
+                        "buyer_pay": 1499,
+                        "you_receive": 1304,
+                        "item_id": str(i),
+                        "listing_id": f"L{i}",
+                        "current_status": "ListingSold" if i < n_listings * 0.9 else "ListingCreated",
+                    }
+                    for i in ids
+                ],
+            )
+            connection.execute(
+                Event.__table__.insert(),
+                [
+                    {
+                        "listing_id": f"L{i}",
+                        "event_type": event_type,
+                        "event_datetime": start + timedelta(minutes=i + 60 * n),
+                        "steam_id_actor": "1",
+                        "time_event_fraction": 0,
+                    }
+                    for i in ids
+                    for n, event_type in enumerate(["ListingCreated", "ListingSold"][:EVENTS_PER_LISTING])
+                ],
+            )
+    return n_listings
+
+
+def queries(n_listings: int) -> Dict[str, Callable[[], object]]:
+    items = Item.__table__.c
+    listings = Listing.__table__.c
+    events = Event.__table__.c
+
+    def listing_ids(amount: int) -> List[str]:
+        return [f"L{random.randrange(n_listings)}" for _ in range(amount)]
+
+    return {
+        "items by market_hash_name, unsold": lambda: select([items.item_id]).where(
+            items.market_hash_name == random.choice(SKUS), items.sold.is_(False)
+        ),
+        "items by account, unsold": lambda: select([items.item_id]).where(
+            items.account == random.choice(ACCOUNTS), items.sold.is_(False)
+        ),
+        "listing by item_id and status": lambda: select([listings.id]).where(
+            listings.item_id == str(random.randrange(n_listings)), listings.current_status == "ListingCreated"
+        ),
+        "listings by status": lambda: select([listings.id]).where(listings.current_status == "ListingCreated"),
+        "events of a listing, latest first": lambda: select([events.event_type])
+        .where(events.listing_id == listing_ids(1)[0])
+        .order_by(events.event_datetime.desc()),
+        "sold events in a day": lambda: select([events.listing_id]).where(
+            events.event_type == "ListingSold",
+            events.event_datetime.between(datetime(2020, 6, 1), datetime(2020, 6, 2)),
+        ),
+        "status refresh of 100 listings": lambda: listing_status_update(listing_ids(100)),
+    }
+
+
+def measure(engine: Engine, n_listings: int, repeat: int) -> Dict[str, float]:
+    """
+    Median latency of each query, in milliseconds.
+    """
+    results = {}
+    with engine.connect() as connection:
+        for name, build_statement in queries(n_listings).items():
+            timings = []
+            for _ in range(repeat):
+                statement = build_statement()
+                transaction = connection.begin()
+                begin = time.perf_counter()
+                result = connection.execute(statement)
+                if result.returns_rows:
+                    result.fetchall()
+                timings.append((time.perf_counter() - begin) * 1000)
+                transaction.rollback()
+            results[name] = statistics.median(timings)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1_000_000, help="Number of events in the synthetic DB")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of each query")
+    parser.add_argument("--path", type=Path, default=None, help="sqlite file to create, defaults to a temp file")
+    args = parser.parse_args()
+
+    path = args.path or Path(tempfile.mkdtemp()) / "bench_sales.sqlite"
+    path.unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    _DECL_BASE.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in (Item.__table__, Listing.__table__, Event.__table__):
+            for index in table.indexes:
+                index.drop(bind=connection)
+
+    begin = time.perf_counter()
+    n_listings = populate(engine, args.events)
+    print(f"Populated {path} with {args.events} events in {time.perf_counter() - begin:.1f}s")
+
+    before = measure(engine, n_listings, args.repeat)
+    with engine.begin() as connection:
+        _create_missing_indexes(connection)
+    after = measure(engine, n_listings, args.repeat)
+
+    print(f"{'query':<36} {'before ms':>10} {'after ms':>10}")
+    for name in before:
+        print(f"{name:<36} {before[name]:>10.2f} {after[name]:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,121 @@
-from steam_inv_dumper.main import main
+import argparse
+import sys
+from datetime import date, datetime
+from typing import List, Optional
+
+# Names of db.reports.REPORTS and db.export.EXPORT_TABLES, repeated here to not import SQLAlchemy for --help.
+REPORT_NAMES = ("sales", "revenue", "active", "time-to-sell")
+EXPORT_TABLE_NAMES = ("items", "listings", "events")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="steam_inv_dumper", description="Sells Steam inventory items on the market.")
+    parser.add_argument("--config", default="config.json", help="path of the config file (default config.json)")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep running the sell loop, history sync, inventory refresh and heartbeat until SIGINT or SIGTERM",
+    )
+    parser.add_argument(
+        "--profile-imports",
+        action="store_true",
+        help="run under python -X importtime and print the time spent importing each package",
+    )
+    commands = parser.add_subparsers(dest="command", title="commands")
+    report = commands.add_parser(
+        "report",
+        help="print a report of the sales database as CSV",
+        description="Prints a report of the sales database as CSV. Amounts are in cents.",
+    )
+    report.add_argument(
+        "name",
+        choices=REPORT_NAMES,
+        help="sales: sold listings per item, revenue: sales per day, active: listings on the market, "
+        "time-to-sell: seconds from listing to sale per item",
+    )
+    report.add_argument("--account", help="only the items of this account (default all accounts)")
+    report.add_argument("--since", type=datetime.fromisoformat, help="only the rows since this date (YYYY-MM-DD)")
+    report.add_argument("--output", help="write to this .csv, .csv.gz or .parquet file instead of printing CSV")
+    analytics = commands.add_parser(
+        "analytics",
+        help="aggregate the new market events and print the analytics as CSV",
+        description="Aggregates the market events stored since the last run, then prints the analytics as CSV. "
+        "Amounts are in cents, lifetimes in seconds.",
+    )
+    analytics.add_argument(
+        "view",
+        choices=("skus", "daily"),
+        help="skus: received, sell-through, median lifetime and churn per item, daily: listing events per day and item",
+    )
+    analytics.add_argument("--account", help="only the items of this account (default all accounts)")
+    analytics.add_argument("--since", type=date.fromisoformat, help="first day included (YYYY-MM-DD)")
+    analytics.add_argument("--until", type=date.fromisoformat, help="first day excluded (YYYY-MM-DD)")
+    analytics.add_argument("--output", help="write to this .csv, .csv.gz or .parquet file instead of printing CSV")
+    export = commands.add_parser(
+        "export",
+        help="export the new rows of the sales database to Parquet or gzipped CSV files",
+        description="Exports the rows added to the tables since the last export into a file per table, named after "
+        "the ids exported. The last ids are kept in export_state.json in the output directory.",
+    )
+    export.add_argument("--output-dir", default="export", help="directory of the exported files (default export)")
+    export.add_argument(
+        "--tables", nargs="+", choices=EXPORT_TABLE_NAMES, help="tables to export (default items listings events)"
+    )
+    export.add_argument(
+        "--format", choices=("csv.gz", "parquet"), default="csv.gz", help="default csv.gz, parquet needs pyarrow"
+    )
+    export.add_argument("--full", action="store_true", help="export all the rows, not only the new ones")
+    backfill = commands.add_parser(
+        "backfill",
+        help="store the whole market history of the accounts",
+        description="Logs in and stores the whole market history of every account of the config, once. The sell "
+        "loops then only read the events newer than the last ones stored.",
+    )
+    backfill.add_argument("--account", help="only this account (default all accounts)")
+    return parser.parse_args(argv)
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.profile_imports:
+        from steam_inv_dumper.utils.import_profile import run_with_import_profile
+
+        return run_with_import_profile("steam_inv_dumper.cli", [arg for arg in argv if arg != "--profile-imports"])
+
+    # Imported here so that --help and --profile-imports do not pay for it.
+    from steam_inv_dumper.main import analytics, backfill, export, main, report
+
+    if args.command == "report":
+        report(
+            config_path=args.config,
+            name=args.name,
+            account=args.account,
+            since=args.since,
+            output=args.output or sys.stdout,
+        )
+        return 0
+    if args.command == "analytics":
+        analytics(
+            config_path=args.config,
+            view=args.view,
+            account=args.account,
+            since=args.since,
+            until=args.until,
+            output=args.output or sys.stdout,
+        )
+        return 0
+    if args.command == "export":
+        export(
+            config_path=args.config, output_dir=args.output_dir, tables=args.tables, format=args.format, full=args.full
+        )
+        return 0
+    if args.command == "backfill":
+        backfill(config_path=args.config, account=args.account)
+        return 0
+    main(config_path=args.config, daemon=args.daemon)
+    return 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(run())
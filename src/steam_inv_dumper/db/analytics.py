@@ -0,0 +1,283 @@
+import logging
+import statistics
+from collections import defaultdict
+from dataclasses import astuple, dataclass, fields
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, select, update
+
+from steam_inv_dumper.db.db import (
+    AnalyticsDaily,
+    AnalyticsWatermark,
+    Database,
+    Event,
+    Item,
+    Listing,
+    ListingLifetime,
+)
+from steam_inv_dumper.utils.data_structures import MarketEventTypes
+from steam_inv_dumper.utils.tabular_writers import TableOutput, write_table
+
+logger = logging.getLogger(__name__)
+
+_items = Item.__table__
+_listings = Listing.__table__
+_events = Event.__table__
+_daily = AnalyticsDaily.__table__
+_lifetimes = ListingLifetime.__table__
+
+# Counter of analytics_daily incremented by each event type.
+_COUNTERS = {
+    MarketEventTypes.ListingCreated.name: "created",
+    MarketEventTypes.ListingSold.name: "sold",
+    MarketEventTypes.ListingCancelled.name: "cancelled",
+}
+# (account, market_hash_name, day)
+DailyKey = Tuple[str, str, date]
+
+
+@dataclass
+class SkuAnalytics:
+    market_hash_name: str
+    listings_created: int
+    listings_sold: int
+    listings_cancelled: int
+    # Cents received for the listings sold.
+    you_receive: int
+    # Listings sold per listing created.
+    sell_through: Optional[float]
+    # Listings cancelled per listing created.
+    churn: Optional[float]
+    median_lifetime_seconds: Optional[float]
+
+
+def _ratio(numerator: int, denominator: int) -> Optional[float]:
+    return numerator / denominator if denominator else None
+
+
+class Analytics:
+    """
+    Profit, sell-through, listing lifetime and relist churn per item, over any window of days.
+    Events are aggregated once into analytics_daily and listing_lifetimes: update only reads the events newer than
+    the watermark of the previous update, and the reports only read the aggregates.
+    Events whose item is not stored yet, and sales whose creation is not stored yet, hold the watermark back, so that
+    later updates aggregate them once complete. Past retry_window before the newest event, they are aggregated as
+    they are: for the account and item "", and sales without a lifetime.
+    """
+
+    WATERMARK = "events"
+    DAILY_COLUMNS = ["day", "account", "market_hash_name", "created", "sold", "cancelled", "you_receive"]
+
+    def __init__(self, database: Database, retry_window: timedelta = timedelta(days=1)) -> None:
+        self.database = database
+        self.retry_window = retry_window
+
+    @property
+    def _session(self) -> Any:
+        return self.database.AnalyticsDaily.query.session
+
+    def _watermark(self) -> AnalyticsWatermark:
+        watermark = AnalyticsWatermark.query.filter(AnalyticsWatermark.name == self.WATERMARK).first()
+        if watermark is None:
+            watermark = AnalyticsWatermark(name=self.WATERMARK, last_event_id=0)
+            self._session.add(watermark)
+        return watermark
+
+    def _new_events(self, after_id: int) -> Any:
+        created = _events.alias("created")
+        return (
+            select(
+                [
+                    _events.c.id,
+                    _events.c.event_type,
+                    _events.c.event_datetime,
+                    _events.c.listing_id,
+                    _items.c.item_id,
+                    func.coalesce(_items.c.account, "").label("account"),
+                    func.coalesce(_items.c.market_hash_name, "").label("market_hash_name"),
+                    func.coalesce(_listings.c.you_receive, 0).label("you_receive"),
+                    created.c.event_datetime.label("created_at"),
+                ]
+            )
+            .select_from(
+                _events.outerjoin(_listings, _events.c.listing_id == _listings.c.listing_id)
+                .outerjoin(_items, _listings.c.item_id == _items.c.item_id)
+                .outerjoin(
+                    created,
+                    (created.c.listing_id == _events.c.listing_id)
+                    & (created.c.event_type == MarketEventTypes.ListingCreated.name),
+                )
+            )
+            .where(_events.c.id > after_id)
+            .order_by(_events.c.id)
+        )
+
+    def _add_to_daily(self, counters: Dict[DailyKey, Dict[str, int]]) -> None:
+        for (account, market_hash_name, day), values in counters.items():
+            key = and_(_daily.c.account == account, _daily.c.market_hash_name == market_hash_name, _daily.c.day == day)
+            increments = {column: _daily.c[column] + value for column, value in values.items()}
+            if self._session.execute(update(_daily).where(key).values(**increments)).rowcount == 0:
+                self._session.execute(
+                    insert(_daily).values(account=account, market_hash_name=market_hash_name, day=day, **values)
+                )
+
+    def update(self, chunk_size: int = 5000) -> int:
+        """
+        Aggregates the events stored since the last update, in a single transaction.
+        :return: number of events aggregated.
+        """
+        with self.database.transaction():
+            watermark = self._watermark()
+            counters: Dict[DailyKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+            lifetimes = []
+            processed = 0
+            retry_since = self._retry_since()
+            result = self._session.execute(self._new_events(watermark.last_event_id))
+            for row in (row for rows in result.partitions(chunk_size) for row in rows):
+                column = _COUNTERS.get(row.event_type)
+                incomplete = column is not None and (
+                    row.item_id is None or (column == "sold" and row.created_at is None)
+                )
+                if incomplete and retry_since is not None and row.event_datetime >= retry_since:
+                    logger.debug(f"Market event {row.id} waits for its listing, keeping the events from it")
+                    result.close()
+                    break
+                processed += 1
+                watermark.last_event_id = row.id
+                if column is None:
+                    continue
+                day = row.event_datetime.date()
+                key = (row.account, row.market_hash_name, day)
+                counters[key][column] += 1
+                if column == "sold":
+                    counters[key]["you_receive"] += row.you_receive
+                    if row.created_at is not None:
+                        lifetimes.append(
+                            dict(
+                                listing_id=row.listing_id,
+                                account=row.account,
+                                market_hash_name=row.market_hash_name,
+                                sold_day=day,
+                                seconds=(row.event_datetime - row.created_at).total_seconds(),
+                            )
+                        )
+            self._add_to_daily(counters)
+            ListingLifetime.bulk_insert_ignore(lifetimes)
+            self._session.flush()
+        logger.debug(f"Aggregated {processed} market events")
+        return processed
+
+    def _retry_since(self) -> Optional[datetime]:
+        """
+        Incomplete events at or after this datetime are held back. None if no event is stored.
+        """
+        newest = self._session.execute(select([func.max(_events.c.event_datetime)])).scalar()
+        return newest - self.retry_window if newest is not None else None
+
+    @staticmethod
+    def _window(
+        statement: Any, day_column: Any, account: Optional[str], since: Optional[date], until: Optional[date]
+    ) -> Any:
+        """
+        Restricts the statement to an account and to the days from since (included) to until (excluded).
+        """
+        if account is not None:
+            statement = statement.where(day_column.table.c.account == account)
+        if since is not None:
+            statement = statement.where(day_column >= since)
+        if until is not None:
+            statement = statement.where(day_column < until)
+        return statement
+
+    def _median_lifetimes(
+        self, account: Optional[str], since: Optional[date], until: Optional[date]
+    ) -> Dict[str, float]:
+        statement = self._window(
+            select([_lifetimes.c.market_hash_name, _lifetimes.c.seconds]), _lifetimes.c.sold_day, account, since, until
+        )
+        seconds: Dict[str, List[float]] = defaultdict(list)
+        for market_hash_name, lifetime in self._session.execute(statement):
+            seconds[market_hash_name].append(lifetime)
+        return {market_hash_name: statistics.median(values) for market_hash_name, values in seconds.items()}
+
+    def sku_summary(
+        self, account: Optional[str] = None, since: Optional[date] = None, until: Optional[date] = None
+    ) -> List[SkuAnalytics]:
+        """
+        Analytics per item over the days from since (included) to until (excluded), most received first.
+        :param account: only the items of this account. All accounts if None.
+        """
+        statement = self._window(
+            select(
+                [
+                    _daily.c.market_hash_name,
+                    func.sum(_daily.c.created),
+                    func.sum(_daily.c.sold),
+                    func.sum(_daily.c.cancelled),
+                    func.sum(_daily.c.you_receive),
+                ]
+            )
+            .group_by(_daily.c.market_hash_name)
+            .order_by(func.sum(_daily.c.you_receive).desc(), _daily.c.market_hash_name),
+            _daily.c.day,
+            account,
+            since,
+            until,
+        )
+        medians = self._median_lifetimes(account, since, until)
+        return [
+            SkuAnalytics(
+                market_hash_name=market_hash_name,
+                listings_created=created,
+                listings_sold=sold,
+                listings_cancelled=cancelled,
+                you_receive=you_receive,
+                sell_through=_ratio(sold, created),
+                churn=_ratio(cancelled, created),
+                median_lifetime_seconds=medians.get(market_hash_name),
+            )
+            for market_hash_name, created, sold, cancelled, you_receive in self._session.execute(statement)
+        ]
+
+    def daily(
+        self, account: Optional[str] = None, since: Optional[date] = None, until: Optional[date] = None
+    ) -> Iterator[Tuple]:
+        """
+        Counters per day and item, oldest first, in the order of DAILY_COLUMNS.
+        """
+        statement = self._window(
+            select([_daily.c[column] for column in self.DAILY_COLUMNS]).order_by(
+                _daily.c.day, _daily.c.account, _daily.c.market_hash_name
+            ),
+            _daily.c.day,
+            account,
+            since,
+            until,
+        )
+        for row in self._session.execute(statement):
+            yield tuple(row)
+
+    def export(
+        self,
+        output: TableOutput,
+        view: str = "skus",
+        account: Optional[str] = None,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        format: Optional[str] = None,
+    ) -> int:
+        """
+        Writes a view of the analytics as CSV or Parquet.
+        :param output: path of the file (format from its suffix), or an open text file for CSV.
+        :param view: "skus" for sku_summary, "daily" for daily.
+        :return: number of rows written.
+        """
+        if view == "skus":
+            columns = [field.name for field in fields(SkuAnalytics)]
+            rows: Any = (astuple(sku) for sku in self.sku_summary(account=account, since=since, until=until))
+        elif view == "daily":
+            columns, rows = self.DAILY_COLUMNS, self.daily(account=account, since=since, until=until)
+        else:
+            raise ValueError(f"Unknown analytics view {view}")
+        return write_table(output, columns, rows, format=format)
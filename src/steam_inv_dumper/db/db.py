@@ -1,23 +1,49 @@
+import json
 import logging
-from typing import Any, List, Optional, Type, TypeVar
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from sqlalchemy import (
     Boolean,
     Column,
+    Date,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     String,
+    Text,
     UniqueConstraint,
-    case,
     create_engine,
     desc,
+    event,
     func,
+    insert,
+    inspect,
     select,
+    tuple_,
+    update,
 )
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import Query, aliased, relationship, scoped_session, sessionmaker
+from sqlalchemy.orm import Query, relationship, scoped_session, sessionmaker, synonym
 from sqlalchemy.pool import StaticPool
 
 from steam_inv_dumper.utils.data_structures import (
@@ -26,6 +52,7 @@ from steam_inv_dumper.utils.data_structures import (
     MarketEventTypes,
     MyMarketListing,
 )
+from steam_inv_dumper.utils.price_cache import CachedPriceEntry, PriceKey
 
 logger = logging.getLogger(__name__)
 _DECL_BASE: Any = declarative_base()
@@ -34,6 +61,91 @@ _DB_URL = "sqlite:///sales.sqlite"
 L = TypeVar("L", bound="Listing")
 I = TypeVar("I", bound="Item")
 E = TypeVar("E", bound="Event")
+# Older SQLite builds allow at most 999 bound parameters per statement.
+_MAX_BOUND_PARAMETERS = 500
+
+
+@dataclass
+class BulkInsertResult:
+    inserted: int
+    skipped: int
+
+
+def _chunked(values: Sequence, size: int = _MAX_BOUND_PARAMETERS) -> Iterator[Sequence]:
+    """
+    Splits values in chunks small enough to be bound in a single IN clause.
+    """
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def _insert_ignore(table: Any, dialect_name: str) -> Any:
+    """
+    INSERT statement which skips the rows violating a unique constraint, where the dialect supports it.
+    :param table: Table to insert into
+    :param dialect_name: name of the dialect of the engine.
+    """
+    if dialect_name == "sqlite":
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect_name == "postgresql":
+        return postgresql_insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+def _bulk_insert_ignore(model: Any, rows: List[dict]) -> int:
+    """
+    Inserts the rows with multi-row INSERT statements, skipping the ones violating a unique constraint.
+    A statement is executed per chunk of rows rather than an executemany, whose rowcount is not reliable on every
+    driver, and each chunk binds at most _MAX_BOUND_PARAMETERS values.
+    :param model: model of the table to insert into.
+    :param rows: dicts of column values, all with the same keys.
+    :return: number of rows inserted.
+    """
+    if not rows:
+        return 0
+    session = model.query.session
+    session.flush()
+    statement = _insert_ignore(model.__table__, session.get_bind().dialect.name)
+    rows_per_statement = max(1, _MAX_BOUND_PARAMETERS // len(rows[0]))
+    return sum(session.execute(statement.values(list(chunk))).rowcount for chunk in _chunked(rows, rows_per_statement))
+
+
+# PRAGMAs applied to every new SQLite connection. Values of cache_size are in KiB when negative.
+SQLITE_PROFILES: Dict[str, dict] = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def _sqlite_pragmas(profile: Union[str, dict]) -> dict:
+    """
+    PRAGMAs of a sqlite profile.
+    :param profile: name of a profile in SQLITE_PROFILES, or a dict of PRAGMA names and values.
+    """
+    if isinstance(profile, dict):
+        return profile
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown sqlite profile {profile}, choose one of {list(SQLITE_PROFILES)}")
+    return SQLITE_PROFILES[profile]
+
+
+def _set_sqlite_pragmas(engine: Any, pragmas: dict) -> None:
+    """
+    Registers a connect hook applying the PRAGMAs to every connection of the engine.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
 
 
 class Database:
@@ -44,7 +156,9 @@ class Database:
 
         schema = "test_steam" if config.get("debug", True) is True else "prod_steam"
 
-        kwargs = {"connect_args": {"options": f"-csearch_path={schema}"}}
+        kwargs: dict = {}
+        if db_url.startswith("postgresql"):
+            kwargs["connect_args"] = {"options": f"-csearch_path={schema}"}
 
         if db_url == "sqlite://":
             kwargs.update(
@@ -55,6 +169,8 @@ class Database:
                 }
             )
         self.engine = create_engine(db_url, encoding="utf-8", **kwargs)  # echo=True for debugging
+        if self.engine.dialect.name == "sqlite":
+            _set_sqlite_pragmas(self.engine, _sqlite_pragmas(config.get("sqlite_profile", "default")))
         self.base = _DECL_BASE
 
         self.session = sessionmaker(bind=self.engine, autoflush=True, autocommit=True)
@@ -63,11 +179,49 @@ class Database:
         Listing.query = Item._session.query_property()
         Item.query = Item._session.query_property()
         Event.query = Item._session.query_property()
+        MarketHistoryCursor.query = Item._session.query_property()
+        CachedPrice.query = Item._session.query_property()
+        AnalyticsDaily.query = Item._session.query_property()
+        ListingLifetime.query = Item._session.query_property()
+        AnalyticsWatermark.query = Item._session.query_property()
         self.Listing = Listing
         self.Item = Item
         self.Event = Event
+        self.MarketHistoryCursor = MarketHistoryCursor
+        self.CachedPrice = CachedPrice
+        self.AnalyticsDaily = AnalyticsDaily
+        self.ListingLifetime = ListingLifetime
+        self.AnalyticsWatermark = AnalyticsWatermark
 
+        is_new_database = not inspect(self.engine).has_table(Item.__tablename__)
         self.base.metadata.create_all(self.engine)
+        # Imported here, as migrations need the models defined in this module.
+        from steam_inv_dumper.db.migrations import run_migrations
+
+        run_migrations(self.engine, is_new_database=is_new_database)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Runs the block in a single transaction, committed at the end or rolled back on error.
+        Flushes inside the block are not committed one by one.
+        """
+        session = Item._session()
+        if session.in_transaction():
+            yield
+            return
+        with session.begin():
+            yield
+
+
+class SchemaVersion(_DECL_BASE):
+    """
+    Version of the schema of the database, as applied by the migrations.
+    """
+
+    __tablename__ = "schema_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
 
 
 class Item(_DECL_BASE):
@@ -77,6 +231,11 @@ class Item(_DECL_BASE):
     """
 
     __tablename__ = "items"
+    __table_args__ = (
+        Index("ix_items_market_hash_name_sold", "market_hash_name", "sold"),
+        Index("ix_items_account_sold", "account", "sold"),
+        Index("ix_items_sold", "sold"),
+    )
     id = Column(Integer, primary_key=True)
     # Account is the only column not in Item dataclass
     account = Column(String, nullable=False, default="")
@@ -129,6 +288,43 @@ class Item(_DECL_BASE):
             filters.append(Item.item_id == item_id)
         return Item.query.filter(*filters)
 
+    @staticmethod
+    def existing_item_ids(item_ids: Iterable[str]) -> Set[str]:
+        """
+        Returns the item_ids already stored, querying them in chunks.
+        :param item_ids: item_ids to check for
+        """
+        item_ids = list(set(item_ids))
+        existing: Set[str] = set()
+        for chunk in _chunked(item_ids):
+            rows = Item.query.with_entities(Item.item_id).filter(Item.item_id.in_(chunk))
+            existing.update(row.item_id for row in rows)
+        return existing
+
+    @staticmethod
+    def bulk_insert_ignore(rows: List[dict]) -> int:
+        """
+        Inserts the rows in multi-row statements, skipping item_ids already stored.
+        :param rows: dicts of column values.
+        :return: number of rows inserted.
+        """
+        return _bulk_insert_ignore(Item, rows)
+
+    @staticmethod
+    def mark_sold(item_ids: Iterable[str]) -> int:
+        """
+        Sets the items as sold, with one UPDATE per chunk of item_ids.
+        :param item_ids: item_ids of the sold items.
+        :return: number of rows updated.
+        """
+        item_ids = list(set(item_ids))
+        updated = 0
+        for chunk in _chunked(item_ids):
+            updated += Item.query.filter(Item.item_id.in_(chunk), Item.sold.is_(False)).update(
+                {Item.sold: True}, synchronize_session="evaluate"
+            )
+        return updated
+
     def to_json(self) -> dict:
         return {i: k for i, k in vars(self).items() if (not i.startswith("_") and i != "id")}
 
@@ -154,7 +350,10 @@ class Listing(_DECL_BASE):
     """
 
     __tablename__ = "listings"
-    __table_args__ = (UniqueConstraint("item_id", "listing_id", name="_itemid_sold_onsale"),)
+    __table_args__ = (
+        UniqueConstraint("item_id", "listing_id", name="_itemid_sold_onsale"),
+        Index("ix_listings_item_id_current_status", "item_id", "current_status"),
+    )
 
     id = Column(Integer, nullable=False, primary_key=True, autoincrement=True)
     buyer_pay = Column(Integer, nullable=False)
@@ -167,63 +366,64 @@ class Listing(_DECL_BASE):
         "Event", back_populates="listing", cascade="all,delete-orphan", order_by="desc(Event.event_datetime)"
     )
 
+    # Status of the latest event of the listing, kept up to date whenever an Event is inserted.
+    current_status = Column(String, nullable=False, default=MarketEventTypes.ListingCreated.name, index=True)
+    status_changed_at = Column(DateTime, nullable=True)
+    listing_status = synonym("current_status")
+
     def to_json(self) -> dict:
         return {i: k for i, k in vars(self).items() if not i.startswith("_")}
 
-    @hybrid_property
-    def listing_status(self):
-        if self.events:
-            return self.events[0].event_type
-        return "ListingCreated"
-
-    @listing_status.expression
-    def listing_status(cls):
-        return (
-            select([Event.event_type])
-            .where(Event.listing_id == cls.listing_id)
-            .order_by(Event.event_datetime.desc())
-            .limit(1)
-            .as_scalar()
-        )
-
     @staticmethod
     def query_ref(
         item_id: Optional[str] = None,
         listing_status: Optional[List[str]] = None,
+        account: Optional[str] = None,
     ) -> Query:
         """
         Get all currently active locks for this pair
         :param listing_status: Listing Statuses
         :param item_id: Itemid to Check for
+        :param account: only the listings of the items of this account
         :rtype: object
 
         """
         filters = []
-        # Define a subquery to compute the listing_status
-        listing_status_subquery = (
-            select(
-                [
-                    Listing.id,
-                    case([(Event.event_type.isnot(None), Event.event_type)], else_="ListingCreated").label(
-                        "computed_listing_status"
-                    ),
-                ]
-            )
-            .outerjoin(Event)
-            .group_by(Listing.id, Event.event_type)
-            .subquery()
-        )
-        # Use the subquery in your main query and filter by computed_listing_status
-        subq = aliased(listing_status_subquery)
-        query = Listing.query.join(subq, Listing.id == subq.c.id)
-
+        if account is not None:
+            filters.append(Listing.item.has(Item.account == account))
         if listing_status is not None:
             if any(status not in list(a.name for a in MarketEventTypes) for status in listing_status):
                 raise ValueError("Invalid Listing Status")
-            filters.append(subq.c.computed_listing_status.in_(listing_status))
+            filters.append(Listing.current_status.in_(listing_status))
         if item_id:
             filters.append(Listing.item_id == item_id)
-        return query.filter(*filters).order_by(Listing.id.desc())
+        return Listing.query.filter(*filters).order_by(Listing.id.desc())
+
+    @staticmethod
+    def existing_listing_ids(listing_ids: Iterable[str]) -> Set[str]:
+        """
+        Returns the listing_ids already stored, querying them in chunks.
+        :param listing_ids: listing_ids to check for
+        """
+        listing_ids = list(set(listing_ids))
+        existing: Set[str] = set()
+        for chunk in _chunked(listing_ids):
+            rows = Listing.query.with_entities(Listing.listing_id).filter(Listing.listing_id.in_(chunk))
+            existing.update(row.listing_id for row in rows)
+        return existing
+
+    @staticmethod
+    def refresh_status(listing_ids: Optional[Iterable[str]] = None) -> None:
+        """
+        Recomputes current_status and status_changed_at from the events of the listings.
+        :param listing_ids: listings to refresh. All of them if None.
+        """
+        session = Listing.query.session
+        if listing_ids is None:
+            session.execute(listing_status_update())
+            return
+        for chunk in _chunked(list(set(listing_ids))):
+            session.execute(listing_status_update(chunk))
 
     def __repr__(self) -> str:
         return str(self.to_json())
@@ -235,6 +435,7 @@ class Listing(_DECL_BASE):
             buyer_pay=my_listing.buyer_pay,
             you_receive=my_listing.you_receive,
             item_id=my_listing.description.item_id,
+            current_status=listing_status,
         )
 
 
@@ -251,7 +452,11 @@ class Event(_DECL_BASE):
     """
 
     __tablename__ = "events"
-    __table_args__ = (UniqueConstraint("listing_id", "event_type", name="_listing_event"),)
+    __table_args__ = (
+        UniqueConstraint("listing_id", "event_type", name="_listing_event"),
+        Index("ix_events_listing_id_event_datetime", "listing_id", "event_datetime"),
+        Index("ix_events_event_type_event_datetime", "event_type", "event_datetime"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     event_datetime = Column(DateTime, default=func.current_timestamp(), nullable=False)
     event_type = Column(String, nullable=False)
@@ -283,12 +488,38 @@ class Event(_DECL_BASE):
             filters.append(Event.event_type == event_type)
         return Event.query.filter(*filters).order_by(desc("event_datetime"))
 
+    @staticmethod
+    def existing_event_types(listing_ids: Iterable[str]) -> Set[Tuple[str, str]]:
+        """
+        Returns the (listing_id, event_type) pairs already stored for the listings, querying them in chunks.
+        :param listing_ids: listing_ids to check for
+        """
+        listing_ids = list(set(listing_ids))
+        existing: Set[Tuple[str, str]] = set()
+        for chunk in _chunked(listing_ids):
+            rows = Event.query.with_entities(Event.listing_id, Event.event_type).filter(Event.listing_id.in_(chunk))
+            existing.update((row.listing_id, row.event_type) for row in rows)
+        return existing
+
+    @staticmethod
+    def bulk_insert_ignore(rows: List[dict]) -> int:
+        """
+        Inserts the rows in multi-row statements, skipping the (listing_id, event_type) pairs already stored.
+        Listing statuses are not refreshed, see Listing.refresh_status.
+        :param rows: dicts of column values.
+        :return: number of rows inserted.
+        """
+        return _bulk_insert_ignore(Event, rows)
+
     def __repr__(self) -> str:
         return str(self.to_json())
 
-    @classmethod
-    def from_market_event(cls, market_event: MarketEvent) -> "Event":
-        return cls(
+    @staticmethod
+    def values_from_market_event(market_event: MarketEvent) -> dict:
+        """
+        Column values of the Event for a MarketEvent dataclass
+        """
+        return dict(
             listing_id=market_event.listingid,
             purchase_id=market_event.purchaseid,
             event_type=market_event.event_type.name,
@@ -296,3 +527,198 @@ class Event(_DECL_BASE):
             time_event_fraction=market_event.time_event_fraction,
             steam_id_actor=market_event.steamid_actor,
         )
+
+    @classmethod
+    def from_market_event(cls, market_event: MarketEvent) -> "Event":
+        return cls(**cls.values_from_market_event(market_event))
+
+
+class MarketHistoryCursor(_DECL_BASE):
+    """
+    Newest market history event ingested for each account.
+    Market history is synced incrementally from here.
+    """
+
+    __tablename__ = "market_history_cursors"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    account = Column(String, nullable=False, unique=True)
+    event_datetime = Column(DateTime, nullable=False)
+    time_event_fraction = Column(Integer, nullable=False)
+
+    @staticmethod
+    def get(account: str) -> Optional[Tuple[datetime, int]]:
+        """
+        Newest event ingested for the account, as (event_datetime, time_event_fraction). None if never synced.
+        :param account: name of the account
+        """
+        cursor = MarketHistoryCursor.query.filter(MarketHistoryCursor.account == account).first()
+        if cursor is None:
+            return None
+        return cursor.event_datetime, cursor.time_event_fraction
+
+    @staticmethod
+    def advance(account: str, market_events: List[MarketEvent]) -> None:
+        """
+        Moves the cursor of the account to the newest of the events, if newer than the current one.
+        :param account: name of the account
+        :param market_events: events just ingested.
+        """
+        if not market_events:
+            return
+        newest = max((event.event_datetime, event.time_event_fraction) for event in market_events)
+        cursor = MarketHistoryCursor.query.filter(MarketHistoryCursor.account == account).first()
+        if cursor is None:
+            cursor = MarketHistoryCursor(account=account)
+            MarketHistoryCursor.query.session.add(cursor)
+        elif (cursor.event_datetime, cursor.time_event_fraction) >= newest:
+            return
+        cursor.event_datetime, cursor.time_event_fraction = newest
+        MarketHistoryCursor.query.session.flush()
+
+
+class CachedPrice(_DECL_BASE):
+    """
+    Last priceoverview response of each item, so that the price cache survives restarts.
+    """
+
+    __tablename__ = "price_cache"
+    __table_args__ = (
+        UniqueConstraint("market_hash_name", "currency", name="uq_price_cache_market_hash_name_currency"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    market_hash_name = Column(String, nullable=False)
+    currency = Column(String, nullable=False)
+    price_data = Column(Text, nullable=False)
+    # Unix timestamp
+    fetched_at = Column(Float, nullable=False)
+
+    @staticmethod
+    def load(since: float) -> List[Tuple[PriceKey, CachedPriceEntry]]:
+        """
+        :param since: oldest fetched_at to load.
+        """
+        prices = CachedPrice.query.filter(CachedPrice.fetched_at >= since).all()
+        return [
+            (
+                (price.market_hash_name, price.currency),
+                CachedPriceEntry(price_data=json.loads(price.price_data), fetched_at=price.fetched_at),
+            )
+            for price in prices
+        ]
+
+    @staticmethod
+    def save(entries: Dict[PriceKey, CachedPriceEntry]) -> None:
+        """
+        Replaces the stored prices of the entries.
+        """
+        session = CachedPrice.query.session
+        for keys in _chunked(list(entries), _MAX_BOUND_PARAMETERS // 2):
+            CachedPrice.query.filter(tuple_(CachedPrice.market_hash_name, CachedPrice.currency).in_(keys)).delete(
+                synchronize_session=False
+            )
+        session.bulk_insert_mappings(
+            CachedPrice,
+            [
+                {
+                    "market_hash_name": market_hash_name,
+                    "currency": currency,
+                    "price_data": json.dumps(entry.price_data),
+                    "fetched_at": entry.fetched_at,
+                }
+                for (market_hash_name, currency), entry in entries.items()
+            ],
+        )
+        session.flush()
+
+
+class AnalyticsDaily(_DECL_BASE):
+    """
+    Listing events counted per account, item and day, kept up to date incrementally by db.analytics.
+    """
+
+    __tablename__ = "analytics_daily"
+    __table_args__ = (UniqueConstraint("account", "market_hash_name", "day", name="uq_analytics_daily"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    account = Column(String, nullable=False)
+    market_hash_name = Column(String, nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    created = Column(Integer, nullable=False, default=0)
+    sold = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    # Cents received for the listings sold that day.
+    you_receive = Column(Integer, nullable=False, default=0)
+
+
+class ListingLifetime(_DECL_BASE):
+    """
+    Seconds from the creation to the sale of each sold listing, for the lifetime medians of db.analytics.
+    """
+
+    __tablename__ = "listing_lifetimes"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    listing_id = Column(String, nullable=False, unique=True)
+    account = Column(String, nullable=False)
+    market_hash_name = Column(String, nullable=False)
+    sold_day = Column(Date, nullable=False, index=True)
+    seconds = Column(Float, nullable=False)
+
+    @staticmethod
+    def bulk_insert_ignore(rows: List[dict]) -> int:
+        """
+        Inserts the lifetimes, skipping the listings already stored.
+        :return: number of rows inserted.
+        """
+        return _bulk_insert_ignore(ListingLifetime, rows)
+
+
+class AnalyticsWatermark(_DECL_BASE):
+    """
+    Id of the last event aggregated by db.analytics. Newer events are aggregated on the next update.
+    """
+
+    __tablename__ = "analytics_watermarks"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+    last_event_id = Column(Integer, nullable=False, default=0)
+
+
+def listing_status_update(listing_ids: Optional[Sequence[str]] = None) -> Any:
+    """
+    UPDATE statement setting the status of the listings to the type of their latest event.
+    Cancelled listings are left as they are: a cancellation is final, and the delists of the bot are recorded before
+    Steam reports them in the market history.
+    :param listing_ids: listings to update. All of them if None.
+    """
+    listings = Listing.__table__
+    events = Event.__table__
+    latest_event_type = (
+        select([events.c.event_type])
+        .where(events.c.listing_id == listings.c.listing_id)
+        .order_by(events.c.event_datetime.desc(), events.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    latest_event_datetime = (
+        select([func.max(events.c.event_datetime)])
+        .where(events.c.listing_id == listings.c.listing_id)
+        .scalar_subquery()
+    )
+    statement = (
+        update(listings)
+        .where(listings.c.current_status != MarketEventTypes.ListingCancelled.name)
+        .values(
+            current_status=func.coalesce(latest_event_type, MarketEventTypes.ListingCreated.name),
+            status_changed_at=latest_event_datetime,
+        )
+    )
+    if listing_ids is not None:
+        statement = statement.where(listings.c.listing_id.in_(listing_ids))
+    return statement
+
+
+@event.listens_for(Event, "after_insert")
+def _update_listing_status(mapper: Any, connection: Any, target: Event) -> None:
+    """
+    Keeps the status of the listing in line with its events.
+    """
+    connection.execute(listing_status_update([target.listing_id]))
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import Table, select
+from sqlalchemy.engine import Engine
+
+from steam_inv_dumper.db.db import Database, Event, Item, Listing
+from steam_inv_dumper.utils.tabular_writers import open_table_writer
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TABLES: Dict[str, Table] = {
+    "items": Item.__table__,
+    "listings": Listing.__table__,
+    "events": Event.__table__,
+}
+EXPORT_FORMATS = {"parquet": ".parquet", "csv.gz": ".csv.gz"}
+STATE_FILE = "export_state.json"
+
+
+@dataclass
+class ExportResult:
+    table: str
+    rows: int
+    # Highest id exported so far, the watermark of the next incremental export.
+    last_id: int
+    path: Optional[Path]
+
+
+def _python_type(column: Any) -> type:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return str
+
+
+class ExportState:
+    """
+    Last id exported of each table, kept in a json file next to the exported files.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self.last_ids: Dict[str, int] = {}
+        if self.path.exists():
+            self.last_ids = json.loads(self.path.read_text(encoding="utf8"))
+
+    def save(self) -> None:
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(json.dumps(self.last_ids, indent=2, sort_keys=True), encoding="utf8")
+        os.replace(temporary, self.path)
+
+
+def _exported_files(output_dir: Path, name: str) -> List[Path]:
+    """
+    Files written by export_table for the table, in any format.
+    """
+    extensions = "|".join(re.escape(extension) for extension in EXPORT_FORMATS.values())
+    pattern = re.compile(rf"{re.escape(name)}_\d+_\d+({extensions})")
+    return [path for path in output_dir.iterdir() if pattern.fullmatch(path.name)]
+
+
+def export_table(
+    engine: Engine,
+    name: str,
+    output_dir: Union[str, Path],
+    format: str = "csv.gz",
+    after_id: int = 0,
+    chunk_size: int = 50_000,
+) -> ExportResult:
+    """
+    Exports the rows of a table with an id above after_id, in id order, chunk_size rows at a time through a streaming
+    cursor. The file is named after the range of ids exported, <table>_<first id>_<last id>.<format>, and written
+    only if there are rows.
+    :param engine: engine of the database.
+    :param name: one of EXPORT_TABLES.
+    :param output_dir: directory of the exported files.
+    :param format: one of EXPORT_FORMATS.
+    :param after_id: watermark of the previous export, 0 for all rows.
+    """
+    table = EXPORT_TABLES[name]
+    extension = EXPORT_FORMATS[format]
+    output_dir = Path(output_dir)
+    partial = output_dir / f"{name}.partial{extension}"
+    columns = [column.name for column in table.columns]
+    id_index = columns.index("id")
+    statement = select([table]).where(table.c.id > after_id).order_by(table.c.id)
+
+    rows = 0
+    first_id = last_id = after_id
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(statement)
+        column_types = [_python_type(column) for column in table.columns]
+        with open_table_writer(partial, columns, format=format, column_types=column_types) as writer:
+            for chunk in result.partitions(chunk_size):
+                if not rows:
+                    first_id = chunk[0][id_index]
+                writer.write(chunk)
+                rows += len(chunk)
+                last_id = chunk[-1][id_index]
+    if not rows:
+        partial.unlink()
+        return ExportResult(table=name, rows=0, last_id=after_id, path=None)
+    path = output_dir / f"{name}_{first_id}_{last_id}{extension}"
+    os.replace(partial, path)
+    logger.info(f"Exported {rows} {name} to {path}")
+    return ExportResult(table=name, rows=rows, last_id=last_id, path=path)
+
+
+def export_database(
+    database: Database,
+    output_dir: Union[str, Path],
+    tables: Optional[Iterable[str]] = None,
+    format: str = "csv.gz",
+    full: bool = False,
+    chunk_size: int = 50_000,
+) -> Dict[str, ExportResult]:
+    """
+    Exports the rows added to the tables since the last export, as recorded in the STATE_FILE of output_dir.
+    Rows are exported once, when added: later changes to them, like a listing being sold, are in the next full export.
+    :param tables: names from EXPORT_TABLES. All of them if None.
+    :param full: export all the rows, not only the new ones. The files of the previous exports of the table are
+    removed once the full export is written, so that output_dir holds each row once.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state = ExportState(output_dir / STATE_FILE)
+    results = {}
+    for name in tables or EXPORT_TABLES:
+        after_id = 0 if full else state.last_ids.get(name, 0)
+        previous = _exported_files(output_dir, name) if full else []
+        results[name] = export_table(
+            database.engine, name, output_dir, format=format, after_id=after_id, chunk_size=chunk_size
+        )
+        for path in previous:
+            if path != results[name].path:
+                path.unlink()
+                logger.debug(f"Removed {path}, replaced by the full export")
+        state.last_ids[name] = results[name].last_id
+        state.save()
+    return results
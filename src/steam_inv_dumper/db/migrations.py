@@ -0,0 +1,100 @@
+import logging
+from typing import Any, Callable, List, Tuple
+
+from sqlalchemy import Column, inspect, select, text
+
+from steam_inv_dumper.db.db import (
+    Event,
+    Item,
+    Listing,
+    SchemaVersion,
+    listing_status_update,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _add_column(connection: Any, table_name: str, column: Column) -> None:
+    """
+    Adds a column of a model to an existing table.
+    :param connection: Connection to run the ALTER TABLE on.
+    :param table_name: name of the table
+    :param column: column, as defined in the model.
+    """
+    column_type = column.type.compile(dialect=connection.dialect)
+    definition = f"{column.name} {column_type}"
+    if column.default is not None and column.default.is_scalar:
+        definition += f" NOT NULL DEFAULT '{column.default.arg}'"
+    connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {definition}"))
+
+
+def _add_listing_status_columns(connection: Any) -> None:
+    """
+    Adds listings.current_status and listings.status_changed_at, and backfills them from the events.
+    """
+    columns = {column["name"] for column in inspect(connection).get_columns(Listing.__tablename__)}
+    if "current_status" in columns:
+        return
+    _add_column(connection, Listing.__tablename__, Listing.__table__.c.current_status)
+    _add_column(connection, Listing.__tablename__, Listing.__table__.c.status_changed_at)
+    for index in Listing.__table__.indexes:
+        if list(index.columns.keys()) == ["current_status"]:
+            index.create(bind=connection, checkfirst=True)
+    connection.execute(listing_status_update())
+
+
+def _create_missing_indexes(connection: Any) -> None:
+    """
+    Creates the secondary indexes of items, listings and events not yet in the database.
+    """
+    for table in (Item.__table__, Listing.__table__, Event.__table__):
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+# (version, migration) in the order they are applied. Append new migrations at the end.
+MIGRATIONS: List[Tuple[int, Callable[[Any], None]]] = [
+    (1, _add_listing_status_columns),
+    (2, _create_missing_indexes),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection: Any) -> int:
+    """
+    Version of the schema of the database, 0 if it was never migrated.
+    """
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+    version = connection.execute(select([SchemaVersion.version])).scalar()
+    return version or 0
+
+
+def _set_schema_version(connection: Any, version: int) -> None:
+    table = SchemaVersion.__table__
+    if connection.execute(select([table.c.id])).first() is None:
+        connection.execute(table.insert().values(version=version))
+    else:
+        connection.execute(table.update().values(version=version))
+
+
+def run_migrations(engine: Any, is_new_database: bool = False) -> None:
+    """
+    Brings the schema of an existing database up to date with the models.
+    Each migration runs in its own transaction, together with the update of the schema version.
+    :param engine: Engine of the database.
+    :param is_new_database: if the tables were just created from the models, no migration is needed.
+    """
+    SchemaVersion.__table__.create(bind=engine, checkfirst=True)
+    if is_new_database:
+        with engine.begin() as connection:
+            _set_schema_version(connection, SCHEMA_VERSION)
+        return
+
+    for version, migration in MIGRATIONS:
+        with engine.begin() as connection:
+            if get_schema_version(connection) >= version:
+                continue
+            logger.info(f"Migrating database to schema version {version}: {migration.__name__}")
+            migration(connection)
+            _set_schema_version(connection, version)
@@ -0,0 +1,198 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Float, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement, Select
+
+from steam_inv_dumper.db.db import Event, Item, Listing
+from steam_inv_dumper.utils.data_structures import MarketEventTypes
+
+# Reports are plain aggregate SELECTs over the tables, no ORM object is built.
+_items = Item.__table__
+_listings = Listing.__table__
+_events = Event.__table__
+
+ReportQuery = Callable[[Optional[str], Optional[datetime]], Select]
+
+
+class seconds_between(FunctionElement):
+    """
+    Seconds from the first datetime to the second, compiled for each dialect.
+    """
+
+    type = Float()
+    name = "seconds_between"
+    inherit_cache = True
+
+
+def _bounds(element: seconds_between, compiler: Any, **kw: Any) -> Tuple[str, str]:
+    start, end = list(element.clauses)
+    return compiler.process(start, **kw), compiler.process(end, **kw)
+
+
+@compiles(seconds_between)
+def _seconds_between(element: seconds_between, compiler: Any, **kw: Any) -> str:
+    start, end = _bounds(element, compiler, **kw)
+    return f"EXTRACT(EPOCH FROM ({end} - {start}))"
+
+
+@compiles(seconds_between, "sqlite")
+def _seconds_between_sqlite(element: seconds_between, compiler: Any, **kw: Any) -> str:
+    start, end = _bounds(element, compiler, **kw)
+    return f"((julianday({end}) - julianday({start})) * 86400.0)"
+
+
+@compiles(seconds_between, "mysql")
+def _seconds_between_mysql(element: seconds_between, compiler: Any, **kw: Any) -> str:
+    start, end = _bounds(element, compiler, **kw)
+    return f"TIMESTAMPDIFF(SECOND, {start}, {end})"
+
+
+def _filter(statement: Select, account: Optional[str], since: Optional[datetime], datetime_column: Any) -> Select:
+    if account is not None:
+        statement = statement.where(_items.c.account == account)
+    if since is not None:
+        statement = statement.where(datetime_column >= since)
+    return statement
+
+
+def sales_summary(account: Optional[str] = None, since: Optional[datetime] = None) -> Select:
+    """
+    Sold listings per SKU, with the amounts received and paid in cents, most profitable first.
+    :param account: only the items of this account.
+    :param since: only the listings sold since.
+    """
+    statement = (
+        select(
+            [
+                _items.c.market_hash_name,
+                func.count().label("sold"),
+                func.sum(_listings.c.you_receive).label("you_receive"),
+                func.sum(_listings.c.buyer_pay).label("buyer_pay"),
+                func.round(func.avg(_listings.c.you_receive)).label("avg_you_receive"),
+                func.max(_listings.c.status_changed_at).label("last_sold_at"),
+            ]
+        )
+        .select_from(_listings.join(_items, _listings.c.item_id == _items.c.item_id))
+        .where(_listings.c.current_status == MarketEventTypes.ListingSold.name)
+        .group_by(_items.c.market_hash_name)
+        .order_by(func.sum(_listings.c.you_receive).desc())
+    )
+    return _filter(statement, account, since, _listings.c.status_changed_at)
+
+
+def revenue_per_day(account: Optional[str] = None, since: Optional[datetime] = None) -> Select:
+    """
+    Sales and amounts in cents per day of the ListingSold events.
+    :param account: only the items of this account.
+    :param since: only the sales since.
+    """
+    day = func.date(_events.c.event_datetime).label("day")
+    statement = (
+        select(
+            [
+                day,
+                func.count().label("sold"),
+                func.sum(_listings.c.you_receive).label("you_receive"),
+                func.sum(_listings.c.buyer_pay).label("buyer_pay"),
+            ]
+        )
+        .select_from(
+            _events.join(_listings, _events.c.listing_id == _listings.c.listing_id).join(
+                _items, _listings.c.item_id == _items.c.item_id
+            )
+        )
+        .where(_events.c.event_type == MarketEventTypes.ListingSold.name)
+        .group_by(day)
+        .order_by(day)
+    )
+    return _filter(statement, account, since, _events.c.event_datetime)
+
+
+def active_listings(account: Optional[str] = None, since: Optional[datetime] = None) -> Select:
+    """
+    Listings still on the market, by SKU and price.
+    :param account: only the items of this account.
+    :param since: only the listings created since.
+    """
+    created = _events.alias("created")
+    statement = (
+        select(
+            [
+                _items.c.market_hash_name,
+                _listings.c.listing_id,
+                _listings.c.buyer_pay,
+                _listings.c.you_receive,
+                created.c.event_datetime.label("listed_at"),
+            ]
+        )
+        .select_from(
+            _listings.join(_items, _listings.c.item_id == _items.c.item_id).outerjoin(
+                created,
+                (created.c.listing_id == _listings.c.listing_id)
+                & (created.c.event_type == MarketEventTypes.ListingCreated.name),
+            )
+        )
+        .where(_listings.c.current_status == MarketEventTypes.ListingCreated.name)
+        .order_by(_items.c.market_hash_name, _listings.c.buyer_pay)
+    )
+    return _filter(statement, account, since, created.c.event_datetime)
+
+
+def time_to_sell(account: Optional[str] = None, since: Optional[datetime] = None) -> Select:
+    """
+    Seconds from the ListingCreated to the ListingSold event of the listings, per SKU, fastest first.
+    :param account: only the items of this account.
+    :param since: only the listings sold since.
+    """
+    created = _events.alias("created")
+    sold = _events.alias("sold")
+    seconds = seconds_between(created.c.event_datetime, sold.c.event_datetime)
+    statement = (
+        select(
+            [
+                _items.c.market_hash_name,
+                func.count().label("sold"),
+                func.round(func.avg(seconds)).label("avg_seconds"),
+                func.round(func.min(seconds)).label("min_seconds"),
+                func.round(func.max(seconds)).label("max_seconds"),
+            ]
+        )
+        .select_from(
+            sold.join(
+                created,
+                (created.c.listing_id == sold.c.listing_id)
+                & (created.c.event_type == MarketEventTypes.ListingCreated.name),
+            )
+            .join(_listings, _listings.c.listing_id == sold.c.listing_id)
+            .join(_items, _listings.c.item_id == _items.c.item_id)
+        )
+        .where(sold.c.event_type == MarketEventTypes.ListingSold.name)
+        .group_by(_items.c.market_hash_name)
+        .order_by(func.avg(seconds))
+    )
+    return _filter(statement, account, since, sold.c.event_datetime)
+
+
+REPORTS: Dict[str, ReportQuery] = {
+    "sales": sales_summary,
+    "revenue": revenue_per_day,
+    "active": active_listings,
+    "time-to-sell": time_to_sell,
+}
+
+
+def report_columns(statement: Select) -> List[str]:
+    return list(statement.selected_columns.keys())
+
+
+def stream_report(engine: Engine, statement: Select, chunk_size: int = 1000) -> Iterator[Tuple]:
+    """
+    Rows of a report, fetched chunk_size at a time, through a server side cursor where the driver has one.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(statement)
+        for rows in result.partitions(chunk_size):
+            yield from (tuple(row) for row in rows)
@@ -1,36 +1,222 @@
 import logging
+import sys
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, List, Optional
 
-from steam_inv_dumper.db.db import Database
-from steam_inv_dumper.markets.exchange import Exchange
-from steam_inv_dumper.markets.steam.client import steam_client_factory
-from steam_inv_dumper.markets.steam.market import steam_market_factory
 from steam_inv_dumper.utils.configuration import load_config
 from steam_inv_dumper.utils.logger import setup_logging
 
+# SQLAlchemy, steampy, requests and httpx take most of the startup time: they are imported on the paths using them.
+if TYPE_CHECKING:
+    from steam_inv_dumper.db.db import Database
+    from steam_inv_dumper.markets.interfaces.interfaces import InventoryProvider
+    from steam_inv_dumper.utils.tabular_writers import TableOutput
+
 logger = logging.getLogger(__name__)
 
 
-def main() -> None:
+def main(config_path: str = "config.json", daemon: bool = False) -> None:
+    """
+    :param config_path: path of the config file.
+    :param daemon: keep running the jobs until SIGINT or SIGTERM, instead of a single sell loop.
+    """
     setup_logging(0)
-    config = load_config("config.json").unwrap()
+    config = load_config(config_path).unwrap()
+
+    from steam_inv_dumper.db.db import Database
+
     database = Database(config=config)
+    if config.get("accounts"):
+        from steam_inv_dumper.markets.runner import MultiAccountRunner
+
+        if daemon:
+            logger.warning("--daemon is ignored with accounts, whose sell loops always run until SIGINT or SIGTERM")
+
+        MultiAccountRunner(config=config, database=database).run_forever()
+        return
+
+    from steam_inv_dumper.markets.runner import market_config
+    from steam_inv_dumper.markets.steam.client import steam_client_factory
+
     inventory_provider = steam_client_factory(config=config)
-    market_provider = steam_market_factory(
-        config={**inventory_provider.market_params, "steamguard": config["steamguard"]}
-    )
+    if config.get("async", False) and daemon:
+        logger.warning("async is ignored with --daemon, which runs on the threaded market provider")
+    if config.get("async", False) and not daemon:
+        import asyncio
+
+        asyncio.run(
+            run_async(
+                config=config,
+                database=database,
+                inventory_provider=inventory_provider,
+                market_config=market_config(config, inventory_provider),
+            )
+        )
+        return
+
+    from steam_inv_dumper.markets.exchange import Exchange
+    from steam_inv_dumper.markets.steam.market import steam_market_factory
 
     exchange = Exchange(
-        config=config, inventory_provider=inventory_provider, market_provider=market_provider, database=database
+        config=config,
+        inventory_provider=inventory_provider,
+        market_provider=steam_market_factory(config=market_config(config, inventory_provider)),
+        database=database,
     )
-    exchange.run()
-    pass
+    if daemon:
+        from steam_inv_dumper.markets.runner import ExchangeDaemon
+
+        ExchangeDaemon(exchange=exchange, config=config).run_forever()
+        return
+    try:
+        exchange.run()
+    finally:
+        exchange.close()
+
+
+async def run_async(
+    config: dict, database: "Database", inventory_provider: "InventoryProvider", market_config: dict
+) -> None:
+    """
+    Runs the exchange on the asyncio provider, which also serves the inventory when logged in to Steam.
+    """
+    from steam_inv_dumper.markets.async_exchange import AsyncExchange
+    from steam_inv_dumper.markets.steam.async_market import (
+        AsyncSteamMarket,
+        async_steam_market_factory,
+    )
+
+    market_provider = async_steam_market_factory(config=market_config)
+    exchange = AsyncExchange(
+        config=config,
+        inventory_provider=market_provider if isinstance(market_provider, AsyncSteamMarket) else inventory_provider,
+        market_provider=market_provider,
+        database=database,
+    )
+    try:
+        await exchange.run()
+    finally:
+        await exchange.aclose()
+        if hasattr(market_provider, "aclose"):
+            await market_provider.aclose()
+
+
+def report(
+    config_path: str,
+    name: str,
+    account: Optional[str] = None,
+    since: Optional[datetime] = None,
+    output: "TableOutput" = sys.stdout,
+) -> None:
+    """
+    Writes a report of the database of the config.
+    :param config_path: path of the config file.
+    """
+    config = load_config(config_path).unwrap()
+
+    from steam_inv_dumper.db.db import Database
+
+    write_report(Database(config=config), name=name, account=account, since=since, output=output)
+
+
+def write_report(
+    database: "Database",
+    name: str,
+    account: Optional[str] = None,
+    since: Optional[datetime] = None,
+    output: "TableOutput" = sys.stdout,
+) -> None:
+    """
+    Writes a report, a chunk of rows at a time.
+    :param database: database to report on.
+    :param name: report from db.reports.REPORTS.
+    :param account: only the items of this account. All accounts if None.
+    :param since: only the rows since.
+    :param output: CSV, CSV.gz or Parquet file from the suffix of the path, or an open text file for CSV.
+    """
+    from steam_inv_dumper.db.reports import REPORTS, report_columns, stream_report
+    from steam_inv_dumper.utils.tabular_writers import write_table
+
+    statement = REPORTS[name](account, since)
+    write_table(output, report_columns(statement), stream_report(database.engine, statement))
+
+
+def analytics(
+    config_path: str,
+    view: str,
+    account: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    output: "TableOutput" = sys.stdout,
+) -> None:
+    """
+    Aggregates the market events stored since the last run, then writes a view of the analytics.
+    :param config_path: path of the config file.
+    :param view: "skus" or "daily".
+    :param output: CSV, CSV.gz or Parquet file from the suffix of the path, or an open text file for CSV.
+    """
+    config = load_config(config_path).unwrap()
+
+    from steam_inv_dumper.db.analytics import Analytics
+    from steam_inv_dumper.db.db import Database
+
+    engine = Analytics(
+        Database(config=config), retry_window=timedelta(seconds=config.get("history_retry_window", 86400))
+    )
+    engine.update()
+    engine.export(output, view=view, account=account, since=since, until=until)
+
+
+def export(
+    config_path: str, output_dir: str, tables: Optional[List[str]] = None, format: str = "csv.gz", full: bool = False
+) -> None:
+    """
+    Exports the rows added to the items, listings and events tables since the last export.
+    :param config_path: path of the config file.
+    :param output_dir: directory of the exported files and of their state file.
+    :param tables: tables to export. All of them if None.
+    :param format: "csv.gz", or "parquet" if pyarrow is installed.
+    :param full: export all the rows, not only the new ones.
+    """
+    setup_logging(0)
+    config = load_config(config_path).unwrap()
+
+    from steam_inv_dumper.db.db import Database
+    from steam_inv_dumper.db.export import export_database
+
+    export_database(Database(config=config), output_dir, tables=tables, format=format, full=full)
+
+
+def backfill(config_path: str, account: Optional[str] = None) -> None:
+    """
+    Stores the whole market history of the accounts of the config.
+    :param config_path: path of the config file.
+    :param account: only this account. All of them if None.
+    """
+    setup_logging(0)
+    config = load_config(config_path).unwrap()
+
+    from steam_inv_dumper.db.db import Database
+    from steam_inv_dumper.markets.runner import build_exchange
+    from steam_inv_dumper.utils.configuration import account_configs
+
+    configs = [
+        account_config for account_config in account_configs(config) if account in (None, account_config["username"])
+    ]
+    if not configs:
+        raise ValueError(f"Account {account} is not in the config")
+    database = Database(config=config)
+    for account_config in configs:
+        exchange = build_exchange(account_config, database)
+        try:
+            exchange.backfill_market_events()
+        finally:
+            exchange.close()
 
 
 # TODO remove redundant info from return from GC.
-# TODO cache the Whole inventory (Done). Update it only sometimes.
 # TODO place all databases in same folder.
 # TODO add telegram hooks.
-# todo command to checkout info from db.
 
 
 # CZ75-Auto | Distressed (Minimal Wear)
@@ -0,0 +1,231 @@
+import asyncio
+import inspect
+import logging
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Union
+
+import arrow
+from steampy.models import Currency, GameOptions
+
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.markets.exchange import BaseExchange
+from steam_inv_dumper.markets.interfaces.interfaces import (
+    AsyncInventoryProvider,
+    AsyncMarketProvider,
+    InventoryProvider,
+    MarketProvider,
+)
+from steam_inv_dumper.utils.data_structures import (
+    DelistFromMarket,
+    InventoryItem,
+    ListOnMarket,
+    MyMarketListing,
+    SkuIndex,
+)
+from steam_inv_dumper.utils.rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+_EXHAUSTED = object()
+
+
+class AsyncExchange(BaseExchange):
+    """
+    Exchange running the sell loop on asyncio, overlapping the requests to Steam.
+    Providers may be async or blocking, blocking calls run in a worker thread.
+    The database is only touched from the event loop thread, as its session is thread-local.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        inventory_provider: Union[AsyncInventoryProvider, InventoryProvider],
+        market_provider: Union[AsyncMarketProvider, MarketProvider],
+        database: Database,
+    ):
+        super().__init__(config=config, database=database)
+        self.inventory_provider = inventory_provider
+        self.market_provider = market_provider
+
+    @property
+    def currency(self) -> Currency:
+        return self.market_provider.currency
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return getattr(self.market_provider, "rate_limiter", None)
+
+    @staticmethod
+    async def _call_provider(method: Callable, **kwargs: Any) -> Any:
+        if inspect.iscoroutinefunction(method):
+            return await method(**kwargs)
+        return await asyncio.to_thread(method, **kwargs)
+
+    @staticmethod
+    async def _iter_provider(method: Callable, **kwargs: Any) -> AsyncIterator[Any]:
+        if inspect.isasyncgenfunction(method):
+            async for element in method(**kwargs):
+                yield element
+            return
+        # Every page of a blocking iterator is fetched in a worker thread.
+        iterator = iter(method(**kwargs))
+        while (element := await asyncio.to_thread(partial(next, iterator, _EXHAUSTED))) is not _EXHAUSTED:
+            yield element
+
+    async def get_own_items(self, game: GameOptions = GameOptions.CS) -> List[InventoryItem]:
+        """
+        Gets *marketable* items in inventory for specified game
+        :param game: defaults CSGO
+        :return: List of Inventory items.
+        """
+        items_dict = await self.inventory_cache.get_async(
+            self._inventory_key(game),
+            fetch=partial(self._call_provider, self.inventory_provider.get_my_inventory, game=game),
+        )
+        return self._parse_inventory(items_dict)
+
+    async def get_own_listings(self) -> List[MyMarketListing]:
+        """
+        Gets all items currently listed on the market
+        :return: List of My Market listings
+        """
+        return [listing async for listing in self.iter_own_listings()]
+
+    async def iter_own_listings(self, market_hash_name: Optional[str] = None) -> AsyncIterator[MyMarketListing]:
+        """
+        Items currently listed on the market, fetched a page at a time while iterating.
+        :param market_hash_name: only the listings of this item.
+        :return: My Market listings
+        """
+        async for listing_id, listing_vars in self._iter_provider(self.market_provider.iter_my_market_listings):
+            listing = self._parse_listing(listing_vars, market_hash_name)
+            if listing is not None:
+                yield listing
+
+    async def listings_of(self, item_ids: Set[str]) -> List[MyMarketListing]:
+        """
+        Listings of the items, fetching pages of listings only until all of them are found.
+        :param item_ids: items to find on the market.
+        :return: My Market listings of the items found.
+        """
+        found: List[MyMarketListing] = []
+        if not item_ids:
+            return found
+        async for listing in self.iter_own_listings():
+            if self._collect_listings(found, listing, item_ids):
+                break
+        return found
+
+    async def get_item_price(self, market_hash_name: str) -> int:
+        """
+        Gets the item int_price from Steam
+        :param market_hash_name: Market hash market_hash_name.
+        :return: int. price in cents
+        """
+        price_data = await self.price_cache.get_async(
+            market_hash_name,
+            self.currency.name,
+            fetch=partial(self._call_provider, self.market_provider.get_item_price, market_hash_name=market_hash_name),
+        )
+        return self._parse_item_price(price_data)
+
+    async def prefetch_prices(self, market_hash_names: List[str]) -> Dict[str, int]:
+        """
+        Gets the price of all the items concurrently, at most price_workers requests in flight.
+        :param market_hash_names: Market hash names of the items.
+        :return: price in cents by market hash name. Items whose price could not be fetched are left out.
+        """
+        semaphore = asyncio.Semaphore(self._price_workers)
+
+        async def fetch(market_hash_name: str) -> int:
+            async with semaphore:
+                return await self.get_item_price(market_hash_name=market_hash_name)
+
+        results = await asyncio.gather(*(fetch(name) for name in market_hash_names), return_exceptions=True)
+        prices = {}
+        for market_hash_name, result in zip(market_hash_names, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Could not get the price of {market_hash_name}: {result}")
+            else:
+                prices[market_hash_name] = result
+        return prices
+
+    async def run(self) -> None:
+        """
+        :return:None
+        """
+        if self._sell_due:
+            await self._sell_loop()
+            self._last_run = arrow.now().timestamp()
+        self._heartbeat()
+
+    async def aclose(self) -> None:
+        """
+        Waits for the price refreshes running, and stores the prices fetched.
+        """
+        await self.price_cache.close_async()
+        self.price_cache.persist()
+
+    async def _sell_loop(self) -> None:
+        """
+        Same cycle as Exchange._sell_loop, overlapping the inventory, listings and price requests.
+        """
+        my_items, my_listings = await asyncio.gather(self.get_own_items(), self.get_own_listings())
+        self._store_inventory_and_listings(my_items=my_items, my_listings=my_listings)
+
+        sku_index = SkuIndex.build(items=my_items, listings=my_listings)
+        self.price_cache.restore()
+        prices = await self.prefetch_prices(market_hash_names=list(self.items_to_sell))
+        self.price_cache.persist()
+        for to_list, to_delist in self._sku_plans(sku_index, prices):
+            await self._dispatch_sku(to_list=to_list, to_delist=to_delist)
+        # Cleanup Block
+        self._store_listing_ids(await self.listings_of(self._items_waiting_for_listing_id()))
+        await self.sync_market_events()
+
+    async def sync_market_events(self) -> None:
+        """
+        Ingests the market history events newer than the last ones stored for this account.
+        """
+        account = self._config["username"]
+        cursor = self.database.MarketHistoryCursor.get(account)
+        market_events = await self._call_provider(self.market_provider.get_new_market_events, cursor=cursor)
+        logger.debug(f"{len(market_events)} new market events since {cursor}")
+        self._store_market_events(market_events=market_events)
+
+    async def backfill_market_events(self, page_size: int = 500) -> None:
+        """
+        Ingests the whole market history of this account. Needed once, incremental syncs take over from there.
+        :param page_size: events per request.
+        """
+        market_events = await self._call_provider(self.market_provider.get_all_market_events, page_size=page_size)
+        logger.info(f"Backfilling {len(market_events)} market events")
+        self._store_market_events(market_events=market_events)
+
+    async def _dispatch_sku(self, to_list: List[ListOnMarket], to_delist: List[DelistFromMarket]) -> None:
+        """
+        Sends the sell and cancel orders of a SKU to Steam, then records the ones sent in a single transaction.
+        If an order fails, the orders sent before it are still recorded.
+        :param to_list: items to list.
+        :param to_delist: listings to cancel.
+        """
+        listed: List[ListOnMarket] = []
+        delisted: List[DelistFromMarket] = []
+        try:
+            for element in to_list:
+                self._log_sell_order(element)
+                if not self.is_testing:
+                    await self._call_provider(
+                        self.market_provider.create_sell_order,
+                        assetid=element.item_id,
+                        game=GameOptions.CS,
+                        money_to_receive=element.you_receive,
+                    )
+                listed.append(element)
+            for item in to_delist:
+                self._log_cancel_order(item)
+                if not self.is_testing:
+                    await self._call_provider(self.market_provider.cancel_sell_order, sell_listing_id=item.listing_id)
+                delisted.append(item)
+        finally:
+            self._record_orders(listed=listed, delisted=delisted)
@@ -1,11 +1,14 @@
 import logging
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import arrow
-from sqlalchemy.exc import IntegrityError
-from steampy.models import GameOptions
+from sqlalchemy.orm import joinedload
+from steampy.models import Currency, GameOptions
 
-from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.db.db import BulkInsertResult, Database
 from steam_inv_dumper.markets.interfaces.interfaces import (
     InventoryProvider,
     MarketProvider,
@@ -17,35 +20,55 @@ from steam_inv_dumper.utils.data_structures import (
     MarketEvent,
     MarketEventTypes,
     MyMarketListing,
+    SkuIndex,
 )
+from steam_inv_dumper.utils.inventory_cache import InventoryCache
+from steam_inv_dumper.utils.price_cache import PriceCache
 from steam_inv_dumper.utils.price_utils import (
     actions_to_make_list_delist,
     get_items_to_delist,
     get_items_to_list,
 )
+from steam_inv_dumper.utils.rate_limiter import RateLimiter
 from steam_inv_dumper.utils.steam_prices_utils import convert_string_prices
 
 logger = logging.getLogger(__name__)
 
 
-class Exchange:
+class BaseExchange:
     """
-    Class representing an exchange. In this case Steam Market.
+    State, database bookkeeping and sell planning of an exchange, shared by Exchange and AsyncExchange.
+    Subclasses talk to the market, and store each phase of the sell loop with the methods here.
     """
 
-    def __init__(
-        self, config: dict, inventory_provider: InventoryProvider, market_provider: MarketProvider, database: Database
-    ):
+    def __init__(self, config: dict, database: Database):
         # TODO move those somewere else.
-        self._last_run = 0
+        self._last_run: float = 0
         self._config = config
         self._heartbeat_interval = config.get("heartbeat_interval", 100)
-        self._heartbeat_msg = 0
+        self._heartbeat_msg: float = 0
         self._timeout = self._config.get("market_sell_timeout", 300)
+        self._price_workers = self._config.get("price_workers", 4)
+        self._history_retry_window = timedelta(seconds=self._config.get("history_retry_window", 86400))
 
-        self.inventory_provider = inventory_provider
-        self.market_provider = market_provider
         self.database = database
+        self.price_cache = PriceCache.from_config(
+            config.get("price_cache"),
+            store=database.CachedPrice if database is not None else None,
+            workers=self._price_workers,
+            sell_interval=self._timeout,
+        )
+        self.inventory_cache = InventoryCache.from_config(
+            config.get("inventory_cache"), account=config.get("username", "")
+        )
+
+    @property
+    def currency(self) -> Currency:
+        raise NotImplementedError
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return None
 
     @property
     def is_testing(self) -> bool:
@@ -55,124 +78,183 @@ class Exchange:
     def items_to_sell(self) -> dict:
         return self._config.get("items_to_sell", {})
 
-    def get_own_items(self, game: GameOptions = GameOptions.CS) -> List[InventoryItem]:
-        """
-        Gets *marketable* items in inventory for specified game
-        :param game: defaults CSGO
-        :return: List of Inventory items.
-        """
-        items_dict = self.inventory_provider.get_my_inventory(game=game)
+    @property
+    def _sell_due(self) -> bool:
+        return self._last_run + self._timeout < arrow.now().timestamp()
+
+    @staticmethod
+    def _inventory_key(game: GameOptions) -> str:
+        return f"{game.app_id}_{game.context_id}"
 
+    @staticmethod
+    def _parse_inventory(items_dict: dict) -> List[InventoryItem]:
         items = [InventoryItem.from_my_listing_dict(listing_vars) for listing_id, listing_vars in items_dict.items()]
-        items = [item for item in items if item.marketable is True]
+        return [item for item in items if item.marketable is True]
 
-        return items
+    @staticmethod
+    def _parse_item_price(price_data: dict) -> int:
+        # price_data may be cached, so it is left as is.
+        lowest_price = convert_string_prices(price_data["lowest_price"])
+        median_price = convert_string_prices(price_data["median_price"]) if "median_price" in price_data else 0
+        return max(lowest_price, median_price) - 1
 
-    def get_item_price(self, market_hash_name: str) -> int:
+    @staticmethod
+    def _parse_listing(listing_vars: dict, market_hash_name: Optional[str]) -> Optional[MyMarketListing]:
         """
-        Gets the item int_price from Steam
-        :param market_hash_name: Market hash market_hash_name.
-        :return: int. price in cents
+        :param market_hash_name: only the listings of this item. All listings if None.
+        :return: the listing, None if of another item.
         """
-        price_data = self.market_provider.get_item_price(
-            market_hash_name=market_hash_name,
+        listing = MyMarketListing.from_dict(listing_vars)
+        if market_hash_name is None or listing.description.market_hash_name == market_hash_name:
+            return listing
+        return None
+
+    def heartbeat(self) -> None:
+        logger.info(
+            f"Bot heartbeat. Rate limits: {self.rate_limiter.stats if self.rate_limiter else 'none'}. "
+            f"Prices: {self.price_cache.stats}. Inventory: {self.inventory_cache.stats}"
         )
-        try:
-            price_data["lowest_price"] = convert_string_prices(price_data["lowest_price"])
-            price_data["median_price"] = convert_string_prices(price_data["median_price"])
-        except KeyError:
-            price_data["lowest_price"] = convert_string_prices(price_data["lowest_price"])
-            price_data["median_price"] = 0
-        return max(price_data["lowest_price"], price_data["median_price"]) - 1
-
-    def get_own_listings(self) -> List[MyMarketListing]:
-        """
-        Gets all items currently listed on the market
-        :return: List of My Market listings
-        """
-
-        listings = self.market_provider.get_my_market_listings()
-
-        listings_sell = [
-            MyMarketListing.from_dict(listing_vars) for listing_id, listing_vars in listings["sell_listings"].items()
-        ]
-        return listings_sell
-
-    def run(self) -> None:
-        """
-        :return:None
-        """
-        if self._last_run + self._timeout < arrow.now().timestamp():
-            self._sell_loop()
-            self._last_run = arrow.now().timestamp()
 
+    def _heartbeat(self) -> None:
         if self._heartbeat_interval:
             now = arrow.now().timestamp()
             if (now - self._heartbeat_msg) > self._heartbeat_interval:
-                logger.info("Bot heartbeat.")
+                self.heartbeat()
                 self._heartbeat_msg = now
 
-    def _sell_loop(self) -> None:
+    def _store_inventory_and_listings(self, my_items: List[InventoryItem], my_listings: List[MyMarketListing]) -> None:
         """
-        Takes an exchange and runs the CheckSold, update database, sell more items cycle.
-        Item_id s change when you remove the item from the market.
+        Stores the new items and listings, and marks the listings gone from the market as sold, in one transaction.
         """
-        # TODO think deeply how to do the business logic.
-        # TODO is this always needed?
-        my_items = self.get_own_items()
-        self._update_items_in_database(inventory_items_list=my_items)
-
-        my_listings = self.get_own_listings()
-        self._add_all_listings(items_sale_listings=my_listings)
-        self._update_sold_items(items_sale_listings=my_listings)
+        with self.database.transaction():
+            self._update_items_in_database(inventory_items_list=my_items)
+            self._add_all_listings(items_sale_listings=my_listings)
+            self._update_sold_items(items_sale_listings=my_listings)
+
+    def _sku_plans(
+        self, sku_index: SkuIndex, prices: Dict[str, int]
+    ) -> Iterator[Tuple[List[ListOnMarket], List[DelistFromMarket]]]:
+        """
+        Items to list and listings to cancel of each SKU to sell whose price is known.
+        """
+        for market_hash_name, sell_options in self.items_to_sell.items():
+            if market_hash_name not in prices:
+                continue
+            yield self._plan_sku(market_hash_name, sell_options, sku_index, prices[market_hash_name])
 
+    def _plan_sku(
+        self, market_hash_name: str, sell_options: dict, sku_index: SkuIndex, selling_price: int
+    ) -> Tuple[List[ListOnMarket], List[DelistFromMarket]]:
+        """
+        Decides which items of a SKU to list and which listings to cancel.
+        :param market_hash_name: SKU to plan.
+        :param sell_options: options of the SKU from items_to_sell.
+        :param sku_index: inventory and listings of this loop.
+        :param selling_price: current market price in cents.
+        :return: items to list, listings to delist.
+        """
         # TODO basically this is all business logic. I need to move it away...
-        for market_hash_name, sell_options in self._config.get("items_to_sell", {}).items():
-            # dataframes
-            item_on_sale_listings = [
-                listing for listing in my_listings if listing.description.market_hash_name == market_hash_name
-            ]
-            items_in_inventory = [my_item for my_item in my_items if my_item.market_hash_name == market_hash_name]
-            if item_on_sale_listings:
-                min_price_already_on_sale = min([i.buyer_pay for i in item_on_sale_listings])
-            else:
-                min_price_already_on_sale = 0
-            selling_price = self.get_item_price(market_hash_name=market_hash_name)
-
-            sell_params = {
-                "num_in_inventory": len(items_in_inventory),
-                "num_to_sell": int(sell_options.get("quantity", 0)),
-                "num_market_listings": len(item_on_sale_listings),
-                "min_allowed_price": sell_options["min_price"],
-                "min_price_mark_listing": min_price_already_on_sale,
-                "item_selling_price": selling_price,
-            }
-
-            # TODO refactor with DataClasses.
-            actions = actions_to_make_list_delist(**sell_params)
-            logger.info(f"{market_hash_name}  {actions}")
+        item_on_sale_listings = sku_index.listings_for(market_hash_name)
+        items_in_inventory = sku_index.items_for(market_hash_name)
+        sell_params = {
+            "num_in_inventory": len(items_in_inventory),
+            "num_to_sell": int(sell_options.get("quantity", 0)),
+            "num_market_listings": len(item_on_sale_listings),
+            "min_allowed_price": sell_options["min_price"],
+            "min_price_mark_listing": sku_index.min_listed_price_for(market_hash_name),
+            "item_selling_price": selling_price,
+        }
+
+        # TODO refactor with DataClasses.
+        actions = actions_to_make_list_delist(**sell_params)
+        logger.info(f"{market_hash_name}  {actions}")
+
+        list_items_to_sell = get_items_to_list(
+            market_hash_name=market_hash_name,
+            amount=actions["list"]["qty"],
+            price=actions["list"]["int_price"],
+            inventory=items_in_inventory,
+        )
+        list_items_to_delist = get_items_to_delist(
+            market_hash_name=market_hash_name,
+            amount=actions["delist"]["qty"],
+            listings=item_on_sale_listings,
+        )
+        return list_items_to_sell, list_items_to_delist
 
-            # Items to sell
-            list_items_to_sell = get_items_to_list(
-                market_hash_name=market_hash_name,
-                amount=actions["list"]["qty"],
-                price=actions["list"]["int_price"],
-                inventory=items_in_inventory,
+    def _log_sell_order(self, element: ListOnMarket) -> None:
+        if self.is_testing:
+            logger.debug(
+                f"{element.market_hash_name} create_sell_order({element.item_id} )"
+                f",money_to_receive={element.you_receive} buyer_pays {element.buyer_pays}"
             )
-            self.dispatch_sales(item_for_sale_list=list_items_to_sell)
+        else:
+            logger.debug(f"{element.market_hash_name} creating real sell order")
+
+    def _log_cancel_order(self, item: DelistFromMarket) -> None:
+        if self.is_testing:
+            logger.debug("delist items. Debug is True. Updating database only")
+            logger.debug(f"{item.market_hash_name} cancel_sell_order({item.listing_id}")
+        else:
+            logger.debug("delist items. Debug is False. Sending cancel order to steam")
+            logger.debug(f"{item.market_hash_name} - listing_id {item.listing_id}")
+
+    def _store_market_events(self, market_events: List[MarketEvent]) -> None:
+        """
+        Stores the events and moves the history cursor past them, in one transaction.
+        """
+        with self.database.transaction():
+            self._update_events(market_events=market_events)
+            self.database.MarketHistoryCursor.advance(self._config["username"], self._settled_events(market_events))
+
+    def _settled_events(self, market_events: List[MarketEvent]) -> List[MarketEvent]:
+        """
+        Events the history cursor can move past. Events of a listing not stored yet, like one created by the loop
+        before its listing id is picked up, hold the cursor back so that the next syncs read them again, until their
+        listing is stored or they are older than history_retry_window before the newest event.
+        :param market_events: events just ingested.
+        """
+        if not market_events:
+            return market_events
+        known_listing_ids = self.database.Listing.existing_listing_ids(event.listingid for event in market_events)
+        retry_since = max(event.event_datetime for event in market_events) - self._history_retry_window
+        pending = [
+            (event.event_datetime, event.time_event_fraction)
+            for event in market_events
+            if event.listingid not in known_listing_ids and event.event_datetime >= retry_since
+        ]
+        if not pending:
+            return market_events
+        oldest_pending = min(pending)
+        logger.debug(f"{len(pending)} market events wait for their listing, keeping them from {oldest_pending}")
+        return [event for event in market_events if (event.event_datetime, event.time_event_fraction) < oldest_pending]
 
-            # Items to delete
-            list_items_to_delist = get_items_to_delist(
-                market_hash_name=market_hash_name,
-                amount=actions["delist"]["qty"],
-                listings=item_on_sale_listings,
+    def _items_waiting_for_listing_id(self) -> Set[str]:
+        """
+        Items of this account listed by the bot whose listing id is not known yet.
+        """
+        listings = (
+            self.database.Listing.query_ref(
+                listing_status=[MarketEventTypes.ListingCreated.name], account=self._config["username"]
             )
-            self.dispatch_delists(to_delist=list_items_to_delist)
-        # Cleanup Block
-        my_new_listings = self.get_own_listings()
-        self._update_listing_ids(items_sale_listings=my_new_listings)
-        market_events: List[MarketEvent] = self.market_provider.get_market_events()
-        self._update_events(market_events=market_events)
+            .filter(self.database.Listing.listing_id.is_(None))
+            .all()
+        )
+        return {listing.item_id for listing in listings}
+
+    @staticmethod
+    def _collect_listings(found: List[MyMarketListing], listing: MyMarketListing, item_ids: Set[str]) -> bool:
+        """
+        Adds the listing to found if it is of one of the items.
+        :return: whether the listings of all the items are found, so no more pages are needed.
+        """
+        if listing.description.item_id in item_ids:
+            found.append(listing)
+        return len(found) == len(item_ids)
+
+    def _store_listing_ids(self, my_new_listings: List[MyMarketListing]) -> None:
+        with self.database.transaction():
+            self._update_listing_ids(items_sale_listings=my_new_listings)
 
     def _update_listing_ids(self, items_sale_listings: list[MyMarketListing]) -> None:
         """
@@ -213,24 +295,291 @@ class Exchange:
         :param items_sale_listings: dataframe containing all items of this kind on sale
         """
 
-        items_in_listings = [item.description.item_id for item in items_sale_listings]
-        listings_in_db = self.database.Listing.query_ref(listing_status=[MarketEventTypes.ListingCreated.name]).all()
-        for item_in_db in listings_in_db:
-            # The item is still listed. So not sold.
-            if item_in_db.item_id not in items_in_listings:
-                logger.info(f"Updating {item_in_db.item_id} {item_in_db.item.market_hash_name} to sold")
-                # item was sold.
-                item_in_db.item.sold = True
-        pass
+        items_in_listings = {item.description.item_id for item in items_sale_listings}
+        listings_in_db = (
+            self.database.Listing.query_ref(
+                listing_status=[MarketEventTypes.ListingCreated.name], account=self._config["username"]
+            )
+            .options(joinedload(self.database.Listing.item))
+            .all()
+        )
+        # The item is not listed anymore, so it was sold.
+        sold_listings = [listing for listing in listings_in_db if listing.item_id not in items_in_listings]
+        for listing in sold_listings:
+            market_hash_name = listing.item.market_hash_name if listing.item else ""
+            logger.info(f"Updating {listing.item_id} {market_hash_name} to sold")
+        if sold_listings:
+            # Listings cancelled from outside the bot look sold too, and their items are back in the inventory.
+            self.inventory_cache.invalidate("sold")
+        self.database.Item.mark_sold(listing.item_id for listing in sold_listings)
+
+    def _update_items_in_database(self, inventory_items_list: list[InventoryItem]) -> BulkInsertResult:
+        """
+        Stores the inventory items not yet in the database, with one lookup and one insert.
+        :param inventory_items_list: items currently in inventory
+        :return: number of items inserted and skipped.
+        """
+        items_by_id = {item.item_id: item for item in inventory_items_list}
+        already_in_db = self.database.Item.existing_item_ids(items_by_id)
+        new_items = [
+            {**vars(item), "account": self._config["username"]}
+            for item_id, item in items_by_id.items()
+            if item_id not in already_in_db
+        ]
+        inserted = self.database.Item.bulk_insert_ignore(new_items)
+        result = BulkInsertResult(inserted=inserted, skipped=len(inventory_items_list) - inserted)
+        logger.info(f"Inventory items: {result.inserted} added to database, {result.skipped} already present")
+        return result
 
-    def _update_items_in_database(self, inventory_items_list: list[InventoryItem]) -> None:
-        for item in inventory_items_list:
-            items_already_in_db = self.database.Item.query_ref(item_id=item.item_id).all()
-            if len(items_already_in_db) == 1:
-                continue
-            item_for_db = self.database.Item.from_item_dataclass(item=item, account=self._config["username"])
-            self.database.Item.query.session.add(item_for_db)
-        self.database.Item.query.session.flush()
+    def _record_orders(self, listed: List[ListOnMarket], delisted: List[DelistFromMarket]) -> None:
+        """
+        Records the orders sent, then applies them to the inventory snapshot once stored.
+        If they can't be stored, the snapshot is invalidated instead, as it no longer matches the database.
+        """
+        if not listed and not delisted:
+            return
+        try:
+            with self.database.transaction():
+                for element in listed:
+                    self._record_sale(element)
+                for item in delisted:
+                    self._record_delist(item)
+                self.database.Listing.query.session.flush()
+        except Exception:
+            self.inventory_cache.invalidate("rollback")
+            raise
+        self.inventory_cache.remove_items(element.item_id for element in listed)
+        if delisted:
+            # The items are back in the inventory, under new item ids.
+            self.inventory_cache.invalidate("delist")
+
+    def _record_delist(self, item: DelistFromMarket) -> None:
+        record = self.database.Listing.query_ref(item_id=item.item_id).first()
+
+        # delete this instead?
+        record.listing_status = MarketEventTypes.ListingCancelled.name
+        record.item.stale_item_id = True
+
+    def _record_sale(self, element: ListOnMarket) -> None:
+        listing_already_in_db = self.database.Listing.query_ref(
+            item_id=element.item_id, listing_status=[MarketEventTypes.ListingCreated.name]
+        ).all()
+        if len(listing_already_in_db) == 1:
+            return
+
+        for_db = self.database.Listing(
+            # listing_id
+            buyer_pay=int(element.buyer_pays),
+            you_receive=int(element.you_receive),
+            item_id=element.item_id,
+            currency=self.currency.name,
+        )
+        self.database.Listing.query.session.add(for_db)
+
+    def _update_events(self, market_events: list[MarketEvent]) -> BulkInsertResult:
+        """
+        Updates the database with the market events of the listings it knows, in a single insert.
+        :param market_events:
+        :return: number of events inserted and skipped.
+        """
+        known_listing_ids = self.database.Listing.existing_listing_ids(event.listingid for event in market_events)
+        already_in_db = self.database.Event.existing_event_types(known_listing_ids)
+
+        new_events = {}
+        for event in market_events:
+            key = (event.listingid, event.event_type.name)
+            if event.listingid in known_listing_ids and key not in already_in_db and key not in new_events:
+                new_events[key] = self.database.Event.values_from_market_event(market_event=event)
+
+        inserted = self.database.Event.bulk_insert_ignore(list(new_events.values()))
+        self.database.Listing.refresh_status(listing_id for listing_id, event_type in new_events)
+        result = BulkInsertResult(inserted=inserted, skipped=len(market_events) - inserted)
+        logger.debug(f"Market events: {result.inserted} added to database, {result.skipped} skipped")
+        return result
+
+
+class Exchange(BaseExchange):
+    """
+    Class representing an exchange. In this case Steam Market.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        inventory_provider: InventoryProvider,
+        market_provider: MarketProvider,
+        database: Database,
+    ):
+        super().__init__(config=config, database=database)
+        self.inventory_provider = inventory_provider
+        self.market_provider = market_provider
+
+    @property
+    def currency(self) -> Currency:
+        return self.market_provider.currency
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return getattr(self.market_provider, "rate_limiter", None)
+
+    def get_own_items(self, game: GameOptions = GameOptions.CS) -> List[InventoryItem]:
+        """
+        Gets *marketable* items in inventory for specified game
+        :param game: defaults CSGO
+        :return: List of Inventory items.
+        """
+        items_dict = self.inventory_cache.get(
+            self._inventory_key(game), fetch=partial(self.inventory_provider.get_my_inventory, game=game)
+        )
+        return self._parse_inventory(items_dict)
+
+    def get_item_price(self, market_hash_name: str) -> int:
+        """
+        Gets the item int_price from Steam
+        :param market_hash_name: Market hash market_hash_name.
+        :return: int. price in cents
+        """
+        price_data = self.price_cache.get(
+            market_hash_name,
+            self.currency.name,
+            fetch=partial(self.market_provider.get_item_price, market_hash_name=market_hash_name),
+        )
+        return self._parse_item_price(price_data)
+
+    def prefetch_prices(self, market_hash_names: List[str]) -> Dict[str, int]:
+        """
+        Gets the price of all the items up front, through a bounded pool of workers.
+        Workers go through the rate limits of the market provider, so only the network waits overlap.
+        :param market_hash_names: Market hash names of the items.
+        :return: price in cents by market hash name. Items whose price could not be fetched are left out.
+        """
+        prices = {}
+        with ThreadPoolExecutor(max_workers=self._price_workers) as executor:
+            futures = {
+                executor.submit(self.get_item_price, market_hash_name=market_hash_name): market_hash_name
+                for market_hash_name in market_hash_names
+            }
+            for future in as_completed(futures):
+                market_hash_name = futures[future]
+                try:
+                    prices[market_hash_name] = future.result()
+                except Exception as e:
+                    logger.warning(f"Could not get the price of {market_hash_name}: {e}")
+        return prices
+
+    def get_own_listings(self) -> List[MyMarketListing]:
+        """
+        Gets all items currently listed on the market
+        :return: List of My Market listings
+        """
+        return list(self.iter_own_listings())
+
+    def iter_own_listings(self, market_hash_name: Optional[str] = None) -> Iterator[MyMarketListing]:
+        """
+        Items currently listed on the market, fetched a page at a time while iterating.
+        Stop iterating to stop fetching, e.g. once the listing needed is found.
+        :param market_hash_name: only the listings of this item.
+        :return: My Market listings
+        """
+        for listing_id, listing_vars in self.market_provider.iter_my_market_listings():
+            listing = self._parse_listing(listing_vars, market_hash_name)
+            if listing is not None:
+                yield listing
+
+    def listings_of(self, item_ids: Set[str]) -> List[MyMarketListing]:
+        """
+        Listings of the items, fetching pages of listings only until all of them are found.
+        :param item_ids: items to find on the market.
+        :return: My Market listings of the items found.
+        """
+        found: List[MyMarketListing] = []
+        if not item_ids:
+            return found
+        for listing in self.iter_own_listings():
+            if self._collect_listings(found, listing, item_ids):
+                break
+        return found
+
+    def run(self) -> None:
+        """
+        :return:None
+        """
+        if self._sell_due:
+            self.sell()
+        self._heartbeat()
+
+    def close(self) -> None:
+        """
+        Waits for the price refreshes running, and stores the prices fetched.
+        """
+        self.price_cache.close()
+        self.price_cache.persist()
+
+    def sell(self) -> None:
+        """
+        Runs one sell loop now.
+        """
+        self._sell_loop()
+        self._last_run = arrow.now().timestamp()
+
+    def sync_history(self) -> None:
+        """
+        Ingests the new market events now.
+        """
+        self.sync_market_events()
+
+    def refresh_inventory(self, game: GameOptions = GameOptions.CS) -> None:
+        """
+        Fetches the inventory now and stores its new items, so the next sell loop reads it from the cache.
+        :param game: defaults CSGO
+        """
+        self.inventory_cache.invalidate("scheduled")
+        my_items = self.get_own_items(game=game)
+        with self.database.transaction():
+            self._update_items_in_database(inventory_items_list=my_items)
+
+    def _sell_loop(self) -> None:
+        """
+        Takes an exchange and runs the CheckSold, update database, sell more items cycle.
+        Item_id s change when you remove the item from the market.
+        Each phase is stored in its own transaction, and no transaction is open during the requests to Steam: a
+        failure late in the loop keeps the records of the orders already placed, and other writers of the database
+        are not blocked for the length of the loop.
+        """
+        # TODO think deeply how to do the business logic.
+        # TODO is this always needed?
+        my_items = self.get_own_items()
+        my_listings = self.get_own_listings()
+        self._store_inventory_and_listings(my_items=my_items, my_listings=my_listings)
+
+        sku_index = SkuIndex.build(items=my_items, listings=my_listings)
+        self.price_cache.restore()
+        prices = self.prefetch_prices(market_hash_names=list(self.items_to_sell))
+        self.price_cache.persist()
+        for to_list, to_delist in self._sku_plans(sku_index, prices):
+            self._dispatch_sku(to_list=to_list, to_delist=to_delist)
+        # Cleanup Block
+        self._store_listing_ids(self.listings_of(self._items_waiting_for_listing_id()))
+        self.sync_market_events()
+
+    def sync_market_events(self) -> None:
+        """
+        Ingests the market history events newer than the last ones stored for this account.
+        """
+        account = self._config["username"]
+        cursor = self.database.MarketHistoryCursor.get(account)
+        market_events = self.market_provider.get_new_market_events(cursor=cursor)
+        logger.debug(f"{len(market_events)} new market events since {cursor}")
+        self._store_market_events(market_events=market_events)
+
+    def backfill_market_events(self, page_size: int = 500) -> None:
+        """
+        Ingests the whole market history of this account. Needed once, incremental syncs take over from there.
+        :param page_size: events per request.
+        """
+        market_events = self.market_provider.get_all_market_events(page_size=page_size)
+        logger.info(f"Backfilling {len(market_events)} market events")
+        self._store_market_events(market_events=market_events)
 
     def dispatch_delists(self, to_delist: list[DelistFromMarket]) -> None:
         """
@@ -238,24 +587,7 @@ class Exchange:
         :param to_delist: list of dicts of items currently on sale which should be delisted.
         :return: None
         """
-        if not to_delist:
-            return
-
-        for item in to_delist:
-            if self.is_testing:
-                logger.debug("delist items. Debug is True. Updating database only")
-                logger.debug(f"{item.market_hash_name} cancel_sell_order({item.listing_id}")
-            else:
-                logger.debug("delist items. Debug is False. Sending cancel order to steam")
-                logger.debug(f"{item.market_hash_name} - listing_id {item.listing_id}")
-                self.market_provider.cancel_sell_order(sell_listing_id=item.listing_id)
-            record = self.database.Listing.query_ref(item_id=item.item_id).first()
-
-            # delete this instead?
-            record.listing_status = "CANCELLED"
-            record.item.stale_item_id = True
-
-        self.database.Listing.query.session.flush()
+        self._dispatch_sku(to_list=[], to_delist=to_delist)
 
     def dispatch_sales(self, item_for_sale_list: List[ListOnMarket]) -> None:
         """
@@ -263,60 +595,37 @@ class Exchange:
         :param item_for_sale_list: List of Dicts containing items to sell, and their prices, expressed as cents!
         :return:
         """
-        if not item_for_sale_list:
-            return
-        for element in item_for_sale_list:
-            if self.is_testing:
-                logger.debug(
-                    f"{element.market_hash_name} create_sell_order({element.item_id} )"
-                    f",money_to_receive={element.you_receive} buyer_pays {element.buyer_pays}"
-                )
-            else:
-                logger.debug(f"{element.market_hash_name} creating real sell order")
-                self.market_provider.create_sell_order(
-                    assetid=element.item_id,
-                    game=GameOptions.CS,
-                    money_to_receive=element.you_receive,
-                )
-
-            buyer_pays = int(element.buyer_pays)
-            you_receive = int(element.you_receive)
-
-            listing_already_in_db = self.database.Listing.query_ref(
-                item_id=element.item_id, listing_status=[MarketEventTypes.ListingCreated.name]
-            ).all()
-            if len(listing_already_in_db) == 1:
-                continue
-
-            for_db = self.database.Listing(
-                # listing_id
-                buyer_pay=buyer_pays,
-                you_receive=you_receive,
-                item_id=element.item_id,
-                currency=self.market_provider.currency.name,
-            )
-            self.database.Listing.query.session.add(for_db)
-        self.database.Listing.query.session.flush()
+        self._dispatch_sku(to_list=item_for_sale_list, to_delist=[])
 
-    def _update_events(self, market_events: list[MarketEvent]) -> None:
+    def _dispatch_sku(self, to_list: List[ListOnMarket], to_delist: List[DelistFromMarket]) -> None:
         """
-        Updates the database with the market events.
-        :param market_events:
-        :return:
+        Sends the sell and cancel orders of a SKU to Steam, then records the ones sent in a single transaction.
+        If an order fails, the orders sent before it are still recorded.
+        :param to_list: items to list.
+        :param to_delist: listings to cancel.
         """
-        listing_id_to_update = [a.listing_id for a in self.database.Listing.query.all()]
+        listed: List[ListOnMarket] = []
+        delisted: List[DelistFromMarket] = []
+        try:
+            for element in to_list:
+                self._create_sell_order(element)
+                listed.append(element)
+            for item in to_delist:
+                self._cancel_sell_order(item)
+                delisted.append(item)
+        finally:
+            self._record_orders(listed=listed, delisted=delisted)
+
+    def _create_sell_order(self, element: ListOnMarket) -> None:
+        self._log_sell_order(element)
+        if not self.is_testing:
+            self.market_provider.create_sell_order(
+                assetid=element.item_id,
+                game=GameOptions.CS,
+                money_to_receive=element.you_receive,
+            )
 
-        for event in market_events:
-            if event.listingid in listing_id_to_update:
-                try:
-                    event_already_in_db = self.database.Event.query_ref(
-                        listing_id=event.listingid, event_type=event.event_type.name
-                    ).all()
-                except IntegrityError as e:
-                    logger.debug(f"Integrity error {e}")
-                    continue
-                if len(event_already_in_db) == 1:
-                    continue
-                for_db = self.database.Event.from_market_event(market_event=event)
-                self.database.Event.query.session.add(for_db)
-        self.database.Event.query.session.flush()
+    def _cancel_sell_order(self, item: DelistFromMarket) -> None:
+        self._log_cancel_order(item)
+        if not self.is_testing:
+            self.market_provider.cancel_sell_order(sell_listing_id=item.listing_id)
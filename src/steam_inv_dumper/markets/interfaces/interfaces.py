@@ -1,9 +1,23 @@
-from typing import Protocol, Type, TypeVar
+from datetime import datetime
+from typing import (
+    AsyncIterator,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 from steampy.models import Currency, GameOptions
 
+from steam_inv_dumper.utils.data_structures import MarketEvent
+
 T = TypeVar("T", bound="InventoryProvider")
 W = TypeVar("W", bound="MarketProvider")
+AT = TypeVar("AT", bound="AsyncInventoryProvider")
+AW = TypeVar("AW", bound="AsyncMarketProvider")
 
 
 class InventoryProvider(Protocol):
@@ -39,3 +53,63 @@ class MarketProvider(Protocol):
 
     def get_my_market_listings(self) -> dict:
         pass
+
+    def iter_my_market_listings(self, page_size: int = 100) -> Iterator[Tuple[str, dict]]:
+        pass
+
+    def get_market_events(self, start: int = 1, count: int = 100) -> List[MarketEvent]:
+        pass
+
+    def get_new_market_events(self, cursor: Optional[Tuple[datetime, int]], page_size: int = 100) -> List[MarketEvent]:
+        pass
+
+    def get_all_market_events(self, page_size: int = 500) -> List[MarketEvent]:
+        pass
+
+
+class AsyncInventoryProvider(Protocol):
+    @classmethod
+    def initialize(cls: Type[AT], config: dict) -> AT:
+        pass
+
+    async def get_my_inventory(self, game: GameOptions) -> dict:
+        pass
+
+
+class AsyncMarketProvider(Protocol):
+    @classmethod
+    def initialize(cls: Type[AW], config: dict) -> AW:
+        pass
+
+    async def cancel_sell_order(self, sell_listing_id: str) -> None:
+        pass
+
+    async def create_sell_order(self, assetid: str, game: GameOptions, money_to_receive: str) -> dict:
+        pass
+
+    @property
+    def currency(self) -> Currency:
+        pass
+
+    async def get_item_price(self, market_hash_name: str) -> dict:
+        pass
+
+    async def get_my_market_listings(self) -> dict:
+        pass
+
+    def iter_my_market_listings(self, page_size: int = 100) -> AsyncIterator[Tuple[str, dict]]:
+        pass
+
+    async def get_market_events(self, start: int = 1, count: int = 100) -> List[MarketEvent]:
+        pass
+
+    async def get_new_market_events(
+        self, cursor: Optional[Tuple[datetime, int]], page_size: int = 100
+    ) -> List[MarketEvent]:
+        pass
+
+    async def get_all_market_events(self, page_size: int = 500) -> List[MarketEvent]:
+        pass
+
+    async def aclose(self) -> None:
+        pass
@@ -0,0 +1,143 @@
+import logging
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.markets.exchange import Exchange
+from steam_inv_dumper.markets.interfaces.interfaces import InventoryProvider
+from steam_inv_dumper.markets.steam.client import steam_client_factory
+from steam_inv_dumper.markets.steam.market import steam_market_factory
+from steam_inv_dumper.utils.configuration import account_configs
+from steam_inv_dumper.utils.scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+ExchangeFactory = Callable[[dict, Database], Exchange]
+
+DEFAULT_DAEMON_CONFIG = {
+    "history_interval": 900,
+    # Defaults to the refresh interval of the inventory cache.
+    "inventory_interval": None,
+    # Fraction of every interval added at random.
+    "jitter": 0.1,
+}
+
+
+def market_config(config: dict, inventory_provider: InventoryProvider) -> dict:
+    """
+    Config of the market providers: the session of the logged in client, plus the market settings.
+    """
+    return {
+        **inventory_provider.market_params,
+        "steamguard": config["steamguard"],
+        "debug": config["debug"],
+        "rate_limits": config.get("rate_limits"),
+        "rate_limit_file": config.get("rate_limit_file"),
+    }
+
+
+def build_exchange(config: dict, database: Database) -> Exchange:
+    """
+    Logs in the account of the config, and builds its Exchange on the database.
+    """
+    inventory_provider = steam_client_factory(config=config)
+    market_provider = steam_market_factory(config=market_config(config, inventory_provider))
+    return Exchange(
+        config=config, inventory_provider=inventory_provider, market_provider=market_provider, database=database
+    )
+
+
+class MultiAccountRunner:
+    """
+    Runs the sell loop of every account of the config in a single process, on one database and one scheduler.
+    An account failing to log in or to sell is logged and retried later, without stopping the other accounts.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        database: Database,
+        scheduler: Optional[Scheduler] = None,
+        exchange_factory: ExchangeFactory = build_exchange,
+    ) -> None:
+        self._config = config
+        self._accounts = {account["username"]: account for account in account_configs(config)}
+        self._exchange_factory = exchange_factory
+        self.database = database
+        self.scheduler = scheduler or Scheduler()
+        self.exchanges: Dict[str, Exchange] = {}
+
+    def exchange_for(self, username: str) -> Exchange:
+        """
+        Exchange of the account, logged in on first use.
+        """
+        if username not in self.exchanges:
+            self.exchanges[username] = self._exchange_factory(self._accounts[username], self.database)
+        return self.exchanges[username]
+
+    def sell(self, username: str) -> None:
+        logger.info(f"Sell loop of {username}")
+        self.exchange_for(username).sell()
+
+    def heartbeat(self) -> None:
+        failing = [job.name for job in self.scheduler.jobs if job.consecutive_failures]
+        logger.info(f"Bot heartbeat. {len(self._accounts)} accounts, failing jobs: {failing or 'none'}")
+
+    def schedule(self) -> None:
+        """
+        Adds a sell job per account. First runs are spread over the stagger interval, to not burst the market.
+        """
+        stagger = self._config.get("account_stagger", 10)
+        for position, (username, account) in enumerate(self._accounts.items()):
+            self.scheduler.add_job(
+                name=f"sell {username}",
+                func=partial(self.sell, username),
+                interval=account.get("market_sell_timeout", 300),
+                delay=position * stagger,
+            )
+        heartbeat_interval = self._config.get("heartbeat_interval", 100)
+        if heartbeat_interval:
+            self.scheduler.add_job(name="heartbeat", func=self.heartbeat, interval=heartbeat_interval)
+
+    def run_forever(self) -> None:
+        self.schedule()
+        self.scheduler.run_forever()
+        for exchange in self.exchanges.values():
+            exchange.close()
+
+
+class ExchangeDaemon:
+    """
+    Keeps the Exchange of one account resident, running its sell loop, market history sync, inventory refresh and
+    heartbeat as independently timed jobs, until SIGINT or SIGTERM.
+    """
+
+    def __init__(self, exchange: Exchange, config: dict, scheduler: Optional[Scheduler] = None) -> None:
+        self.exchange = exchange
+        self._config = config
+        self.scheduler = scheduler or Scheduler()
+
+    def schedule(self) -> None:
+        """
+        Adds the jobs. The sell loop runs first, it fetches the inventory and the history itself.
+        """
+        daemon_config = {**DEFAULT_DAEMON_CONFIG, **self._config.get("daemon", {})}
+        inventory_interval = daemon_config["inventory_interval"] or self.exchange.inventory_cache.refresh_interval
+        history_interval = daemon_config["history_interval"]
+        jobs: List[Tuple[str, Callable[[], None], float, float]] = [
+            ("sell", self.exchange.sell, self._config.get("market_sell_timeout", 300), 0),
+            ("inventory refresh", self.exchange.refresh_inventory, inventory_interval, inventory_interval),
+            ("history sync", self.exchange.sync_history, history_interval, history_interval),
+            ("heartbeat", self.exchange.heartbeat, self._config.get("heartbeat_interval", 100), 0),
+        ]
+        for name, func, interval, delay in jobs:
+            if interval:
+                self.scheduler.add_job(
+                    name=name, func=func, interval=interval, delay=delay, jitter=interval * daemon_config["jitter"]
+                )
+
+    def run_forever(self) -> None:
+        self.schedule()
+        logger.info(f"Daemon started: {', '.join(job.name for job in self.scheduler.jobs)}")
+        self.scheduler.run_forever()
+        self.exchange.close()
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+from http import HTTPStatus
+from typing import Any, AsyncIterator, List, Optional, Tuple, Type, TypeVar, Union
+
+import httpx
+from steampy.confirmation import ConfirmationExecutor
+from steampy.exceptions import ApiException, TooManyRequests
+from steampy.models import Currency, GameOptions, SteamUrl
+from steampy.utils import merge_items_with_descriptions_from_inventory
+
+from steam_inv_dumper.markets.interfaces.interfaces import AsyncMarketProvider
+from steam_inv_dumper.markets.steam.http import http_config, timeout_for
+from steam_inv_dumper.markets.steam.market import (
+    HistoryCursor,
+    MockedSteamMarket,
+    parse_history_page,
+    parse_my_listings_page,
+)
+from steam_inv_dumper.utils.data_structures import MarketEvent
+from steam_inv_dumper.utils.rate_limiter import (
+    RateLimiter,
+    parse_rate_limits,
+    shared_rate_limiter,
+)
+
+logger = logging.getLogger(__name__)
+
+A = TypeVar("A", bound="AsyncSteamMarket")
+
+
+class AsyncSteamMarket:
+    """
+    Steam market and inventory provider on top of httpx, to be awaited by AsyncExchange.
+    Uses the cookies of the session logged in by SteamClientPatched.
+    """
+
+    def __init__(
+        self,
+        steamguard: dict,
+        session_id: str,
+        currency: Currency,
+        cookies: Any = None,
+        base_url: str = SteamUrl.COMMUNITY_URL,
+        rate_limiter: Optional[RateLimiter] = None,
+        confirmation_session: Any = None,
+        http: Optional[dict] = None,
+    ) -> None:
+        http = http_config(http)
+        self._timeouts = http["timeouts"]
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            cookies=cookies,
+            follow_redirects=True,
+            headers={"Accept-Encoding": "gzip, deflate"},
+            # httpx only retries failed connections.
+            transport=httpx.AsyncHTTPTransport(
+                retries=http["retries"],
+                limits=httpx.Limits(
+                    max_connections=http["pool_maxsize"], max_keepalive_connections=http["pool_maxsize"]
+                ),
+            ),
+        )
+        self._steam_guard = steamguard
+        self._session_id = session_id
+        self._currency = currency
+        self._rate_limiter = rate_limiter or shared_rate_limiter()
+        # requests session used by steampy to confirm listings from the mobile authenticator.
+        self._confirmation_session = confirmation_session
+
+    @classmethod
+    def initialize(cls: Type[A], config: dict) -> A:
+        return cls(
+            session_id=config["session_id"],
+            steamguard=config["steamguard"],
+            currency=config["currency"],
+            cookies=config["session"].cookies,
+            confirmation_session=config["session"],
+            http=config.get("http"),
+            rate_limiter=shared_rate_limiter(
+                limits=parse_rate_limits(config.get("rate_limits")), state_file=config.get("rate_limit_file")
+            ),
+        )
+
+    @property
+    def currency(self) -> Currency:
+        return self._currency
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._rate_limiter
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        timeout = timeout_for(url, self._timeouts)
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        return await self._client.request(method, url, timeout=httpx.Timeout(read, connect=connect), **kwargs)
+
+    async def _get_json(self, url: str, params: Optional[dict] = None) -> dict:
+        response = await self._request("GET", url, params=params)
+        if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            raise TooManyRequests(f"Too many requests to {url}")
+        if response.status_code != HTTPStatus.OK:
+            raise ApiException(f"There was a problem calling {url}. http code: {response.status_code}")
+        return response.json()
+
+    async def get_my_inventory(self, game: GameOptions) -> dict:
+        """
+        Gets the inventory of the account, merged with the item descriptions.
+        :param game: game of the inventory.
+        """
+        await self._rate_limiter.acquire_async()
+        url = f"/inventory/{self._steam_guard['steamid']}/{game.app_id}/{game.context_id}"
+        response = await self._get_json(url, params={"l": "english", "count": 5000})
+        if response.get("success") != 1:
+            raise ApiException("Success value should be 1.")
+        return merge_items_with_descriptions_from_inventory(response, game)
+
+    async def get_item_price(self, market_hash_name: str) -> dict:
+        """
+        Gets the item int_price from Steam
+        :param market_hash_name: Market hash market_hash_name.
+        :return:{"success":true,"lowest_price":"6,70€","volume":"7","median_price":"6,70€"}
+        """
+        await self._rate_limiter.acquire_async()
+        params = {
+            "country": "PL",
+            "currency": self._currency.value,
+            "appid": GameOptions.CS.app_id,
+            "market_hash_name": market_hash_name,
+        }
+        price_data = await self._get_json("/market/priceoverview/", params=params)
+        if price_data.get("success") is True:
+            return price_data
+        raise Exception("Error getting price")
+
+    async def iter_my_market_listings(self, page_size: int = 100) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Sell listings of the account, fetched a page at a time while iterating.
+        :param page_size: listings per request.
+        :return: (listing_id, listing) pairs.
+        """
+        start = 0
+        while True:
+            await self._rate_limiter.acquire_async()
+            response = await self._get_json(
+                "/market/mylistings/render/", params={"query": "", "start": start, "count": page_size}
+            )
+            page = parse_my_listings_page(response)["sell_listings"]
+            for item in page.items():
+                yield item
+            start += page_size
+            if not page or start >= response.get("total_count", 0):
+                return
+
+    async def get_my_market_listings(self, page_size: int = 100) -> dict:
+        """
+        Gets all the sell listings of the account, paging through mylistings/render.
+        :param page_size: listings per request.
+        :return: {"sell_listings": {listing_id: listing}}
+        """
+        sell_listings = {
+            listing_id: listing async for listing_id, listing in self.iter_my_market_listings(page_size=page_size)
+        }
+        return {"sell_listings": sell_listings}
+
+    async def create_sell_order(self, assetid: str, game: GameOptions, money_to_receive: str) -> dict:
+        await self._rate_limiter.acquire_async()
+        data = {
+            "assetid": assetid,
+            "sessionid": self._session_id,
+            "contextid": game.context_id,
+            "appid": game.app_id,
+            "amount": 1,
+            "price": money_to_receive,
+        }
+        headers = {"Referer": f"{SteamUrl.COMMUNITY_URL}/profiles/{self._steam_guard['steamid']}/inventory"}
+        response = (await self._request("POST", "/market/sellitem/", data=data, headers=headers)).json()
+        has_pending_confirmation = "pending confirmation" in response.get("message", "")
+        needs_confirmation = response.get("needs_mobile_confirmation") or (
+            not response.get("success") and has_pending_confirmation
+        )
+        if needs_confirmation and self._confirmation_session is not None:
+            executor = ConfirmationExecutor(
+                self._steam_guard["identity_secret"], self._steam_guard["steamid"], self._confirmation_session
+            )
+            return await asyncio.to_thread(executor.confirm_sell_listing, assetid)
+        return response
+
+    async def cancel_sell_order(self, sell_listing_id: str) -> None:
+        await self._rate_limiter.acquire_async()
+        headers = {"Referer": f"{SteamUrl.COMMUNITY_URL}/market/"}
+        response = await self._request(
+            "POST", f"/market/removelisting/{sell_listing_id}", data={"sessionid": self._session_id}, headers=headers
+        )
+        if response.status_code != HTTPStatus.OK:
+            raise ApiException(f"There was a problem removing the listing. http code: {response.status_code}")
+
+    async def _fetch_market_history_page(self, start: int, count: int) -> dict:
+        await self._rate_limiter.acquire_async()
+        return await self._get_json(
+            "/market/myhistory/render/", params={"norender": 1, "query": "", "start": start, "count": count}
+        )
+
+    async def _fetch_market_events_since(
+        self, cursor: Optional[HistoryCursor], page_size: int, max_pages: Optional[int]
+    ) -> List[MarketEvent]:
+        events: List[MarketEvent] = []
+        start = 0
+        pages = 0
+        while max_pages is None or pages < max_pages:
+            response = await self._fetch_market_history_page(start, page_size)
+            pages += 1
+            new_events, page_length, has_more = parse_history_page(response, cursor=cursor)
+            events.extend(new_events)
+            start += page_length
+            if not has_more or start >= response.get("total_count", 0):
+                break
+        return events
+
+    async def get_market_events(self, start: int = 1, count: int = 100) -> List[MarketEvent]:
+        response = await self._fetch_market_history_page(start, count)
+        return [MarketEvent.from_event(event) for event in response["events"]]
+
+    async def get_new_market_events(self, cursor: Optional[HistoryCursor], page_size: int = 100) -> List[MarketEvent]:
+        return await self._fetch_market_events_since(cursor, page_size, max_pages=None if cursor else 1)
+
+    async def get_all_market_events(self, page_size: int = 500) -> List[MarketEvent]:
+        return await self._fetch_market_events_since(None, page_size, max_pages=None)
+
+
+def async_steam_market_factory(config: dict) -> Union[AsyncMarketProvider, MockedSteamMarket]:
+    if config.get("debug", True) is False:
+        return AsyncSteamMarket.initialize(config=config)
+    return MockedSteamMarket.initialize(config=config)
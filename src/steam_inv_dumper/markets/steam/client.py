@@ -28,6 +28,7 @@ class SteamClientPatched(SteamClient):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.currency = None
+        self.http_config: dict = {}
 
     def to_pickle(self, filename: str) -> None:
         """
@@ -106,6 +107,7 @@ class SteamClientPatched(SteamClient):
                 steam_client = SteamClientPatched._login_and_save_cookies(config=config)
         else:
             steam_client = SteamClientPatched._login_and_save_cookies(config=config)
+        steam_client.http_config = config.get("http") or {}
         return steam_client
 
     @property
@@ -114,6 +116,7 @@ class SteamClientPatched(SteamClient):
             "session": self.session,
             "session_id": self.session_id,
             "currency": self.currency,
+            "http": self.http_config,
         }
 
 
@@ -0,0 +1,136 @@
+import logging
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Defaults of the "http" setting.
+DEFAULT_HTTP_CONFIG: Dict[str, Any] = {
+    "pool_connections": 4,
+    "pool_maxsize": 16,
+    "retries": 3,
+    "backoff_factor": 0.5,
+    # Seconds, per endpoint class. A (connect, read) pair is accepted too.
+    "timeouts": {
+        "price": 10,
+        "listings": 20,
+        "inventory": 20,
+        "history": 30,
+        "sell": 30,
+        "default": 30,
+    },
+}
+
+# Path prefixes of the Steam endpoints, by endpoint class.
+ENDPOINT_CLASSES = (
+    ("/market/priceoverview", "price"),
+    ("/market/pricehistory", "price"),
+    ("/market/mylistings", "listings"),
+    ("/market/myhistory", "history"),
+    ("/market/sellitem", "sell"),
+    ("/market/removelisting", "sell"),
+    ("/market/createbuyorder", "sell"),
+    ("/market/cancelbuyorder", "sell"),
+    ("/market/buylisting", "sell"),
+    ("/inventory", "inventory"),
+)
+
+# Seconds, or a (connect, read) pair.
+Timeout = Union[float, Tuple[float, float]]
+# Timeout as read from the config, where the pair is a list.
+ConfiguredTimeout = Union[float, Sequence[float]]
+
+
+def http_config(config: Optional[dict]) -> dict:
+    """
+    :param config: "http" setting, merged over DEFAULT_HTTP_CONFIG.
+    """
+    config = config or {}
+    return {
+        **DEFAULT_HTTP_CONFIG,
+        **config,
+        "timeouts": {**DEFAULT_HTTP_CONFIG["timeouts"], **config.get("timeouts", {})},
+    }
+
+
+def endpoint_class(url: str) -> str:
+    path = urlsplit(url).path
+    for prefix, name in ENDPOINT_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return "default"
+
+
+def timeout_for(url: str, timeouts: Dict[str, ConfiguredTimeout]) -> Timeout:
+    timeout = timeouts.get(endpoint_class(url), timeouts["default"])
+    if isinstance(timeout, (int, float)):
+        return timeout
+    connect, read = timeout
+    return connect, read
+
+
+class SteamHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter applying the timeout of the endpoint class to the requests sent without one.
+    """
+
+    # Pickled with the session of SteamClientPatched.
+    __attrs__ = HTTPAdapter.__attrs__ + ["timeouts"]
+
+    def __init__(self, timeouts: Optional[Dict[str, ConfiguredTimeout]] = None, **kwargs: Any) -> None:
+        self.timeouts: Dict[str, ConfiguredTimeout] = timeouts or DEFAULT_HTTP_CONFIG["timeouts"]
+        super().__init__(**kwargs)
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Union[None, float, Tuple[float, float], Tuple[float, None]] = None,
+        verify: Union[bool, str] = True,
+        cert: Union[None, bytes, str, Tuple[Union[bytes, str], Union[bytes, str]]] = None,
+        proxies: Optional[Mapping[str, str]] = None,
+    ) -> requests.Response:
+        if timeout is None:
+            timeout = timeout_for(request.url or "", self.timeouts)
+        return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+
+def transport_retry(retries: int, backoff_factor: float) -> Retry:
+    """
+    Retries connection errors for every method, and read errors for the idempotent ones only,
+    so that a sell order is never sent twice. HTTP statuses are left to the callers.
+    """
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=0,
+        backoff_factor=backoff_factor,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+
+
+def configure_session(session: requests.Session, config: Optional[dict] = None) -> requests.Session:
+    """
+    Mounts a pooled, retrying adapter with timeouts per endpoint class on the session, and asks for
+    compressed, kept alive connections.
+    :param session: session shared by the steam client and market.
+    :param config: "http" setting.
+    """
+    config = http_config(config)
+    adapter = SteamHTTPAdapter(
+        timeouts=config["timeouts"],
+        pool_connections=config["pool_connections"],
+        pool_maxsize=config["pool_maxsize"],
+        max_retries=transport_retry(config["retries"], config["backoff_factor"]),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+    logger.debug(f"HTTP session configured: {config}")
+    return session
@@ -1,29 +1,140 @@
 import json
 import logging
+from datetime import datetime
+from functools import wraps
 from pathlib import Path
-from typing import Callable, Type, TypeVar
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 import requests
-from backoff import expo, on_exception
-from ratelimit import RateLimitException, limits
 from steampy.exceptions import ApiException
 from steampy.market import SteamMarket
-from steampy.models import Currency, GameOptions
+from steampy.models import Currency, GameOptions, SteamUrl
+from steampy.utils import (
+    get_listing_id_to_assets_address_from_html,
+    get_market_sell_listings_from_api,
+    merge_items_with_descriptions_from_listing,
+)
 
 from steam_inv_dumper.markets.interfaces.interfaces import MarketProvider
+from steam_inv_dumper.markets.steam.http import configure_session
 from steam_inv_dumper.utils.data_structures import MarketEvent
+from steam_inv_dumper.utils.rate_limiter import (
+    RateLimiter,
+    parse_rate_limits,
+    shared_rate_limiter,
+)
 
 logger = logging.getLogger(__name__)
 
 
-# TODO: proxy all the calls within a common method, and rate limit that instead.
-# TODO: Add a new method, to fetch events from Steam Market History.
-# "https://steamcommunity.com/market/myhistory/render/?norender=1&query=&start=1&count=130"
-
-
-# Else too much risk to forget adding one over here.
 K = TypeVar("K", bound="SteamMarketLimited")
 T = TypeVar("T", bound="MockedSteamMarket")
+# Newest event already ingested: (event_datetime, time_event_fraction)
+HistoryCursor = Tuple[datetime, int]
+
+
+def parse_history_page(response: dict, cursor: Optional[HistoryCursor]) -> Tuple[List[MarketEvent], int, bool]:
+    """
+    Parses a page of the market history, newest events first.
+    :param response: raw page from the market history endpoint.
+    :param cursor: newest event already ingested. If None, all events are new.
+    :return: events newer than the cursor, number of events in the page, and whether older pages hold new events.
+    """
+    page = [MarketEvent.from_event(event) for event in response.get("events", [])]
+    new_events = [
+        event for event in page if cursor is None or (event.event_datetime, event.time_event_fraction) > cursor
+    ]
+    return new_events, len(page), bool(page) and len(new_events) == len(page)
+
+
+def fetch_market_events_since(
+    fetch_page: Callable[[int, int], dict],
+    cursor: Optional[HistoryCursor] = None,
+    page_size: int = 100,
+    max_pages: Optional[int] = None,
+) -> List[MarketEvent]:
+    """
+    Pages through the market history, newest events first, until reaching the events at or before the cursor.
+    :param fetch_page: function returning the raw market history page for (start, count).
+    :param cursor: newest event already ingested. If None, pages until the end of the history.
+    :param page_size: events per page.
+    :param max_pages: stop after this many pages.
+    :return: events newer than the cursor, newest first.
+    """
+    events: List[MarketEvent] = []
+    start = 0
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        response = fetch_page(start, page_size)
+        pages += 1
+        new_events, page_length, has_more = parse_history_page(response, cursor=cursor)
+        events.extend(new_events)
+        start += page_length
+        if not has_more or start >= response.get("total_count", 0):
+            break
+    return events
+
+
+def parse_my_listings_page(response: dict) -> dict:
+    """
+    Parses a page of the mylistings/render endpoint into sell listings with their item description.
+    :param response: raw page from the mylistings/render endpoint.
+    :return: {"sell_listings": {listing_id: listing}}, as returned by get_my_market_listings.
+    """
+    listing_id_to_assets_address = get_listing_id_to_assets_address_from_html(response.get("hovers", ""))
+    listings = get_market_sell_listings_from_api(response.get("results_html", ""))
+    return merge_items_with_descriptions_from_listing(
+        listings, listing_id_to_assets_address, response.get("assets", {})
+    )
+
+
+def rate_limited(method: Callable) -> Callable:
+    """
+    Wraps a method so that every call first waits for the rate limiter of the instance.
+    """
+
+    @wraps(method)
+    def wrapper(self: "SteamMarketLimited", *args: Any, **kwargs: Any) -> Any:
+        self._rate_limiter.acquire()
+        return method(self, *args, **kwargs)
+
+    wrapper.__rate_limited__ = True  # type: ignore[attr-defined]
+    return wrapper
+
+
+def _wrap_rate_limited_methods(cls: Type["SteamMarketLimited"]) -> None:
+    for name in cls.rate_limited_methods:
+        method = getattr(cls, name)
+        if not getattr(method, "__rate_limited__", False):
+            setattr(cls, name, rate_limited(method))
+
+
+def iter_market_listings(fetch_page: Callable[[int, int], dict], page_size: int = 100) -> Iterator[Tuple[str, dict]]:
+    """
+    Pages through the mylistings/render endpoint, yielding the sell listings of a page before fetching the next one.
+    Stops fetching as soon as the caller stops iterating.
+    :param fetch_page: function returning the raw listings page for (start, count).
+    :param page_size: listings per page. Steam returns at most 100.
+    :return: (listing_id, listing) pairs, as in get_my_market_listings()["sell_listings"].
+    """
+    start = 0
+    while True:
+        response = fetch_page(start, page_size)
+        sell_listings = parse_my_listings_page(response)["sell_listings"]
+        yield from sell_listings.items()
+        start += page_size
+        if not sell_listings or start >= response.get("total_count", 0):
+            return
 
 
 class SteamMarketLimited(SteamMarket):
@@ -31,60 +142,45 @@ class SteamMarketLimited(SteamMarket):
     Patched steam Market class to provide rate-limiting for requests to Steam.
     """
 
+    # Methods calling the steam market. They are wrapped once, when the class (or a subclass) is created.
+    rate_limited_methods: ClassVar[Tuple[str, ...]] = (
+        "fetch_price",
+        "fetch_price_history",
+        "get_my_market_listings",
+        "create_sell_order",
+        "create_buy_order",
+        "buy_item",
+        "cancel_sell_order",
+        "cancel_buy_order",
+        "_fetch_my_listings_page",
+        "_fetch_market_history_page",
+    )
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        _wrap_rate_limited_methods(cls)
+
     def __init__(
         self,
         session: requests.Session,
         steamguard: dict,
         session_id: str,
         currency: Currency,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> None:
         super().__init__(session)
         self._set_login_executed(steamguard=steamguard, session_id=session_id)
         self._currency = currency
+        self._rate_limiter = rate_limiter or shared_rate_limiter()
 
-    @on_exception(expo, RateLimitException, max_tries=8)
-    @limits(calls=1, period=3, storage="ratelimit.sqlite", name="short_range")
-    @limits(calls=15, period=60, storage="ratelimit.sqlite", name="hourly")
-    def limiter_function(self, func: Callable) -> Callable:
-        """
-        Rate limit function. To understand if both the limits apply globally, or one is per account.
-        """
-
-        def new_func(*args, **kwargs) -> Callable:
-            out = func(*args, **kwargs)
-            return out
-
-        return new_func
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._rate_limiter
 
     @property
     def currency(self) -> Currency:
         return self._currency
 
-    def __getattribute__(self, item: str) -> Callable:
-        """
-        "intercepts" the methods which call the steam market, and apply rate limits to them.
-        """
-        attribute = super().__getattribute__(item)
-        try:
-            if (callable(attribute)) & (
-                attribute.__name__
-                in [
-                    "fetch_price",
-                    "fetch_price_history",
-                    "get_my_market_listings",
-                    "create_sell_order",
-                    "create_buy_order",
-                    "buy_item",
-                    "cancel_sell_order",
-                    "cancel_buy_order",
-                ]
-            ):
-                return self.limiter_function(attribute)
-            else:
-                return attribute
-        except AttributeError:
-            return attribute
-
     # TODO refactor and add tests
     @staticmethod
     def parse_listings_for_item(req_json: dict) -> list[dict]:
@@ -119,8 +215,7 @@ class SteamMarketLimited(SteamMarket):
         :param market_hash_name: Market hash market_hash_name.
         :return:{"success":true,"lowest_price":"6,70€","volume":"7","median_price":"6,70€"}
         """
-        # TODO fix this to return data correctly.
-        price_data = self.fetch_price(market_hash_name, game=GameOptions.CS, currency=str(self.currency))
+        price_data = self.fetch_price(market_hash_name, game=GameOptions.CS, currency=self.currency)
         if price_data.get("success") is True:
             return price_data
         raise Exception("Error getting price")
@@ -131,22 +226,71 @@ class SteamMarketLimited(SteamMarket):
             session_id=config["session_id"],
             steamguard=config["steamguard"],
             currency=config["currency"],
-            session=config["session"],
+            session=configure_session(config["session"], config.get("http")),
+            rate_limiter=shared_rate_limiter(
+                limits=parse_rate_limits(config.get("rate_limits")), state_file=config.get("rate_limit_file")
+            ),
         )
 
-    def get_market_events(self, start: int = 1, count: int = 100) -> list[MarketEvent]:
+    def _fetch_my_listings_page(self, start: int, count: int) -> dict:
         """
-        Gets the market events from the Steam Market History.
+        Gets a raw page of the listings of the account.
+        :param start: start index.
+        :param count: count of listings to fetch.
+        """
+        url = f"{SteamUrl.COMMUNITY_URL}/market/mylistings/render/?query=&start={start}&count={count}"
+        response = self._session.get(url)
+        if response.status_code != 200:
+            raise ApiException("There was a problem getting the listings. http code: %s" % response.status_code)
+        return response.json()
+
+    def iter_my_market_listings(self, page_size: int = 100) -> Iterator[Tuple[str, dict]]:
+        """
+        Sell listings of the account, fetched a page at a time while iterating.
+        :param page_size: listings per request.
+        :return: (listing_id, listing) pairs.
+        """
+        return iter_market_listings(self._fetch_my_listings_page, page_size=page_size)
+
+    def _fetch_market_history_page(self, start: int, count: int) -> dict:
+        """
+        Gets a raw page of the Steam Market History.
         :param start: start index.
         :param count: count of events to fetch.
-        :return: List of MarketEvent objects.
         """
         url = f"https://steamcommunity.com/market/myhistory/render/?norender=1&query=&start={start}&count={count}"
         response = self._session.get(url)
         if response.status_code != 200:
             raise ApiException("There was a problem getting the listings. http code: %s" % response.status_code)
-        res = response.json()
-        return self._parse_market_events(response=res)
+        return response.json()
+
+    def get_market_events(self, start: int = 1, count: int = 100) -> list[MarketEvent]:
+        """
+        Gets the market events from the Steam Market History.
+        :param start: start index.
+        :param count: count of events to fetch.
+        :return: List of MarketEvent objects.
+        """
+        return self._parse_market_events(response=self._fetch_market_history_page(start=start, count=count))
+
+    def get_new_market_events(self, cursor: Optional[HistoryCursor], page_size: int = 100) -> list[MarketEvent]:
+        """
+        Gets the market events newer than the cursor. Without a cursor, only the latest page.
+        :param cursor: newest event already ingested.
+        :param page_size: events per request.
+        :return: List of MarketEvent objects, newest first.
+        """
+        return fetch_market_events_since(
+            self._fetch_market_history_page, cursor=cursor, page_size=page_size, max_pages=None if cursor else 1
+        )
+
+    def get_all_market_events(self, page_size: int = 500) -> list[MarketEvent]:
+        """
+        Gets the whole Steam Market History.
+        :param page_size: events per request.
+        :return: List of MarketEvent objects, newest first.
+        """
+        return fetch_market_events_since(self._fetch_market_history_page, page_size=page_size)
 
     def _parse_market_events(self, response: dict) -> list[MarketEvent]:
         """
@@ -159,6 +303,9 @@ class SteamMarketLimited(SteamMarket):
         return events
 
 
+_wrap_rate_limited_methods(SteamMarketLimited)
+
+
 class MockedSteamMarket:
     def __init__(self) -> None:
         self._test_files_root = Path(__file__).parents[2] / "api_responses"
@@ -188,13 +335,24 @@ class MockedSteamMarket:
         result = json.loads(file_path.read_text(encoding="utf8"))
         return result
 
-    def get_market_events(self, start: int = 1, count: int = 100):
-        response = json.loads(
-            Path(
-                r"C:\Users\edo\PycharmProjects\steam-inv-dumper\src\steam_inv_dumper\api_responses\myhistory.json"
-            ).read_text(encoding="utf8")
+    def iter_my_market_listings(self, page_size: int = 100) -> Iterator[Tuple[str, dict]]:
+        yield from self.get_my_market_listings()["sell_listings"].items()
+
+    def _fetch_market_history_page(self, start: int, count: int) -> dict:
+        file_path = self._test_files_root / "myhistory.json"
+        response = json.loads(file_path.read_text(encoding="utf8"))
+        return {**response, "events": response["events"][start : start + count]}
+
+    def get_market_events(self, start: int = 1, count: int = 100) -> list[MarketEvent]:
+        return self._parse_market_events(response=self._fetch_market_history_page(start=start, count=count))
+
+    def get_new_market_events(self, cursor: Optional[HistoryCursor], page_size: int = 100) -> list[MarketEvent]:
+        return fetch_market_events_since(
+            self._fetch_market_history_page, cursor=cursor, page_size=page_size, max_pages=None if cursor else 1
         )
-        return self._parse_market_events(response=response)
+
+    def get_all_market_events(self, page_size: int = 500) -> list[MarketEvent]:
+        return fetch_market_events_since(self._fetch_market_history_page, page_size=page_size)
 
     def _parse_market_events(self, response: dict) -> list[MarketEvent]:
         """
@@ -1,6 +1,7 @@
 import json
 from json import JSONDecodeError
 from pathlib import Path
+from typing import List
 
 from result import Err, Ok, Result
 
@@ -22,3 +23,25 @@ def load_config(config: str) -> Result[dict, str]:
         return Err("The content of the config file is not a valid Json.")
     except Exception:
         return Err("Unknown exception")
+
+
+def account_configs(config: dict) -> List[dict]:
+    """
+    Splits a config into one config per account.
+    The entries of the "accounts" list override the top level settings, which are shared by all the accounts.
+    :param config: Parsed config file
+    :return: config of each account. The config itself if it has no "accounts".
+    """
+    accounts = config.get("accounts")
+    if not accounts:
+        return [config]
+    shared = {key: value for key, value in config.items() if key != "accounts"}
+    configs = [{**shared, **account} for account in accounts]
+    missing = [position for position, account_config in enumerate(configs) if not account_config.get("username")]
+    if missing:
+        raise ValueError(f"Accounts without a username, at positions {missing} of the accounts list")
+    usernames: List[str] = [account_config["username"] for account_config in configs]
+    duplicated = {username for username in usernames if usernames.count(username) > 1}
+    if duplicated:
+        raise ValueError(f"Accounts configured more than once: {sorted(duplicated)}")
+    return configs
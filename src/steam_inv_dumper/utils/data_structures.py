@@ -1,7 +1,8 @@
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Literal, Optional, Type, TypeVar
+from typing import Dict, List, Literal, Optional, Type, TypeVar
 
 from steam_inv_dumper.utils.steam_prices_utils import convert_string_prices
 
@@ -11,6 +12,7 @@ X = TypeVar("X", bound="InventoryItem")
 L = TypeVar("L", bound="MyMarketListing")
 P = TypeVar("P", bound="MarketListing")
 M = TypeVar("M", bound="MarketEvent")
+S = TypeVar("S", bound="SkuIndex")
 
 
 class MarketActionType(Enum):
@@ -176,6 +178,44 @@ class MyMarketListing:
         )
 
 
+@dataclass
+class SkuIndex:
+    """
+    Inventory items and own market listings grouped by market_hash_name.
+    Built once per sell loop, so every item to sell is looked up instead of scanning the full lists.
+    """
+
+    items: Dict[str, List[InventoryItem]]
+    listings: Dict[str, List[MyMarketListing]]
+    min_listed_price: Dict[str, int]
+
+    @classmethod
+    def build(cls: Type[S], items: List[InventoryItem], listings: List[MyMarketListing]) -> S:
+        items_by_name: Dict[str, List[InventoryItem]] = defaultdict(list)
+        for item in items:
+            items_by_name[item.market_hash_name].append(item)
+        listings_by_name: Dict[str, List[MyMarketListing]] = defaultdict(list)
+        min_listed_price: Dict[str, int] = {}
+        for listing in listings:
+            market_hash_name = listing.description.market_hash_name
+            listings_by_name[market_hash_name].append(listing)
+            if listing.buyer_pay < min_listed_price.get(market_hash_name, listing.buyer_pay + 1):
+                min_listed_price[market_hash_name] = listing.buyer_pay
+        return cls(items=dict(items_by_name), listings=dict(listings_by_name), min_listed_price=min_listed_price)
+
+    def items_for(self, market_hash_name: str) -> List[InventoryItem]:
+        return self.items.get(market_hash_name, [])
+
+    def listings_for(self, market_hash_name: str) -> List[MyMarketListing]:
+        return self.listings.get(market_hash_name, [])
+
+    def min_listed_price_for(self, market_hash_name: str) -> int:
+        """
+        Lowest buyer price of the own listings of the item, 0 if not listed.
+        """
+        return self.min_listed_price.get(market_hash_name, 0)
+
+
 @dataclass
 class MarketListing:
     asset: InventoryItem
@@ -0,0 +1,77 @@
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence
+
+# "import time: self [us] | cumulative | imported package", as written by python -X importtime.
+_IMPORT_TIME_PATTERN = re.compile(
+    r"^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|(?P<indent>\s*)(?P<module>\S+)"
+)
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    # 0 for modules imported by the program itself, 1 for their imports, and so on.
+    depth: int
+
+
+def parse_importtime(lines: Iterable[str]) -> List[ImportTiming]:
+    """
+    :param lines: stderr of python -X importtime. Other lines are skipped.
+    """
+    timings = []
+    for line in lines:
+        match = _IMPORT_TIME_PATTERN.match(line)
+        if match:
+            timings.append(
+                ImportTiming(
+                    module=match["module"],
+                    self_us=int(match["self"]),
+                    cumulative_us=int(match["cumulative"]),
+                    depth=(len(match["indent"]) - 1) // 2,
+                )
+            )
+    return timings
+
+
+def summarize_importtime(timings: Sequence[ImportTiming], top: int = 15) -> str:
+    """
+    Report of the total import time, the packages taking the most of it and the slowest imports of the program.
+    """
+    by_package: Dict[str, int] = defaultdict(int)
+    for timing in timings:
+        by_package[timing.module.split(".")[0]] += timing.self_us
+    direct = sorted((timing for timing in timings if timing.depth == 0), key=lambda timing: -timing.cumulative_us)
+
+    lines = [f"Imports: {sum(by_package.values()) / 1000:.1f} ms, {len(timings)} modules", "", "By package (self ms):"]
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {package:<40} {self_us / 1000:>8.1f}")
+    lines += ["", "Slowest imports of the program (cumulative ms):"]
+    for timing in direct[:top]:
+        lines.append(f"  {timing.module:<40} {timing.cumulative_us / 1000:>8.1f}")
+    return "\n".join(lines)
+
+
+def run_with_import_profile(module: str, argv: Sequence[str], top: int = 15) -> int:
+    """
+    Runs python -m module argv under -X importtime, passing its output through, then prints the import time summary
+    to stderr.
+    :return: exit code of the run.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-X", "importtime", "-m", module, *argv], stderr=subprocess.PIPE, text=True
+    )
+    timings = []
+    for line in process.stderr or []:
+        if line.startswith("import time:"):
+            timings.extend(parse_importtime([line]))
+        else:
+            sys.stderr.write(line)
+    return_code = process.wait()
+    sys.stderr.write(summarize_importtime(timings, top=top) + "\n")
+    return return_code
@@ -0,0 +1,149 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InventorySnapshot:
+    # Inventory as returned by get_my_inventory: item dicts by item id.
+    items: Dict[str, dict]
+    fetched_at: float
+    stale: bool = False
+
+
+@dataclass
+class InventoryCacheStats:
+    hits: int = 0
+    refreshes: int = 0
+    invalidations: int = 0
+    local_changes: int = 0
+    invalidated_by: Dict[str, int] = field(default_factory=dict)
+
+
+class InventoryCache:
+    """
+    Last inventory snapshot of an account, per game, kept in memory and, if a path is given, in a gzipped json file.
+    The inventory is fetched again every refresh_interval seconds, or on the next read after an invalidation.
+    In between, the changes made by the bot itself are applied locally.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float = 600,
+        path: Optional[Union[str, Path]] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.refresh_interval = refresh_interval
+        self.stats = InventoryCacheStats()
+        self._path = Path(path) if path else None
+        self._clock = clock
+        self._snapshots: Dict[str, InventorySnapshot] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Optional[dict], account: str) -> "InventoryCache":
+        """
+        :param config: "inventory_cache" setting. The snapshot is only kept in memory without a "directory".
+        :param account: username, naming the file of the snapshot.
+        """
+        config = config or {}
+        directory = config.get("directory")
+        return cls(
+            refresh_interval=config.get("refresh_interval", 600),
+            path=Path(directory) / f"inventory_{account}.json.gz" if directory is not None else None,
+        )
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self._path is None or not self._path.exists():
+            return
+        try:
+            with gzip.open(self._path, "rt", encoding="utf8") as file:
+                content = json.load(file)
+            self._snapshots = {key: InventorySnapshot(**snapshot) for key, snapshot in content.items()}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring the unreadable inventory snapshot {self._path}: {e}")
+
+    def _save(self) -> None:
+        if self._path is None:
+            return
+        content = {key: vars(snapshot) for key, snapshot in self._snapshots.items()}
+        temporary = self._path.with_name(self._path.name + ".tmp")
+        with gzip.open(temporary, "wt", encoding="utf8") as file:
+            json.dump(content, file, separators=(",", ":"))
+        os.replace(temporary, self._path)
+
+    def _fresh(self, key: str) -> Optional[Dict[str, dict]]:
+        with self._lock:
+            self._load()
+            snapshot = self._snapshots.get(key)
+            if snapshot is None or snapshot.stale or self._clock() - snapshot.fetched_at >= self.refresh_interval:
+                return None
+            self.stats.hits += 1
+            return dict(snapshot.items)
+
+    def _refreshed(self, key: str, items: Dict[str, dict]) -> Dict[str, dict]:
+        with self._lock:
+            self._load()
+            self._snapshots[key] = InventorySnapshot(items=dict(items), fetched_at=self._clock())
+            self.stats.refreshes += 1
+            self._save()
+        return items
+
+    def get(self, key: str, fetch: Callable[[], Dict[str, dict]]) -> Dict[str, dict]:
+        """
+        :param key: game of the inventory.
+        :param fetch: gets the inventory from Steam.
+        :return: item dicts by item id.
+        """
+        items = self._fresh(key)
+        if items is not None:
+            return items
+        return self._refreshed(key, fetch())
+
+    async def get_async(self, key: str, fetch: Callable[[], Awaitable[Dict[str, dict]]]) -> Dict[str, dict]:
+        items = self._fresh(key)
+        if items is not None:
+            return items
+        return self._refreshed(key, await fetch())
+
+    def remove_items(self, item_ids: Iterable[str]) -> None:
+        """
+        Removes items the bot put on sale from the snapshots.
+        """
+        item_ids = list(item_ids)
+        with self._lock:
+            self._load()
+            removed = 0
+            for snapshot in self._snapshots.values():
+                for item_id in item_ids:
+                    removed += snapshot.items.pop(item_id, None) is not None
+            if removed:
+                self.stats.local_changes += removed
+                self._save()
+
+    def invalidate(self, reason: str) -> None:
+        """
+        Marks the snapshots as outdated by a change which can't be applied locally, like an item back from the market
+        with a new item id.
+        """
+        with self._lock:
+            self._load()
+            if not self._snapshots:
+                return
+            for snapshot in self._snapshots.values():
+                snapshot.stale = True
+            self.stats.invalidations += 1
+            self.stats.invalidated_by[reason] = self.stats.invalidated_by.get(reason, 0) + 1
+            self._save()
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Protocol, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (market_hash_name, currency)
+PriceKey = Tuple[str, str]
+
+
+@dataclass
+class CachedPriceEntry:
+    price_data: dict
+    fetched_at: float
+
+
+@dataclass
+class PriceCacheStats:
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    refresh_failures: int = 0
+
+
+class PriceStore(Protocol):
+    def load(self, since: float) -> Iterable[Tuple[PriceKey, CachedPriceEntry]]:
+        pass
+
+    def save(self, entries: Dict[PriceKey, CachedPriceEntry]) -> None:
+        pass
+
+
+class PriceCache:
+    """
+    Cache of the priceoverview responses, keyed by (market_hash_name, currency).
+    Prices younger than ttl are served from the cache. Up to stale_while_revalidate seconds later they are still
+    served, while a single refresh runs in the background. Older prices are fetched before returning.
+    Background refreshes run on at most `workers` threads, until close.
+    The store, if any, is only used from the calling thread through restore and persist.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60,
+        stale_while_revalidate: float = 120,
+        store: Optional[PriceStore] = None,
+        clock: Callable[[], float] = time.time,
+        workers: int = 4,
+    ) -> None:
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stats = PriceCacheStats()
+        self._store = store
+        self._clock = clock
+        self._entries: Dict[PriceKey, CachedPriceEntry] = {}
+        self._dirty: Set[PriceKey] = set()
+        self._refreshing: Set[PriceKey] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._restored = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="price-refresh")
+        self._closed = False
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Optional[dict],
+        store: Optional[PriceStore] = None,
+        workers: int = 4,
+        sell_interval: float = 0,
+    ) -> "PriceCache":
+        """
+        ttl defaults to the sell interval and stale_while_revalidate to twice that, at least 60 and 120 seconds:
+        a price fetched by a sell loop is still served to the next one, otherwise every loop would fetch every price.
+        :param config: "price_cache" setting.
+        :param store: where prices are persisted, if "persist" is not false.
+        :param workers: most background refreshes running at once.
+        :param sell_interval: seconds between two sell loops, market_sell_timeout.
+        """
+        config = config or {}
+        ttl = config.get("ttl", max(60, sell_interval))
+        stale_while_revalidate = config.get("stale_while_revalidate", max(120, 2 * sell_interval))
+        if ttl + stale_while_revalidate < sell_interval:
+            logger.warning(
+                f"Prices expire after {ttl + stale_while_revalidate} seconds, before the next sell loop in "
+                f"{sell_interval} seconds: every loop fetches every price. Raise price_cache ttl."
+            )
+        return cls(
+            ttl=ttl,
+            stale_while_revalidate=stale_while_revalidate,
+            store=store if config.get("persist", True) else None,
+            workers=workers,
+        )
+
+    def _lookup(self, key: PriceKey) -> Tuple[Optional[CachedPriceEntry], bool]:
+        """
+        :return: entry usable now if any, and whether it needs a background refresh. Updates the counters.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            age = self._clock() - entry.fetched_at if entry is not None else float("inf")
+            if entry is None or age >= self.ttl + self.stale_while_revalidate:
+                self.stats.misses += 1
+                return None, False
+            if age < self.ttl:
+                self.stats.hits += 1
+                return entry, False
+            self.stats.stale_hits += 1
+            revalidate = key not in self._refreshing and not self._closed
+            self._refreshing.add(key)
+            return entry, revalidate
+
+    def put(self, key: PriceKey, price_data: dict) -> None:
+        with self._lock:
+            self._entries[key] = CachedPriceEntry(price_data=price_data, fetched_at=self._clock())
+            self._dirty.add(key)
+
+    def _refreshed(self, key: PriceKey, price_data: Optional[dict], error: Optional[Exception] = None) -> None:
+        if price_data is not None:
+            self.put(key, price_data)
+        with self._lock:
+            self._refreshing.discard(key)
+            if error is None:
+                self.stats.refreshes += 1
+            else:
+                self.stats.refresh_failures += 1
+                logger.warning(f"Could not refresh the price of {key}: {error}")
+
+    def _refresh_in_background(self, key: PriceKey, fetch: Callable[[], dict]) -> None:
+        def refresh() -> None:
+            try:
+                self._refreshed(key, fetch())
+            except Exception as e:
+                self._refreshed(key, None, e)
+
+        with self._lock:
+            # Submitting after the executor shut down would raise.
+            if self._closed:
+                self._refreshing.discard(key)
+                return
+            self._executor.submit(refresh)
+
+    def get(self, market_hash_name: str, currency: str, fetch: Callable[[], dict]) -> dict:
+        """
+        :param market_hash_name: Market hash name of the item.
+        :param currency: currency of the price.
+        :param fetch: gets the price from the market.
+        :return: priceoverview response.
+        """
+        key = (market_hash_name, currency)
+        entry, revalidate = self._lookup(key)
+        if revalidate:
+            self._refresh_in_background(key, fetch)
+        if entry is not None:
+            return entry.price_data
+        price_data = fetch()
+        self.put(key, price_data)
+        return price_data
+
+    async def get_async(self, market_hash_name: str, currency: str, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        Same as get, for coroutines. Background refreshes are tasks of the running loop.
+        """
+        key = (market_hash_name, currency)
+        entry, revalidate = self._lookup(key)
+        if revalidate:
+
+            async def refresh() -> None:
+                try:
+                    self._refreshed(key, await fetch())
+                except Exception as e:
+                    self._refreshed(key, None, e)
+
+            # Referenced until done, else the loop may garbage collect the task.
+            task = asyncio.create_task(refresh())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if entry is not None:
+            return entry.price_data
+        price_data = await fetch()
+        self.put(key, price_data)
+        return price_data
+
+    def close(self) -> None:
+        """
+        Waits for the background refreshes running, and drops the queued ones. Later stale hits are not refreshed.
+        """
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self._refreshing.clear()
+
+    async def close_async(self) -> None:
+        """
+        Same as close, also waiting for the refresh tasks of the running loop, which asyncio.run would cancel.
+        """
+        with self._lock:
+            self._closed = True
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.close()
+
+    def restore(self) -> int:
+        """
+        Loads the prices still usable from the store, once.
+        :return: number of prices loaded.
+        """
+        if self._store is None or self._restored:
+            return 0
+        self._restored = True
+        loaded = list(self._store.load(since=self._clock() - self.ttl - self.stale_while_revalidate))
+        with self._lock:
+            for key, entry in loaded:
+                current = self._entries.get(key)
+                if current is None or current.fetched_at < entry.fetched_at:
+                    self._entries[key] = entry
+        logger.debug(f"Restored {len(loaded)} cached prices")
+        return len(loaded)
+
+    def persist(self) -> int:
+        """
+        Saves the prices fetched since the last call to the store.
+        :return: number of prices saved.
+        """
+        if self._store is None:
+            return 0
+        with self._lock:
+            dirty = {key: self._entries[key] for key in self._dirty}
+            self._dirty.clear()
+        if dirty:
+            self._store.save(dirty)
+        return len(dirty)
+
+    def __repr__(self) -> str:
+        return f"PriceCache(entries={len(self._entries)}, {self.stats})"
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    At most `calls` calls every `period` seconds, as a token bucket: bursts of `calls`, refilled at calls/period.
+    """
+
+    calls: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.calls / self.period
+
+
+# Limits Steam applies to the market endpoints.
+DEFAULT_RATE_LIMITS: Tuple[RateLimit, ...] = (RateLimit(calls=1, period=3), RateLimit(calls=15, period=60))
+
+
+def parse_rate_limits(config: Optional[Iterable[Sequence[float]]]) -> Tuple[RateLimit, ...]:
+    """
+    :param config: [[calls, period], ...] as in the "rate_limits" setting. Defaults to DEFAULT_RATE_LIMITS.
+    """
+    if not config:
+        return DEFAULT_RATE_LIMITS
+    limits = tuple(RateLimit(calls=int(calls), period=float(period)) for calls, period in config)
+    if any(limit.calls < 1 or limit.period <= 0 for limit in limits):
+        raise ValueError(f"Invalid rate limits {config}")
+    return limits
+
+
+@dataclass
+class RateLimiterStats:
+    """
+    Calls let through by a RateLimiter, and time they spent waiting for it.
+    """
+
+    acquired: int = 0
+    rejected: int = 0
+    waited: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def record(self, wait: float) -> None:
+        self.acquired += 1
+        if wait > 0:
+            self.waited += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+
+class _FileLock:
+    """
+    Exclusive lock on a file, held across processes.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+
+    @contextmanager
+    def __call__(self) -> Iterator[int]:
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if sys.platform == "win32":
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            if sys.platform == "win32":
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            os.close(fd)
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter over several windows. A call takes a token from every bucket.
+    Thread safe. With a state_file, the buckets are stored in the file under an exclusive lock,
+    so every process using the same file shares them.
+    """
+
+    def __init__(
+        self,
+        limits: Sequence[RateLimit] = DEFAULT_RATE_LIMITS,
+        state_file: Optional[Union[str, Path]] = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if not limits:
+            raise ValueError("At least a rate limit is needed")
+        self.limits = tuple(limits)
+        self.stats = RateLimiterStats()
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._file_lock = _FileLock(Path(state_file)) if state_file else None
+        self._tokens: List[float] = [float(limit.calls) for limit in self.limits]
+        # Wall clock time, so that it can be shared between processes.
+        self._updated = clock()
+
+    def _load(self, fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        content = os.read(fd, 65536)
+        if not content:
+            return
+        state = json.loads(content)
+        if len(state["tokens"]) == len(self.limits):
+            self._tokens, self._updated = state["tokens"], state["updated"]
+
+    def _store(self, fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, json.dumps({"tokens": self._tokens, "updated": self._updated}).encode())
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = [
+            min(float(limit.calls), tokens + elapsed * limit.rate) for limit, tokens in zip(self.limits, self._tokens)
+        ]
+        self._updated = max(now, self._updated)
+
+    def _wait_time(self) -> float:
+        self._refill(self._clock())
+        return max(0.0, max((1 - tokens) / limit.rate for limit, tokens in zip(self.limits, self._tokens)))
+
+    def _take(self) -> float:
+        """
+        Takes a token from every bucket if all of them have one.
+        :return: 0 if taken, else seconds until they all will.
+        """
+        wait = self._wait_time()
+        if wait <= 0:
+            self._tokens = [tokens - 1 for tokens in self._tokens]
+        return wait
+
+    def _with_state(self, func: Callable[[], float]) -> float:
+        with self._lock:
+            if self._file_lock is None:
+                return func()
+            with self._file_lock() as fd:
+                self._load(fd)
+                result = func()
+                self._store(fd)
+                return result
+
+    def _record(self, wait: Optional[float]) -> None:
+        with self._lock:
+            if wait is None:
+                self.stats.rejected += 1
+            else:
+                self.stats.record(wait)
+
+    def time_until_available(self) -> float:
+        """
+        Seconds until a call would be let through.
+        """
+        return self._with_state(self._wait_time)
+
+    def try_acquire(self) -> bool:
+        """
+        Non-blocking acquire.
+        :return: whether the call can be made now.
+        """
+        return self.acquire(blocking=False)
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the call is allowed by every window.
+        :param blocking: if False, returns immediately.
+        :param timeout: longest wait in seconds, None to wait as long as needed.
+        :return: whether the call can be made.
+        """
+        begin = self._clock()
+        while True:
+            wait = self._with_state(self._take)
+            waited = self._clock() - begin
+            if wait <= 0:
+                self._record(waited)
+                return True
+            if not blocking or (timeout is not None and waited + wait > timeout):
+                self._record(None)
+                return False
+            self._sleep(wait)
+
+    async def _take_async(self) -> float:
+        if self._file_lock is None:
+            return self._with_state(self._take)
+        # Another process may hold the file lock: wait for it in a worker thread, not on the event loop.
+        return await asyncio.to_thread(self._with_state, self._take)
+
+    async def acquire_async(self) -> None:
+        """
+        Waits until the call is allowed by every window, without blocking the event loop.
+        """
+        begin = self._clock()
+        while (wait := await self._take_async()) > 0:
+            await asyncio.sleep(wait)
+        self._record(self._clock() - begin)
+
+
+_shared_limiters: Dict[Tuple[Tuple[RateLimit, ...], Optional[str]], RateLimiter] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_rate_limiter(
+    limits: Sequence[RateLimit] = DEFAULT_RATE_LIMITS, state_file: Optional[str] = None
+) -> RateLimiter:
+    """
+    RateLimiter shared by all the callers of the process asking for the same limits and state file,
+    as the markets of all the accounts go through the same connection.
+    """
+    key = (tuple(limits), state_file)
+    with _shared_lock:
+        if key not in _shared_limiters:
+            _shared_limiters[key] = RateLimiter(limits=limits, state_file=state_file)
+        return _shared_limiters[key]
@@ -0,0 +1,172 @@
+import logging
+import random
+import signal
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """
+    Function run every interval seconds by the Scheduler.
+    """
+
+    name: str
+    func: Callable[[], None]
+    interval: float
+    next_run: float
+    max_backoff: float
+    jitter: float = 0
+    consecutive_failures: int = 0
+    overruns: int = 0
+    last_duration: float = 0
+    last_error: Optional[BaseException] = field(default=None, repr=False)
+
+    def delay_after_run(self) -> float:
+        """
+        Interval to the next run, doubled at each consecutive failure up to max_backoff.
+        """
+        if not self.consecutive_failures:
+            return self.interval
+        return min(self.interval * 2 ** (self.consecutive_failures - 1), max(self.max_backoff, self.interval))
+
+
+class Scheduler:
+    """
+    Runs jobs at fixed intervals from a single thread, on the monotonic clock.
+    A job raising does not stop the others: the error is logged and the job is retried later.
+    Runs never overlap: a job taking longer than its interval is logged as an overrun, and runs missed meanwhile are
+    not caught up.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Optional[Callable[[float], None]] = None,
+        random_fraction: Callable[[], float] = random.random,
+    ) -> None:
+        """
+        :param clock: monotonic clock.
+        :param sleep: waits between runs. Defaults to a wait interrupted by stop.
+        :param random_fraction: source of the jitter, in [0, 1).
+        """
+        self._clock = clock
+        self._stop_event = threading.Event()
+        self._sleep = sleep or self._stop_event.wait
+        self._random_fraction = random_fraction
+        self.jobs: List[Job] = []
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], None],
+        interval: float,
+        delay: float = 0,
+        max_backoff: float = 3600,
+        jitter: float = 0,
+    ) -> Job:
+        """
+        :param name: name of the job, used in logs.
+        :param func: function to run.
+        :param interval: seconds between the end of a run and the start of the next.
+        :param delay: seconds before the first run.
+        :param max_backoff: longest interval after consecutive failures.
+        :param jitter: up to this many random seconds are added to every interval, so jobs drift apart.
+        """
+        job = Job(
+            name=name,
+            func=func,
+            interval=interval,
+            next_run=self._clock() + delay,
+            max_backoff=max_backoff,
+            jitter=jitter,
+        )
+        self.jobs.append(job)
+        return job
+
+    def run_job(self, job: Job) -> None:
+        started = self._clock()
+        try:
+            job.func()
+        except Exception as e:
+            job.consecutive_failures += 1
+            job.last_error = e
+            logger.exception(f"Job {job.name} failed ({job.consecutive_failures} in a row)")
+        else:
+            job.consecutive_failures = 0
+            job.last_error = None
+        finished = self._clock()
+        job.last_duration = finished - started
+        if job.last_duration > job.interval:
+            job.overruns += 1
+            logger.warning(f"Job {job.name} took {job.last_duration:.1f}s, longer than its {job.interval}s interval")
+        job.next_run = finished + job.delay_after_run() + job.jitter * self._random_fraction()
+
+    def run_pending(self) -> int:
+        """
+        Runs the jobs due, in order of due time. Stops early once stop is called.
+        :return: number of jobs run.
+        """
+        now = self._clock()
+        due = sorted((job for job in self.jobs if job.next_run <= now), key=lambda job: job.next_run)
+        run = 0
+        for job in due:
+            if self.stopping:
+                break
+            self.run_job(job)
+            run += 1
+        return run
+
+    def idle_seconds(self) -> float:
+        if not self.jobs:
+            return 0
+        return max(0.0, min(job.next_run for job in self.jobs) - self._clock())
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop_event.is_set()
+
+    def stop(self) -> None:
+        """
+        Makes run_forever return once the running job, if any, is done. Safe to call from signal handlers and threads.
+        """
+        self._stop_event.set()
+
+    def _handle_signal(self, signum: int, frame: object) -> None:
+        if self.stopping:
+            # A second signal does not wait for the running job.
+            raise KeyboardInterrupt
+        logger.info(f"Received {signal.Signals(signum).name}, stopping after the running job")
+        self.stop()
+
+    @contextmanager
+    def stop_on_signals(self, signals: Sequence[int] = (signal.SIGINT, signal.SIGTERM)) -> Iterator[None]:
+        """
+        Stops the scheduler on the signals while in the block, restoring the previous handlers on exit.
+        Signal handlers can only be set from the main thread, elsewhere this does nothing.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            yield
+            return
+        previous = {signum: signal.signal(signum, self._handle_signal) for signum in signals}
+        try:
+            yield
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def run_forever(self, handle_signals: bool = True) -> None:
+        """
+        Runs the jobs until stop is called, or SIGINT/SIGTERM are received when handle_signals.
+        """
+        with self.stop_on_signals() if handle_signals else nullcontext():
+            while not self.stopping:
+                self.run_pending()
+                if not self.stopping:
+                    self._sleep(self.idle_seconds())
+        logger.info("Scheduler stopped")
@@ -1,6 +1,44 @@
 import math
 import re
-from typing import Dict
+from array import array
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Prices are looked up in cents: 100_000 covers every listing up to 1000.00 in the wallet currency.
+DEFAULT_FEES_TABLE_CEILING = 100_000
+
+
+# First digit to last digit of the amount, thousands separators included ("4,234.35", "1 234,56", "1'234.56").
+# A separator right after the digits is a decimal mark without cents ("2.--€", "2.- USD").
+_PRICE_PATTERN = re.compile(r"\d(?:[\d.,'\s]*\d)?(?P<decimal_mark>[.,](?=-))?")
+_THOUSANDS_SEPARATORS = str.maketrans("", "", ".,' \t\n\r\f\v\u00a0\u2009\u202f")
+PRICE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PRICE_CACHE_SIZE)
+def _parse_price(price: str) -> int:
+    """
+    Single pass parse of a price string formatted by Steam, in any of its currencies.
+    The last "." or "," followed by at most 2 digits is the decimal mark, every other separator
+    (including spaces and apostrophes) groups thousands.
+    :param price: price as string
+    :return: price in cents
+    """
+    match = _PRICE_PATTERN.search(price)
+    if match is None:
+        raise ValueError(f"No amount found in price {price!r}")
+    amount = match.group(0)
+    if match.group("decimal_mark"):
+        return int(amount.translate(_THOUSANDS_SEPARATORS)) * 100
+
+    decimal_mark = max(amount.rfind("."), amount.rfind(","))
+    cents = amount[decimal_mark + 1 :] if decimal_mark >= 0 else ""
+    if decimal_mark < 0 or len(cents) > 2:
+        return int(amount.translate(_THOUSANDS_SEPARATORS)) * 100
+    return int(amount[:decimal_mark].translate(_THOUSANDS_SEPARATORS)) * 100 + int(cents.ljust(2, "0"))
 
 
 def convert_string_prices(price: str) -> int:
@@ -11,23 +49,16 @@ def convert_string_prices(price: str) -> int:
     """
     if not price:
         return 0
-    price = str(price)
-    pattern = r"\D*(\d*)(\.|,)?(\d*)"
-
-    while True:
-        tokens = re.search(pattern, price, re.UNICODE)
-        if len(tokens.group(3)) > 2:
-            # if the part after the first punctuation mark is longer than 2
-            # then, this punctuation mark is a thousand separator
-            price = price.replace(tokens.group(2), "")
-        else:
-            hundreds = int(tokens.group(1)) * 100
-            cents_as_string = tokens.group(3)
-            if not cents_as_string:
-                cents = 0
-            else:
-                cents = int(cents_as_string)
-            return hundreds + cents
+    return _parse_price(str(price))
+
+
+def convert_string_prices_batch(prices: Iterable[str]) -> List[int]:
+    """
+    Converts many price strings at once.
+    :param prices: int_prices as strings
+    :return: int_prices in cents, in the same order.
+    """
+    return [_parse_price(str(price)) if price else 0 for price in prices]
 
 
 def amount_to_send_desired_received_amt(price_inner: float) -> dict:
@@ -47,12 +78,12 @@ def amount_to_send_desired_received_amt(price_inner: float) -> dict:
     }
 
 
-def get_steam_fees_object(price: int) -> Dict[str, int]:
+def _compute_steam_fees_object(price: int) -> Dict[str, int]:
     """
-    Given an int_price as int, returns the full set of steam prices (you_receive/money_to_ask/total fees ecc)
+    Iterative search of the steam fees for a price, mirroring the algorithm used by the Steam market page.
     :param price: Price for sale (money_to_ask)
     :return: Dict of different prices - in cents.
-    keys='steam_fee', 'publisher_fee', 'amount', 'money_to_ask', 'you_receive'
+    keys='steam_fee', 'publisher_fee', 'money_to_ask', 'you_receive'
     """
 
     iterations = 0
@@ -87,3 +118,176 @@ def get_steam_fees_object(price: int) -> Dict[str, int]:
     )
 
     return intfees
+
+
+class SteamFeesTable:
+    """
+    Array-backed lookup table of the steam fees, for every cent value from 0 up to ceiling.
+    Rows are filled lazily on first lookup (or all at once with precompute), prices above the ceiling
+    fall back to the iterative computation.
+    """
+
+    def __init__(self, ceiling: int = DEFAULT_FEES_TABLE_CEILING) -> None:
+        if ceiling < 0:
+            raise ValueError("Ceiling must be greater or equal than 0")
+        self.ceiling = ceiling
+        size = ceiling + 1
+        self._filled = bytearray(size)
+        self._steam_fee = array("q", bytes(8 * size))
+        self._publisher_fee = array("q", bytes(8 * size))
+        self._money_to_ask = array("q", bytes(8 * size))
+        self._you_receive = array("q", bytes(8 * size))
+
+    def _fill(self, price: int) -> None:
+        fees = _compute_steam_fees_object(price)
+        self._steam_fee[price] = fees["steam_fee"]
+        self._publisher_fee[price] = fees["publisher_fee"]
+        self._money_to_ask[price] = fees["money_to_ask"]
+        self._you_receive[price] = fees["you_receive"]
+        self._filled[price] = 1
+
+    def precompute(self) -> None:
+        """
+        Fills every row of the table not yet computed.
+        """
+        for price in range(self.ceiling + 1):
+            if not self._filled[price]:
+                self._fill(price)
+
+    def lookup(self, price: int) -> Dict[str, int]:
+        """
+        Steam fees for a price, as returned by get_steam_fees_object.
+        :param price: Price for sale (money_to_ask), in cents.
+        :return: Dict with keys 'steam_fee', 'publisher_fee', 'money_to_ask', 'you_receive'
+        """
+        int_price = int(price)
+        if not 0 <= int_price <= self.ceiling:
+            return _compute_steam_fees_object(int_price)
+        if not self._filled[int_price]:
+            self._fill(int_price)
+        return {
+            "steam_fee": self._steam_fee[int_price],
+            "publisher_fee": self._publisher_fee[int_price],
+            "money_to_ask": self._money_to_ask[int_price],
+            "you_receive": self._you_receive[int_price],
+        }
+
+    def _you_receive_at(self, price: int) -> int:
+        if not self._filled[price]:
+            self._fill(price)
+        return self._you_receive[price]
+
+    def buyer_pays_for(self, you_receive: int) -> int:
+        """
+        Inverse lookup: minimal price the buyer pays so that the seller receives you_receive.
+        you_receive does not decrease with the price, so the table is bisected, filling only the rows probed.
+        Amounts above the you_receive of the ceiling are computed directly.
+        :param you_receive: amount the seller should receive, in cents.
+        :return: money_to_ask, in cents.
+        """
+        int_you_receive = int(you_receive)
+        if not 0 <= int_you_receive <= self._you_receive_at(self.ceiling):
+            return int(amount_to_send_desired_received_amt(int_you_receive)["amount"])
+        low, high = 0, self.ceiling
+        while low < high:
+            middle = (low + high) // 2
+            if self._you_receive_at(middle) < int_you_receive:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+_FEES_TABLE = SteamFeesTable()
+
+
+def configure_steam_fees_table(ceiling: int = DEFAULT_FEES_TABLE_CEILING, precompute: bool = False) -> None:
+    """
+    Replaces the fees table used by get_steam_fees_object.
+    :param ceiling: highest price (in cents) served from the table.
+    :param precompute: if True, fill the whole table now instead of lazily.
+    """
+    global _FEES_TABLE
+    _FEES_TABLE = SteamFeesTable(ceiling=ceiling)
+    if precompute:
+        _FEES_TABLE.precompute()
+
+
+def get_steam_fees_object(price: int) -> Dict[str, int]:
+    """
+    Given an int_price as int, returns the full set of steam prices (you_receive/money_to_ask/total fees ecc)
+    :param price: Price for sale (money_to_ask)
+    :return: Dict of different prices - in cents.
+    keys='steam_fee', 'publisher_fee', 'money_to_ask', 'you_receive'
+    """
+    return _FEES_TABLE.lookup(price)
+
+
+def get_buyer_pays_for_you_receive(you_receive: int) -> int:
+    """
+    Given the amount the seller should receive, returns the minimal price the buyer has to pay.
+    :param you_receive: Amount received by the seller, in cents.
+    :return: money_to_ask, in cents.
+    """
+    return _FEES_TABLE.buyer_pays_for(you_receive)
+
+
+# numpy is imported by the batch functions only: it is the slowest import of the package, and most runs do not need it.
+@lru_cache(maxsize=None)
+def _steam_fees_dtype() -> "np.dtype":
+    import numpy as np
+
+    return np.dtype(
+        [("steam_fee", np.int64), ("publisher_fee", np.int64), ("money_to_ask", np.int64), ("you_receive", np.int64)]
+    )
+
+
+def __getattr__(name: str) -> Any:
+    if name == "STEAM_FEES_DTYPE":
+        return _steam_fees_dtype()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _amounts_to_send_desired_received_amt(price_inner: "np.ndarray") -> tuple:
+    """
+    Vectorized amount_to_send_desired_received_amt.
+    :param price_inner: array of amounts received by the seller.
+    :return: steam fees, publisher fees and amounts paid by the buyer, as arrays.
+    """
+    import numpy as np
+
+    steam_fee = np.floor(np.maximum(price_inner * 0.05, 1))
+    publisher_fee = np.floor(np.maximum(price_inner * 0.10, 1))
+    return steam_fee, publisher_fee, price_inner + steam_fee + publisher_fee
+
+
+def get_steam_fees_batch(prices: Union["np.ndarray", Iterable[int]]) -> "np.ndarray":
+    """
+    Vectorized get_steam_fees_object, for arrays of prices.
+    The iterative search converges to the highest amount received whose buyer price does not exceed the price,
+    the difference being added to the steam fee, so that is computed directly for the whole array.
+    :param prices: array of prices for sale (money_to_ask), in cents.
+    :return: structured array with fields 'steam_fee', 'publisher_fee', 'money_to_ask', 'you_receive'
+    """
+    import numpy as np
+
+    int_prices = np.asarray(prices, dtype=np.int64)
+    price = int_prices.ravel().astype(np.float64)
+
+    received = np.round(price / (0.05 + 0.10 + 1), 0)
+    steam_fee, publisher_fee, amount = _amounts_to_send_desired_received_amt(received)
+    # Walk down to the first amount not above the price...
+    while (overshoot := amount > price).any():
+        received[overshoot] -= 1
+        steam_fee, publisher_fee, amount = _amounts_to_send_desired_received_amt(received)
+    # ...and up to the last one.
+    while (undershoot := _amounts_to_send_desired_received_amt(received + 1)[2] <= price).any():
+        received[undershoot] += 1
+        steam_fee, publisher_fee, amount = _amounts_to_send_desired_received_amt(received)
+
+    fees = np.empty(price.shape, dtype=_steam_fees_dtype())
+    fees["steam_fee"] = steam_fee + price - amount
+    fees["publisher_fee"] = publisher_fee
+    fees["money_to_ask"] = amount
+    fees["you_receive"] = received
+    return fees.reshape(int_prices.shape)
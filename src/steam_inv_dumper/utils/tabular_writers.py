@@ -0,0 +1,172 @@
+import csv
+import gzip
+from contextlib import contextmanager
+from datetime import date, datetime
+from itertools import islice
+from pathlib import Path
+from typing import (
+    IO,
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    TextIO,
+    Union,
+)
+
+TableOutput = Union[str, Path, TextIO]
+FORMATS = ("csv", "csv.gz", "parquet")
+
+
+class TableWriter(Protocol):
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def table_format(path: Union[str, Path]) -> str:
+    """
+    Format of a file from its suffix: .parquet, .csv.gz (or .gz) and csv for anything else.
+    """
+    name = str(path).lower()
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith(".gz"):
+        return "csv.gz"
+    return "csv"
+
+
+class CsvTableWriter:
+    """
+    Writes rows as CSV to a text file, header first. The file is closed with the writer only if owned.
+    """
+
+    def __init__(self, file: IO[str], columns: Sequence[str], owned: bool = False) -> None:
+        self._file = file
+        self._owned = owned
+        self._writer = csv.writer(file)
+        self._writer.writerow(columns)
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        if self._owned:
+            self._file.close()
+
+
+class ParquetTableWriter:
+    """
+    Writes rows to a Parquet file, a row group per chunk. Column types are the python types given, else inferred from
+    the first chunk. Needs pyarrow, which is imported here only.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], columns: Sequence[str], column_types: Optional[Sequence[type]] = None
+    ) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from e
+        self._pyarrow = pyarrow
+        self._parquet = pyarrow.parquet
+        self._path = str(path)
+        self._columns = list(columns)
+        self._writer: Any = None
+        if column_types is not None:
+            schema = pyarrow.schema(
+                [(column, self._arrow_type(python_type)) for column, python_type in zip(columns, column_types)]
+            )
+            self._writer = pyarrow.parquet.ParquetWriter(self._path, schema)
+
+    def _arrow_type(self, python_type: type) -> Any:
+        types = {
+            bool: self._pyarrow.bool_(),
+            int: self._pyarrow.int64(),
+            float: self._pyarrow.float64(),
+            datetime: self._pyarrow.timestamp("us"),
+            date: self._pyarrow.date32(),
+        }
+        return types.get(python_type, self._pyarrow.string())
+
+    def _table(self, rows: Sequence[Sequence[Any]]) -> Any:
+        arrays = {column: [row[index] for row in rows] for index, column in enumerate(self._columns)}
+        schema = self._writer.schema if self._writer is not None else None
+        return self._pyarrow.Table.from_pydict(arrays, schema=schema)
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        if not rows:
+            return
+        table = self._table(rows)
+        if self._writer is None:
+            self._writer = self._parquet.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is None:
+            schema = self._pyarrow.schema([(column, self._pyarrow.string()) for column in self._columns])
+            self._writer = self._parquet.ParquetWriter(self._path, schema)
+        self._writer.close()
+
+
+@contextmanager
+def open_table_writer(
+    output: TableOutput,
+    columns: Sequence[str],
+    format: Optional[str] = None,
+    column_types: Optional[Sequence[type]] = None,
+) -> Iterator[TableWriter]:
+    """
+    :param output: path of the file, or an open text file for CSV.
+    :param columns: names of the columns.
+    :param format: one of FORMATS. Defaults to the format of the suffix of the path.
+    :param column_types: python types of the columns, for the Parquet schema.
+    """
+    writer: TableWriter
+    if not isinstance(output, (str, Path)):
+        writer = CsvTableWriter(output, columns)
+    else:
+        format = format or table_format(output)
+        if format == "parquet":
+            writer = ParquetTableWriter(output, columns, column_types=column_types)
+        elif format == "csv.gz":
+            writer = CsvTableWriter(gzip.open(output, "wt", encoding="utf8", newline=""), columns, owned=True)
+        elif format == "csv":
+            writer = CsvTableWriter(open(output, "w", encoding="utf8", newline=""), columns, owned=True)
+        else:
+            raise ValueError(f"Unknown table format {format}, expected one of {FORMATS}")
+    try:
+        yield writer
+    finally:
+        writer.close()
+
+
+def chunks(rows: Iterable[Sequence[Any]], size: int) -> Iterator[List[Sequence[Any]]]:
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def write_table(
+    output: TableOutput,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    format: Optional[str] = None,
+    chunk_size: int = 10_000,
+) -> int:
+    """
+    Writes rows chunk_size at a time, so that only a chunk is in memory.
+    :return: number of rows written.
+    """
+    written = 0
+    with open_table_writer(output, columns, format=format) as writer:
+        for chunk in chunks(rows, chunk_size):
+            writer.write(chunk)
+            written += len(chunk)
+    return written
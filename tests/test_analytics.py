@@ -0,0 +1,115 @@
+import io
+from datetime import date, datetime
+from unittest import TestCase
+
+from constants import TEST_ITEM_KWARGS
+from test_database import clean_all_db
+
+from steam_inv_dumper.db.analytics import Analytics
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.utils.configuration import load_config
+
+
+def clean_analytics(db: Database) -> None:
+    db.AnalyticsDaily.query.delete()
+    db.ListingLifetime.query.delete()
+    db.AnalyticsWatermark.query.delete()
+    clean_all_db(db)
+
+
+class TestAnalytics(TestCase):
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.db = Database(config=config)
+        clean_analytics(self.db)
+        self.analytics = Analytics(self.db)
+        self.add_listing("1", "test", "Chroma 2 Case", 100)
+        self.add_listing("2", "test", "Chroma 2 Case", 120)
+        self.add_listing("3", "other", "Snakebite Case", 30)
+        self.add_event("1", "ListingCreated", datetime(2023, 1, 1, 10))
+        self.add_event("1", "ListingSold", datetime(2023, 1, 1, 12))
+        self.add_event("2", "ListingCreated", datetime(2023, 1, 1, 10))
+        self.add_event("2", "ListingCancelled", datetime(2023, 1, 2, 10))
+        self.add_event("3", "ListingCreated", datetime(2023, 1, 2, 10))
+
+    def tearDown(self) -> None:
+        clean_analytics(self.db)
+
+    def add_listing(self, item_id: str, account: str, market_hash_name: str, you_receive: int) -> None:
+        session = self.db.Item.query.session
+        item = {**TEST_ITEM_KWARGS, "item_id": item_id, "account": account, "market_hash_name": market_hash_name}
+        session.add(self.db.Item(**item))
+        session.add(
+            self.db.Listing(item_id=item_id, listing_id=f"listing{item_id}", you_receive=you_receive, buyer_pay=0)
+        )
+        session.flush()
+
+    def add_event(self, item_id: str, event_type: str, event_datetime: datetime) -> None:
+        session = self.db.Event.query.session
+        session.add(
+            self.db.Event(
+                listing_id=f"listing{item_id}",
+                event_type=event_type,
+                event_datetime=event_datetime,
+                time_event_fraction=0,
+                steam_id_actor="1",
+            )
+        )
+        session.flush()
+
+    def test_sku_summary(self) -> None:
+        self.assertEqual(self.analytics.update(), 5)
+        chroma, snakebite = self.analytics.sku_summary()
+        counts = (chroma.listings_created, chroma.listings_sold, chroma.listings_cancelled, chroma.you_receive)
+        self.assertEqual(counts, (2, 1, 1, 100))
+        self.assertEqual((chroma.sell_through, chroma.churn, chroma.median_lifetime_seconds), (0.5, 0.5, 7200))
+        self.assertEqual((snakebite.sell_through, snakebite.median_lifetime_seconds), (0, None))
+        other = self.analytics.sku_summary(account="other")
+        self.assertEqual([sku.market_hash_name for sku in other], ["Snakebite Case"])
+
+    def test_updates_are_incremental(self) -> None:
+        self.analytics.update()
+        self.add_event("3", "ListingSold", datetime(2023, 1, 4, 10))
+        self.assertEqual(self.analytics.update(), 1)
+        self.assertEqual(self.analytics.update(), 0)
+        skus = {sku.market_hash_name: sku for sku in self.analytics.sku_summary(since=date(2023, 1, 2))}
+        snakebite = skus["Snakebite Case"]
+        self.assertEqual((snakebite.listings_sold, snakebite.median_lifetime_seconds), (1, 2 * 86400))
+        self.assertEqual((skus["Chroma 2 Case"].listings_created, skus["Chroma 2 Case"].listings_cancelled), (0, 1))
+        self.assertEqual(
+            list(self.analytics.daily(until=date(2023, 1, 2))),
+            [(date(2023, 1, 1), "test", "Chroma 2 Case", 2, 1, 0, 100)],
+        )
+
+    def test_sales_wait_for_their_creation(self) -> None:
+        self.analytics.update()
+        self.add_listing("4", "test", "Snakebite Case", 40)
+        self.add_event("4", "ListingSold", datetime(2023, 1, 3, 10))
+        self.add_event("3", "ListingCancelled", datetime(2023, 1, 3, 11))
+        self.assertEqual(self.analytics.update(), 0)
+        self.add_event("4", "ListingCreated", datetime(2023, 1, 3, 8))
+        self.assertEqual(self.analytics.update(), 3)
+        skus = {sku.market_hash_name: sku for sku in self.analytics.sku_summary()}
+        snakebite = skus["Snakebite Case"]
+        counts = (snakebite.listings_created, snakebite.listings_sold, snakebite.listings_cancelled)
+        self.assertEqual(counts, (2, 1, 1))
+        self.assertEqual(snakebite.median_lifetime_seconds, 7200)
+
+    def test_events_without_item_are_aggregated_after_the_retry_window(self) -> None:
+        self.analytics.update()
+        self.add_event("5", "ListingCreated", datetime(2023, 1, 3, 10))
+        self.assertEqual(self.analytics.update(), 0)
+        self.add_event("3", "ListingSold", datetime(2023, 1, 4, 11))
+        self.assertEqual(self.analytics.update(), 2)
+        self.assertEqual(
+            list(self.analytics.daily(since=date(2023, 1, 3))),
+            [(date(2023, 1, 3), "", "", 1, 0, 0, 0), (date(2023, 1, 4), "other", "Snakebite Case", 0, 1, 0, 30)],
+        )
+
+    def test_export_csv(self) -> None:
+        self.analytics.update()
+        output = io.StringIO()
+        self.assertEqual(self.analytics.export(output, view="daily"), 3)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], "day,account,market_hash_name,created,sold,cancelled,you_receive")
+        self.assertEqual(lines[1], "2023-01-01,test,Chroma 2 Case,2,1,0,100")
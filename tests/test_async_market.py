@@ -0,0 +1,232 @@
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Tuple
+from unittest import IsolatedAsyncioTestCase
+from urllib.parse import parse_qs, urlparse
+
+from constants import DESCRIPTION
+from steampy.models import Currency, GameOptions
+
+from steam_inv_dumper.markets.async_exchange import AsyncExchange
+from steam_inv_dumper.markets.steam.async_market import AsyncSteamMarket
+from steam_inv_dumper.utils.rate_limiter import RateLimit, RateLimiter
+
+STEAMGUARD = {"steamid": "7656", "identity_secret": "secret"}
+HISTORY = [
+    {
+        "listingid": str(number),
+        "event_type": 1,
+        "time_event": 1640000000 + number,
+        "time_event_fraction": 0,
+        "steamid_actor": "4331",
+    }
+    for number in reversed(range(250))
+]
+
+
+def _listing_html(listing_id: str) -> str:
+    return (
+        f'<div id="mylisting_{listing_id}">'
+        '<span title="buyer">1,50€</span><span title="you">(1,31€)</span>'
+        '<div class="market_listing_listed_date">20 Dec</div></div>'
+    )
+
+
+def _listing_hover(listing_id: str) -> str:
+    return f"CreateItemHoverFromContainer( g_rgAssets, 'mylisting_{listing_id}_name', 730, '2', '{listing_id}', 0 );"
+
+
+class BlockingListingsMarket:
+    """
+    Blocking market provider yielding its listings one page at a time.
+    """
+
+    def __init__(self) -> None:
+        self.pages_fetched = 0
+
+    def iter_my_market_listings(self, page_size: int = 100) -> Iterator[Tuple[str, dict]]:
+        for page_number, page in enumerate((["a", "b"], ["a"]), start=1):
+            self.pages_fetched += 1
+            for number, market_hash_name in enumerate(page):
+                listing_id = f"{page_number}{number}"
+                yield listing_id, {
+                    "listing_id": listing_id,
+                    "unowned_id": listing_id,
+                    "buyer_pay": 0,
+                    "you_receive": 0,
+                    "created_on": "",
+                    "need_confirmation": False,
+                    "description": {**DESCRIPTION, "market_hash_name": market_hash_name, "id": listing_id},
+                }
+
+
+class FakeSteamHandler(BaseHTTPRequestHandler):
+    """
+    Answers the Steam community endpoints used by AsyncSteamMarket. Price requests take server.delay seconds.
+    """
+
+    server: "FakeSteamServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _reply(self, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.requests.append((url.path, query))
+        if url.path == "/market/priceoverview/":
+            time.sleep(self.server.delay)
+            self._reply({"success": True, "lowest_price": "2,42€", "volume": "7", "median_price": "2,40€"})
+        elif url.path == "/market/mylistings/render/":
+            start, count = int(query["start"]), int(query["count"])
+            listing_ids = [str(number) for number in range(3)][start : start + count]
+            self._reply(
+                {
+                    "success": True,
+                    "total_count": 3,
+                    "results_html": "".join(_listing_html(listing_id) for listing_id in listing_ids),
+                    "hovers": "".join(_listing_hover(listing_id) for listing_id in listing_ids),
+                    "assets": {"730": {"2": {listing_id: {"id": listing_id} for listing_id in listing_ids}}},
+                }
+            )
+        elif url.path.startswith("/inventory/"):
+            self._reply({"success": 1, "assets": [], "descriptions": []})
+        elif url.path == "/market/myhistory/render/":
+            start, count = int(query["start"]), int(query["count"])
+            self._reply({"success": True, "total_count": len(HISTORY), "events": HISTORY[start : start + count]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        self.server.requests.append((self.path, form))
+        self._reply({"success": True})
+
+
+class FakeSteamServer(ThreadingHTTPServer):
+    # The default backlog of 5 makes concurrent connections wait for SYN retries.
+    request_queue_size = 32
+    delay: float = 0
+    requests: List[Tuple[str, Dict[str, str]]]
+
+
+class TestAsyncSteamMarket(IsolatedAsyncioTestCase):
+    server: FakeSteamServer
+    thread: threading.Thread
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FakeSteamServer(("127.0.0.1", 0), FakeSteamHandler)
+        cls.server.delay = 0
+        cls.server.requests = []
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    async def asyncSetUp(self) -> None:
+        self.server.delay = 0
+        self.server.requests.clear()
+        self.rate_limiter = RateLimiter(limits=[RateLimit(calls=100, period=1)])
+        self.market = AsyncSteamMarket(
+            steamguard=STEAMGUARD,
+            session_id="session",
+            currency=Currency.EURO,
+            base_url=f"http://127.0.0.1:{self.server.server_port}",
+            rate_limiter=self.rate_limiter,
+        )
+
+    async def asyncTearDown(self) -> None:
+        await self.market.aclose()
+
+    async def test_get_item_price(self) -> None:
+        price = await self.market.get_item_price("Chroma 2 Case")
+        self.assertEqual(price["lowest_price"], "2,42€")
+        path, query = self.server.requests[0]
+        self.assertEqual(query["market_hash_name"], "Chroma 2 Case")
+        self.assertEqual(query["currency"], str(Currency.EURO.value))
+
+    async def test_get_my_market_listings_pages(self) -> None:
+        listings = await self.market.get_my_market_listings(page_size=2)
+        self.assertEqual(sorted(listings["sell_listings"]), ["0", "1", "2"])
+        self.assertEqual(listings["sell_listings"]["1"]["description"], {"id": "1"})
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def test_iter_my_market_listings_stops_early(self) -> None:
+        async for listing_id, listing in self.market.iter_my_market_listings(page_size=2):
+            if listing_id == "1":
+                break
+        self.assertEqual(len(self.server.requests), 1)
+
+    async def test_inventory_is_rate_limited(self) -> None:
+        self.assertEqual(await self.market.get_my_inventory(GameOptions.CS), {})
+        self.assertEqual(self.server.requests[0][0], f"/inventory/{STEAMGUARD['steamid']}/730/2")
+        self.assertEqual(self.rate_limiter.stats.acquired, 1)
+
+    async def test_exchange_reports_the_rate_limiter(self) -> None:
+        exchange = AsyncExchange(
+            config={"debug": True},
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=self.market,
+            database=None,  # type: ignore[arg-type]
+        )
+        self.assertIs(exchange.rate_limiter, self.rate_limiter)
+
+    async def test_sell_and_cancel(self) -> None:
+        await self.market.create_sell_order(assetid="123", game=GameOptions.CS, money_to_receive="131")
+        await self.market.cancel_sell_order(sell_listing_id="456")
+        (sell_path, sell_form), (cancel_path, cancel_form) = self.server.requests
+        self.assertEqual(sell_path, "/market/sellitem/")
+        self.assertEqual((sell_form["assetid"], sell_form["price"]), ("123", "131"))
+        self.assertEqual(cancel_path, "/market/removelisting/456")
+        self.assertEqual(cancel_form["sessionid"], "session")
+
+    async def test_get_new_market_events_stops_at_cursor(self) -> None:
+        cursor = (datetime.utcfromtimestamp(1640000000 + 99), 0)
+        events = await self.market.get_new_market_events(cursor=cursor, page_size=100)
+        self.assertEqual([event.listingid for event in events], [str(number) for number in reversed(range(100, 250))])
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.rate_limiter.stats.acquired, 2)
+
+    async def test_price_requests_overlap(self) -> None:
+        self.server.delay = 0.2
+        exchange = AsyncExchange(
+            config={"debug": True, "price_workers": 8},
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=self.market,
+            database=None,  # type: ignore[arg-type]
+        )
+        begin = time.monotonic()
+        prices = await exchange.prefetch_prices([f"Case {number}" for number in range(8)])
+        self.assertEqual(prices, {f"Case {number}": 241 for number in range(8)})
+        self.assertLess(time.monotonic() - begin, 1.0)
+
+    async def test_listings_of_blocking_provider_are_streamed(self) -> None:
+        market = BlockingListingsMarket()
+        exchange = AsyncExchange(
+            config={"debug": True, "inventory_cache": {"directory": None}},
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=market,  # type: ignore[arg-type]
+            database=None,  # type: ignore[arg-type]
+        )
+        async for listing in exchange.iter_own_listings(market_hash_name="b"):
+            self.assertEqual(listing.listing_id, "11")
+            break
+        self.assertEqual(market.pages_fetched, 1)
+        listings = await exchange.get_own_listings()
+        self.assertEqual([listing.listing_id for listing in listings], ["10", "11", "20"])
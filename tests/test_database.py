@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Tuple
 from unittest import TestCase
 
 from constants import (
@@ -7,11 +8,20 @@ from constants import (
     TEST_ITEM_KWARGS,
     TEST_LISTING_KWARGS,
 )
+from sqlalchemy import create_engine, event, inspect, text
 
-from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.cli import parse_args
+from steam_inv_dumper.db.db import _MAX_BOUND_PARAMETERS, Database
+from steam_inv_dumper.db.migrations import (
+    SCHEMA_VERSION,
+    get_schema_version,
+    run_migrations,
+)
 from steam_inv_dumper.markets.exchange import Exchange
+from steam_inv_dumper.markets.steam.market import MockedSteamMarket
 from steam_inv_dumper.utils.configuration import load_config
 from steam_inv_dumper.utils.data_structures import (
+    InventoryItem,
     MarketEvent,
     MarketEventTypes,
     MyMarketListing,
@@ -68,6 +78,8 @@ class TestSteamDatabase(TestCase):
                 "item_id": K.item_id,
                 "buyer_pay": K.buyer_pay,
                 "you_receive": K.you_receive,
+                "current_status": K.current_status,
+                "status_changed_at": K.status_changed_at,
             },
         )
 
@@ -120,6 +132,13 @@ class TestSteamDatabase(TestCase):
         self.db.Item.query.session.flush()
         self.assertEqual(self.db.Item.query_ref(market_hash_name="casekey1").all(), [])
 
+    def test_listing_status_follows_events(self) -> None:
+        K = self.db.Listing.query_ref(item_id="12345").first()
+        self.assertEqual(K.listing_status, MarketEventTypes.ListingSold.name)
+        self.assertEqual(K.status_changed_at, datetime(year=2023, month=1, day=2))
+        self.assertEqual(self.db.Listing.query_ref(listing_status=[MarketEventTypes.ListingCreated.name]).all(), [])
+        self.assertEqual(self.db.Listing.query_ref(listing_status=[MarketEventTypes.ListingSold.name]).all(), [K])
+
     def test_correct_decimal_precison(self) -> None:
         K = self.db.Listing.query_ref(item_id="12345").first()
 
@@ -194,3 +213,397 @@ class TestListingIdAddedLater(TestCase):
         self.exchange._update_events(market_events=market_events)
         event_types = [x.event_type for x in self.exchange.database.Event.query.all() if x.listing_id == "100"]
         self.assertEqual(event_types, [MarketEventTypes.ListingCreated.name, MarketEventTypes.ListingSold.name])
+
+    def test_update_events_in_bulk(self) -> None:
+        self.exchange.database.Listing.query_ref(item_id="12345").first().listing_id = "100"
+        self.exchange.database.Listing.query.session.flush()
+        market_events = [
+            MarketEvent(
+                listingid=listing_id,
+                event_type=event_type,
+                event_datetime=datetime(year=2023, month=1, day=day),
+                time_event_fraction=1234,
+                steamid_actor=123456789,
+                purchaseid=None,
+            )
+            for listing_id, event_type, day in [
+                ("100", MarketEventTypes.ListingSold, 2),
+                ("100", MarketEventTypes.ListingCreated, 1),
+                ("100", MarketEventTypes.ListingCreated, 1),
+                ("not_in_db", MarketEventTypes.ListingCreated, 1),
+            ]
+        ]
+        result = self.exchange._update_events(market_events=market_events)
+        self.assertEqual((result.inserted, result.skipped), (2, 2))
+        listing = self.exchange.database.Listing.query_ref(listing_status=[MarketEventTypes.ListingSold.name]).one()
+        self.assertEqual(listing.listing_id, "100")
+
+        result = self.exchange._update_events(market_events=market_events)
+        self.assertEqual((result.inserted, result.skipped), (0, 4))
+
+    def test_delist_survives_status_refresh(self) -> None:
+        listing = self.exchange.database.Listing.query_ref(item_id="12345").first()
+        listing.listing_id = "100"
+        listing.listing_status = MarketEventTypes.ListingCancelled.name
+        self.exchange.database.Listing.query.session.flush()
+        created = MarketEvent(
+            listingid="100",
+            event_type=MarketEventTypes.ListingCreated,
+            event_datetime=datetime(year=2023, month=1, day=1),
+            time_event_fraction=1234,
+            steamid_actor=123456789,
+            purchaseid=None,
+        )
+        self.exchange._update_events(market_events=[created])
+        self.exchange.database.Listing.refresh_status()
+        self.exchange.database.Listing.query.session.expire_all()
+        listing = self.exchange.database.Listing.query_ref(item_id="12345").first()
+        self.assertEqual(listing.listing_status, MarketEventTypes.ListingCancelled.name)
+
+    def test_cursor_waits_for_unknown_listings(self) -> None:
+        self.exchange.database.Listing.query_ref(item_id="12345").first().listing_id = "100"
+        self.exchange.database.Listing.query.session.flush()
+        market_events = [
+            MarketEvent(
+                listingid=listing_id,
+                event_type=event_type,
+                event_datetime=datetime(year=2023, month=1, day=day),
+                time_event_fraction=0,
+                steamid_actor=123456789,
+                purchaseid=None,
+            )
+            for listing_id, event_type, day in [
+                ("100", MarketEventTypes.ListingSold, 7),
+                ("200", MarketEventTypes.ListingCreated, 6),
+                ("100", MarketEventTypes.ListingCreated, 5),
+                # Older than history_retry_window before the newest event: not waited for.
+                ("300", MarketEventTypes.ListingCreated, 1),
+            ]
+        ]
+        cursor = self.exchange.database.MarketHistoryCursor
+        cursor.query.delete()
+        self.exchange._store_market_events(market_events=market_events)
+        self.assertEqual(cursor.get(self.exchange._config["username"]), (datetime(2023, 1, 5), 0))
+
+        self.exchange.database.Listing.query.session.add(
+            self.exchange.database.Listing(item_id="2", listing_id="200", you_receive=100, buyer_pay=115)
+        )
+        self.exchange.database.Listing.query.session.flush()
+        self.exchange._store_market_events(market_events=market_events)
+        self.assertEqual(cursor.get(self.exchange._config["username"]), (datetime(2023, 1, 7), 0))
+        self.assertEqual(self.exchange.database.Event.query.filter_by(listing_id="200").count(), 1)
+        cursor.query.delete()
+
+
+class PagedHistoryMarket(MockedSteamMarket):
+    """
+    Market history of one event per hour, newest first, served by pages.
+    """
+
+    def __init__(self, n_events: int) -> None:
+        super().__init__()
+        self.requests: List[Tuple[int, int]] = []
+        start = datetime(year=2023, month=1, day=1)
+        self.events = [
+            {
+                "listingid": str(number),
+                "event_type": MarketEventTypes.ListingCreated.value,
+                "time_event": int((start + timedelta(hours=number)).replace(tzinfo=timezone.utc).timestamp()),
+                "time_event_fraction": 0,
+                "steamid_actor": "4331",
+            }
+            for number in reversed(range(n_events))
+        ]
+
+    def _fetch_market_history_page(self, start: int, count: int) -> dict:
+        self.requests.append((start, count))
+        return {"success": True, "total_count": len(self.events), "events": self.events[start : start + count]}
+
+
+class TestBackfill(TestCase):
+    def tearDown(self) -> None:
+        self.exchange.database.MarketHistoryCursor.query.delete()
+        clean_all_db(self.exchange.database)
+
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.market = PagedHistoryMarket(n_events=250)
+        self.exchange = Exchange(
+            config=config,
+            database=Database(config=config),
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=self.market,
+        )
+        clean_all_db(self.exchange.database)
+        self.exchange.database.MarketHistoryCursor.query.delete()
+        self.exchange.database.Item.query.session.add(self.exchange.database.Item(**TEST_ITEM_KWARGS))
+        self.exchange.database.Listing.query.session.add(
+            self.exchange.database.Listing(item_id="12345", listing_id="249", you_receive=1430, buyer_pay=1499)
+        )
+        self.exchange.database.Listing.query.session.flush()
+
+    def test_backfill_reads_every_page(self) -> None:
+        self.exchange.backfill_market_events(page_size=100)
+        self.assertEqual(self.market.requests, [(0, 100), (100, 100), (200, 100)])
+        self.assertEqual(self.exchange.database.Event.query.filter_by(listing_id="249").count(), 1)
+        # The events of the last day, of listings not stored yet, are read again by the next sync.
+        cursor = self.exchange.database.MarketHistoryCursor.get(self.exchange._config["username"])
+        self.assertEqual(cursor, (datetime(year=2023, month=1, day=1) + timedelta(hours=224), 0))
+
+        self.market.requests.clear()
+        self.exchange.sync_market_events()
+        self.assertEqual(self.market.requests, [(0, 100)])
+
+    def test_backfill_command(self) -> None:
+        args = parse_args(["backfill", "--account", "seller"])
+        self.assertEqual((args.command, args.account), ("backfill", "seller"))
+        self.assertIsNone(parse_args(["backfill"]).account)
+
+
+class TestUpdateItemsInDatabase(TestCase):
+    def tearDown(self) -> None:
+        clean_all_db(self.exchange.database)
+
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        db = Database(config=config)
+        self.exchange = Exchange(
+            config=config,
+            database=db,
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=None,  # type: ignore[arg-type]
+        )
+        clean_all_db(self.exchange.database)
+        self.exchange.database.Item.query.session.add(self.exchange.database.Item(**TEST_ITEM_KWARGS))
+        self.exchange.database.Item.query.session.flush()
+
+    def test_only_new_items_are_inserted(self) -> None:
+        items = [
+            InventoryItem.from_my_listing_dict({**DESCRIPTION, "id": item_id, "market_tradable_restriction": 0})
+            for item_id in ["12345", "1", "2", "2"]
+        ]
+        result = self.exchange._update_items_in_database(inventory_items_list=items)
+        self.assertEqual((result.inserted, result.skipped), (2, 2))
+        self.assertEqual(sorted(item.item_id for item in self.exchange.database.Item.query.all()), ["1", "12345", "2"])
+        self.assertEqual(
+            self.exchange.database.Item.query_ref(item_id="1").first().account, self.exchange._config["username"]
+        )
+
+        result = self.exchange._update_items_in_database(inventory_items_list=items)
+        self.assertEqual((result.inserted, result.skipped), (0, 4))
+
+    def test_existing_item_ids_in_chunks(self) -> None:
+        items = [
+            InventoryItem.from_my_listing_dict({**DESCRIPTION, "id": str(item_id), "market_tradable_restriction": 0})
+            for item_id in range(1200)
+        ]
+        result = self.exchange._update_items_in_database(inventory_items_list=items)
+        self.assertEqual((result.inserted, result.skipped), (1200, 0))
+
+        parameters: List[Any] = []
+
+        def record_parameters(
+            connection: Any, cursor: Any, statement: str, statement_parameters: Any, context: Any, executemany: bool
+        ) -> None:
+            parameters.append(statement_parameters)
+
+        engine = self.exchange.database.engine
+        event.listen(engine, "before_cursor_execute", record_parameters)
+        try:
+            item_ids = ["12345", "unknown"] + [str(item_id) for item_id in range(0, 1200, 2)]
+            existing = self.exchange.database.Item.existing_item_ids(item_ids)
+        finally:
+            event.remove(engine, "before_cursor_execute", record_parameters)
+        self.assertEqual(existing, {"12345"} | {str(item_id) for item_id in range(0, 1200, 2)})
+        # 602 item_ids in chunks of _MAX_BOUND_PARAMETERS
+        self.assertEqual(len(parameters), 2)
+        self.assertTrue(all(len(chunk) <= _MAX_BOUND_PARAMETERS for chunk in parameters))
+
+
+class TestUpdateSoldItems(TestCase):
+    def tearDown(self) -> None:
+        clean_all_db(self.exchange.database)
+
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        db = Database(config=config)
+        self.exchange = Exchange(
+            config=config,
+            database=db,
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=None,  # type: ignore[arg-type]
+        )
+        clean_all_db(self.exchange.database)
+        accounts = {"1": config["username"], "2": config["username"], "3": config["username"], "4": "other"}
+        for item_id, account in accounts.items():
+            self.exchange.database.Item.query.session.add(
+                self.exchange.database.Item(**{**TEST_ITEM_KWARGS, "item_id": item_id, "account": account})
+            )
+            self.exchange.database.Listing.query.session.add(
+                self.exchange.database.Listing(
+                    **{**TEST_LISTING_KWARGS, "item_id": item_id, "listing_id": f"listing{item_id}"}
+                )
+            )
+        self.exchange.database.Item.query.session.flush()
+
+    def test_items_not_listed_are_sold(self) -> None:
+        my_listings = [
+            MyMarketListing.from_dict(
+                {
+                    "listing_id": "listing1",
+                    "buyer_pay": 0,
+                    "you_receive": 0,
+                    "created_on": "",
+                    "need_confirmation": False,
+                    "description": {**DESCRIPTION, "id": "1"},
+                }
+            )
+        ]
+        self.exchange._update_sold_items(items_sale_listings=my_listings)
+        sold = {item.item_id: item.sold for item in self.exchange.database.Item.query.all()}
+        # Listings of the other accounts sharing the database are left alone.
+        self.assertEqual(sold, {"1": False, "2": True, "3": True, "4": False})
+        self.assertEqual(self.exchange.database.Item.mark_sold(["2", "3"]), 0)
+
+
+class TestMigrations(TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite://")
+        with self.engine.begin() as connection:
+            # Tables as created before the schema was versioned.
+            connection.execute(
+                text(
+                    "CREATE TABLE items (id INTEGER PRIMARY KEY, account VARCHAR NOT NULL, item_id VARCHAR UNIQUE, "
+                    "market_hash_name VARCHAR NOT NULL, sold BOOLEAN NOT NULL)"
+                )
+            )
+            connection.execute(
+                text(
+                    "CREATE TABLE listings (id INTEGER PRIMARY KEY, buyer_pay INTEGER NOT NULL, currency VARCHAR, "
+                    "item_id VARCHAR, listing_id VARCHAR UNIQUE, you_receive INTEGER NOT NULL)"
+                )
+            )
+            connection.execute(
+                text(
+                    "CREATE TABLE events (id INTEGER PRIMARY KEY, event_datetime DATETIME NOT NULL, "
+                    "event_type VARCHAR NOT NULL, listing_id VARCHAR, purchase_id VARCHAR, "
+                    "steam_id_actor VARCHAR NOT NULL, time_event_fraction INTEGER NOT NULL)"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO listings (buyer_pay, currency, item_id, listing_id, you_receive) VALUES "
+                    "(1499, 'EUR', '1', 'sold', 1430), (1499, 'EUR', '2', 'listed', 1430)"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO events (event_datetime, event_type, listing_id, steam_id_actor, time_event_fraction) "
+                    "VALUES ('2023-01-01 00:00:00', 'ListingCreated', 'sold', '1', 0), "
+                    "('2023-01-02 00:00:00', 'ListingSold', 'sold', '2', 0)"
+                )
+            )
+
+    def test_listing_status_backfill(self) -> None:
+        run_migrations(self.engine)
+        run_migrations(self.engine)
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text("SELECT listing_id, current_status, status_changed_at FROM listings ORDER BY listing_id")
+            ).fetchall()
+        self.assertEqual(
+            [tuple(row) for row in rows],
+            [("listed", "ListingCreated", None), ("sold", "ListingSold", "2023-01-02 00:00:00")],
+        )
+        indexes = {index["name"] for index in inspect(self.engine).get_indexes("listings")}
+        self.assertIn("ix_listings_current_status", indexes)
+
+    def test_migrations_are_versioned(self) -> None:
+        with self.engine.connect() as connection:
+            self.assertEqual(get_schema_version(connection), 0)
+        run_migrations(self.engine)
+        with self.engine.connect() as connection:
+            self.assertEqual(get_schema_version(connection), SCHEMA_VERSION)
+        indexes = {index["name"] for index in inspect(self.engine).get_indexes("events")}
+        self.assertIn("ix_events_listing_id_event_datetime", indexes)
+        indexes = {index["name"] for index in inspect(self.engine).get_indexes("items")}
+        self.assertIn("ix_items_market_hash_name_sold", indexes)
+
+
+class TestSqliteProfile(TestCase):
+    def test_performance_profile_pragmas(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        db = Database(config={**config, "db_url": "sqlite://", "sqlite_profile": "performance"})
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("PRAGMA synchronous")).scalar(), 1)
+            self.assertEqual(connection.execute(text("PRAGMA temp_store")).scalar(), 2)
+            self.assertEqual(connection.execute(text("PRAGMA cache_size")).scalar(), -65536)
+
+    def test_default_profile_keeps_sqlite_defaults(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        config.pop("sqlite_profile", None)
+        db = Database(config={**config, "db_url": "sqlite://"})
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("PRAGMA synchronous")).scalar(), 2)
+            self.assertEqual(connection.execute(text("PRAGMA temp_store")).scalar(), 0)
+
+    def test_unknown_profile(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        with self.assertRaises(ValueError):
+            Database(config={**config, "db_url": "sqlite://", "sqlite_profile": "fastest"})
+
+
+class TestTransaction(TestCase):
+    def tearDown(self) -> None:
+        clean_all_db(self.db)
+
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.db = Database(config=config)
+        clean_all_db(self.db)
+
+    def test_rollback_on_error(self) -> None:
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.Item.query.session.add(self.db.Item(**TEST_ITEM_KWARGS))
+                self.db.Item.query.session.flush()
+                raise RuntimeError("Sell loop failed")
+        self.assertEqual(self.db.Item.query.all(), [])
+
+    def test_commit(self) -> None:
+        with self.db.transaction():
+            self.db.Item.query.session.add(self.db.Item(**TEST_ITEM_KWARGS))
+            self.db.Item.query.session.flush()
+            with self.db.transaction():
+                self.db.Item.query.session.add(self.db.Item(**{**TEST_ITEM_KWARGS, "item_id": "2"}))
+        self.assertEqual(len(self.db.Item.query.all()), 2)
+
+
+class TestMarketHistoryCursor(TestCase):
+    def tearDown(self) -> None:
+        self.db.MarketHistoryCursor.query.delete()
+
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.db = Database(config=config)
+        self.db.MarketHistoryCursor.query.delete()
+
+    def _event(self, day: int, fraction: int) -> MarketEvent:
+        return MarketEvent(
+            listingid="100",
+            event_type=MarketEventTypes.ListingSold,
+            event_datetime=datetime(year=2023, month=1, day=day),
+            time_event_fraction=fraction,
+            steamid_actor=1,
+            purchaseid=None,
+        )
+
+    def test_cursor_only_moves_forward(self) -> None:
+        self.assertIsNone(self.db.MarketHistoryCursor.get("account"))
+        self.db.MarketHistoryCursor.advance("account", [self._event(2, 5), self._event(1, 9)])
+        self.assertEqual(self.db.MarketHistoryCursor.get("account"), (datetime(2023, 1, 2), 5))
+        self.db.MarketHistoryCursor.advance("account", [self._event(1, 1)])
+        self.assertEqual(self.db.MarketHistoryCursor.get("account"), (datetime(2023, 1, 2), 5))
+        self.db.MarketHistoryCursor.advance("account", [self._event(2, 6)])
+        self.assertEqual(self.db.MarketHistoryCursor.get("account"), (datetime(2023, 1, 2), 6))
+        self.assertIsNone(self.db.MarketHistoryCursor.get("other_account"))
@@ -0,0 +1,188 @@
+import threading
+import time
+from typing import Iterator, List, Tuple
+from unittest import TestCase
+
+from constants import DESCRIPTION, TEST_ITEM_KWARGS
+from steampy.models import Currency
+from test_database import clean_all_db
+
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.markets.exchange import Exchange
+from steam_inv_dumper.utils.configuration import load_config
+from steam_inv_dumper.utils.data_structures import ListOnMarket, MarketActionType
+
+
+class SlowMarket:
+    """
+    Market provider answering prices after a delay, and failing for unknown items.
+    """
+
+    currency = Currency.EURO
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_item_price(self, market_hash_name: str) -> dict:
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if market_hash_name == "unknown":
+            raise Exception("Error getting price")
+        return {"success": True, "lowest_price": "2,42€", "volume": "7", "median_price": "2,40€"}
+
+
+class PagedListingsMarket:
+    """
+    Market provider yielding listings of distinct items, counting those read.
+    """
+
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self.yielded = 0
+
+    def iter_my_market_listings(self, page_size: int = 100) -> Iterator[Tuple[str, dict]]:
+        for number in range(self.count):
+            self.yielded += 1
+            yield str(number), {
+                "listing_id": str(number),
+                "buyer_pay": "1,15€",
+                "you_receive": "1,00€",
+                "created_on": "1 Jan",
+                "need_confirmation": False,
+                "description": {**DESCRIPTION, "id": str(number), "market_hash_name": f"Case {number}"},
+            }
+
+
+class OrdersMarket:
+    """
+    Market provider accepting sell orders, except for the item "fail", and noting if a transaction was open.
+    """
+
+    currency = Currency.EURO
+
+    def __init__(self, database: Database) -> None:
+        self.database = database
+        self.in_transaction: List[bool] = []
+
+    def create_sell_order(self, assetid: str, game: object, money_to_receive: str) -> dict:
+        self.in_transaction.append(self.database.Listing.query.session.in_transaction())
+        if assetid == "fail":
+            raise Exception("Error creating the sell order")
+        return {}
+
+
+class TestOwnListings(TestCase):
+    def setUp(self) -> None:
+        self.market = PagedListingsMarket(count=300)
+        self.exchange = Exchange(
+            config={"debug": True},
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=self.market,  # type: ignore[arg-type]
+            database=None,  # type: ignore[arg-type]
+        )
+
+    def test_get_own_listings(self) -> None:
+        listings = self.exchange.get_own_listings()
+        self.assertEqual(len(listings), 300)
+        self.assertEqual(listings[1].you_receive, 100)
+
+    def test_iter_own_listings_stops_early(self) -> None:
+        listing = next(self.exchange.iter_own_listings(market_hash_name="Case 42"))
+        self.assertEqual(listing.listing_id, "42")
+        self.assertEqual(self.market.yielded, 43)
+
+
+class TestListingIds(TestCase):
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.db = Database(config=config)
+        clean_all_db(self.db)
+        self.db.Item.query.session.add(
+            self.db.Item(**{**TEST_ITEM_KWARGS, "item_id": "5", "account": config["username"]})
+        )
+        self.db.Listing.query.session.add(
+            self.db.Listing(item_id="5", listing_id=None, you_receive=100, buyer_pay=115, currency="EURO")
+        )
+        self.db.Listing.query.session.flush()
+        self.market = PagedListingsMarket(count=300)
+        self.exchange = Exchange(
+            config=config,
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=self.market,  # type: ignore[arg-type]
+            database=self.db,
+        )
+
+    def tearDown(self) -> None:
+        clean_all_db(self.db)
+
+    def test_listings_are_fetched_until_found(self) -> None:
+        waiting = self.exchange._items_waiting_for_listing_id()
+        self.assertEqual(waiting, {"5"})
+        self.exchange._store_listing_ids(self.exchange.listings_of(waiting))
+        self.assertEqual(self.market.yielded, 6)
+        self.assertEqual(self.db.Listing.query_ref(item_id="5").first().listing_id, "5")
+        self.assertEqual(self.exchange._items_waiting_for_listing_id(), set())
+
+    def test_no_listings_fetched_when_none_is_waiting(self) -> None:
+        self.assertEqual(self.exchange.listings_of(set()), [])
+        self.assertEqual(self.market.yielded, 0)
+
+
+class TestPrefetchPrices(TestCase):
+    def test_prices_are_fetched_concurrently(self) -> None:
+        market = SlowMarket(delay=0.05)
+        exchange = Exchange(
+            config={"debug": True, "price_workers": 4},
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=market,  # type: ignore[arg-type]
+            database=None,  # type: ignore[arg-type]
+        )
+        names = [f"Case {number}" for number in range(8)] + ["unknown"]
+        prices = exchange.prefetch_prices(market_hash_names=names)
+
+        self.assertEqual(prices, {f"Case {number}": 241 for number in range(8)})
+        self.assertEqual(market.max_in_flight, 4)
+
+
+class TestDispatch(TestCase):
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.db = Database(config=config)
+        clean_all_db(self.db)
+        self.market = OrdersMarket(self.db)
+        self.exchange = Exchange(
+            config={**config, "debug": False, "inventory_cache": {"directory": None}},
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=self.market,  # type: ignore[arg-type]
+            database=self.db,
+        )
+
+    def tearDown(self) -> None:
+        clean_all_db(self.db)
+
+    def test_orders_sent_before_a_failure_are_recorded(self) -> None:
+        to_list = [
+            ListOnMarket.from_dict(
+                {
+                    "action_type": MarketActionType.PlaceOnMarket,
+                    "market_hash_name": "Chroma 2 Case",
+                    "item_id": item_id,
+                    "you_receive": 100,
+                    "buyer_pays": 115,
+                }
+            )
+            for item_id in ("1", "2", "fail", "3")
+        ]
+        with self.assertRaises(Exception):
+            self.exchange.dispatch_sales(item_for_sale_list=to_list)
+
+        self.assertEqual(self.market.in_transaction, [False, False, False])
+        self.assertFalse(self.db.Listing.query.session.in_transaction())
+        self.assertEqual(sorted(listing.item_id for listing in self.db.Listing.query.all()), ["1", "2"])
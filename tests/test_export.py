@@ -0,0 +1,134 @@
+import csv
+import gzip
+import json
+import tempfile
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import TestCase, skipUnless
+
+from constants import TEST_ITEM_KWARGS
+from test_database import clean_all_db
+
+from steam_inv_dumper.cli import EXPORT_TABLE_NAMES, parse_args
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.db.export import (
+    EXPORT_TABLES,
+    STATE_FILE,
+    ExportResult,
+    export_database,
+    export_table,
+)
+from steam_inv_dumper.utils.configuration import load_config
+
+
+def read_csv_gz(path: Path) -> list:
+    with gzip.open(path, "rt", encoding="utf8", newline="") as file:
+        return list(csv.reader(file))
+
+
+def written(result: ExportResult) -> Path:
+    assert result.path is not None, "nothing written"
+    return result.path
+
+
+class TestExport(TestCase):
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.db = Database(config=config)
+        clean_all_db(self.db)
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.directory.name)
+        for item_id in ("1", "2", "3"):
+            self.add_item(item_id)
+
+    def tearDown(self) -> None:
+        clean_all_db(self.db)
+        self.directory.cleanup()
+
+    def add_item(self, item_id: str) -> int:
+        session = self.db.Item.query.session
+        item = self.db.Item(**{**TEST_ITEM_KWARGS, "item_id": item_id})
+        session.add(item)
+        session.flush()
+        return item.id
+
+    def item_ids(self) -> list:
+        return [item.id for item in self.db.Item.query.order_by(self.db.Item.id)]
+
+    def test_export_table(self) -> None:
+        ids = self.item_ids()
+        result = export_table(self.db.engine, "items", self.output_dir, format="csv.gz", chunk_size=2)
+        self.assertEqual(result.rows, 3)
+        self.assertEqual(result.last_id, ids[-1])
+        self.assertEqual(result.path, self.output_dir / f"items_{ids[0]}_{ids[-1]}.csv.gz")
+        rows = read_csv_gz(written(result))
+        self.assertEqual(rows[0], [column.name for column in EXPORT_TABLES["items"].columns])
+        item_id = rows[0].index("item_id")
+        self.assertEqual([row[item_id] for row in rows[1:]], ["1", "2", "3"])
+        self.assertEqual([path.name for path in self.output_dir.iterdir()], [written(result).name])
+
+    def test_nothing_to_export(self) -> None:
+        result = export_table(self.db.engine, "events", self.output_dir, format="csv.gz")
+        self.assertEqual((result.rows, result.last_id, result.path), (0, 0, None))
+        self.assertEqual(list(self.output_dir.iterdir()), [])
+
+    def test_incremental_export(self) -> None:
+        first = export_database(self.db, self.output_dir, tables=["items"], format="csv.gz")
+        new_id = self.add_item("4")
+        second = export_database(self.db, self.output_dir, tables=["items"], format="csv.gz")
+        self.assertEqual(second["items"].rows, 1)
+        self.assertEqual(written(second["items"]).name, f"items_{new_id}_{new_id}.csv.gz")
+        self.assertEqual(len(read_csv_gz(written(second["items"]))), 2)
+        state = json.loads((self.output_dir / STATE_FILE).read_text(encoding="utf8"))
+        self.assertEqual(state, {"items": new_id})
+
+        third = export_database(self.db, self.output_dir, tables=["items"], format="csv.gz")
+        self.assertIsNone(third["items"].path)
+        self.assertEqual(third["items"].last_id, new_id)
+
+        full = export_database(self.db, self.output_dir, tables=["items"], format="csv.gz", full=True)
+        self.assertEqual(full["items"].rows, 4)
+        self.assertEqual(written(full["items"]).name, f"items_{self.item_ids()[0]}_{new_id}.csv.gz")
+        self.assertFalse(written(first["items"]).exists())
+        self.assertFalse(written(second["items"]).exists())
+        self.assertEqual(
+            sorted(path.name for path in self.output_dir.iterdir()), sorted([written(full["items"]).name, STATE_FILE])
+        )
+
+    def test_full_export_keeps_other_tables(self) -> None:
+        export_database(self.db, self.output_dir, format="csv.gz")
+        self.add_item("4")
+        incremental = export_database(self.db, self.output_dir, tables=["items"], format="csv.gz")
+        events = self.output_dir / "events_1_1.csv.gz"
+        events.write_bytes(b"")
+        full = export_database(self.db, self.output_dir, tables=["items"], format="csv.gz", full=True)
+        self.assertFalse(written(incremental["items"]).exists())
+        self.assertTrue(written(full["items"]).exists())
+        self.assertTrue(events.exists())
+        # Each row once across the files of the table.
+        rows = [row for path in self.output_dir.glob("items_*") for row in read_csv_gz(path)[1:]]
+        self.assertEqual(len(rows), 4)
+
+    def test_export_all_tables(self) -> None:
+        results = export_database(self.db, self.output_dir, format="csv.gz")
+        self.assertEqual(list(results), list(EXPORT_TABLES))
+        self.assertEqual(results["items"].rows, 3)
+        self.assertIsNone(results["listings"].path)
+
+    @skipUnless(find_spec("pyarrow"), "pyarrow is not installed")
+    def test_export_parquet(self) -> None:
+        import pyarrow.parquet
+
+        result = export_table(self.db.engine, "items", self.output_dir, chunk_size=2)
+        table = pyarrow.parquet.read_table(result.path)
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column("item_id").to_pylist(), ["1", "2", "3"])
+
+    def test_parse_args(self) -> None:
+        self.assertEqual(EXPORT_TABLE_NAMES, tuple(EXPORT_TABLES))
+        args = parse_args(["export", "--tables", "items", "events", "--format", "parquet", "--full"])
+        self.assertEqual(
+            (args.command, args.tables, args.format, args.full), ("export", ["items", "events"], "parquet", True)
+        )
+        args = parse_args(["export"])
+        self.assertEqual((args.output_dir, args.format), ("export", "csv.gz"))
@@ -0,0 +1,125 @@
+import pickle
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Set, Tuple, cast
+from unittest import TestCase
+
+import requests
+
+from steam_inv_dumper.markets.steam.http import (
+    SteamHTTPAdapter,
+    configure_session,
+    endpoint_class,
+    http_config,
+    timeout_for,
+)
+
+
+class FlakySteamHandler(BaseHTTPRequestHandler):
+    """
+    Drops the first connection of every path, then answers. Price requests take server.delay seconds.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server: "FlakySteamServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _answer(self) -> None:
+        self.server.requests.append((self.command, self.path))
+        if self.path not in self.server.dropped:
+            self.server.dropped.add(self.path)
+            self.close_connection = True
+            return
+        if self.path.startswith("/market/priceoverview"):
+            time.sleep(self.server.delay)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = b'{"success": true}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _answer
+    do_POST = _answer
+
+
+class FlakySteamServer(ThreadingHTTPServer):
+    delay: float = 0
+    requests: List[Tuple[str, str]]
+    dropped: Set[str]
+
+
+class TestEndpointClasses(TestCase):
+    def test_endpoint_class(self) -> None:
+        self.assertEqual(endpoint_class("https://steamcommunity.com/market/priceoverview/?appid=730"), "price")
+        self.assertEqual(endpoint_class("https://steamcommunity.com/market/mylistings/render/"), "listings")
+        self.assertEqual(endpoint_class("https://steamcommunity.com/market/myhistory/render/"), "history")
+        self.assertEqual(endpoint_class("https://steamcommunity.com/market/sellitem/"), "sell")
+        self.assertEqual(endpoint_class("https://steamcommunity.com/market/removelisting/123"), "sell")
+        self.assertEqual(endpoint_class("https://store.steampowered.com/account/history/"), "default")
+
+    def test_timeouts_override_defaults(self) -> None:
+        config = http_config({"timeouts": {"price": [2, 5]}, "pool_maxsize": 4})
+        self.assertEqual(config["pool_maxsize"], 4)
+        self.assertEqual(timeout_for("/market/priceoverview/", config["timeouts"]), (2, 5))
+        self.assertEqual(timeout_for("/market/sellitem/", config["timeouts"]), 30)
+
+
+class TestConfigureSession(TestCase):
+    server: FlakySteamServer
+    url: str
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FlakySteamServer(("127.0.0.1", 0), FlakySteamHandler)
+        cls.server.requests = []
+        cls.server.dropped = set()
+        cls.server.delay = 0
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.server.requests.clear()
+        self.server.dropped.clear()
+        self.server.delay = 0
+        self.session = configure_session(
+            requests.Session(), {"retries": 2, "backoff_factor": 0, "timeouts": {"price": 0.2}}
+        )
+
+    def test_adapter_is_mounted_and_pickled(self) -> None:
+        adapter = cast(SteamHTTPAdapter, self.session.get_adapter("https://steamcommunity.com/market/"))
+        self.assertIsInstance(adapter, SteamHTTPAdapter)
+        self.assertEqual(adapter.poolmanager.connection_pool_kw["maxsize"], 16)
+        self.assertEqual(self.session.headers["Connection"], "keep-alive")
+
+        restored = pickle.loads(pickle.dumps(self.session)).get_adapter("https://steamcommunity.com/")
+        self.assertEqual(restored.timeouts, adapter.timeouts)
+        self.assertEqual(restored.max_retries.total, 2)
+
+    def test_dropped_connections_are_retried_for_get(self) -> None:
+        response = self.session.get(f"{self.url}/market/mylistings/render/")
+        self.assertEqual(response.json(), {"success": True})
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_sell_orders_are_not_sent_twice(self) -> None:
+        with self.assertRaises(requests.ConnectionError):
+            self.session.post(f"{self.url}/market/sellitem/", data={"assetid": "1"})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_timeout_of_the_endpoint_class(self) -> None:
+        self.server.dropped.add("/market/priceoverview/")
+        self.server.delay = 1
+        session = configure_session(requests.Session(), {"retries": 0, "timeouts": {"price": 0.2}})
+        begin = time.monotonic()
+        # Timeouts past the retries surface as ConnectionError from requests.
+        with self.assertRaisesRegex(requests.RequestException, "Read timed out"):
+            session.get(f"{self.url}/market/priceoverview/")
+        self.assertLess(time.monotonic() - begin, 0.9)
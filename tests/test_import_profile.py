@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+from steam_inv_dumper.utils.import_profile import parse_importtime, summarize_importtime
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     sqlalchemy.sql
+import time:       300 |        400 |   sqlalchemy
+import time:       200 |        600 | steam_inv_dumper.db.db
+some log line
+import time:        50 |         50 | argparse
+"""
+
+
+class TestImportProfile(TestCase):
+    def test_parse_and_summarize(self) -> None:
+        timings = parse_importtime(IMPORTTIME_OUTPUT.splitlines())
+        depths = [(timing.module, timing.depth) for timing in timings[1:3]]
+        self.assertEqual(depths, [("sqlalchemy", 1), ("steam_inv_dumper.db.db", 0)])
+        summary = summarize_importtime(timings, top=1)
+        rows = [line.split() for line in summary.splitlines()]
+        self.assertIn("Imports: 0.7 ms, 4 modules", summary)
+        self.assertIn(["sqlalchemy", "0.4"], rows)
+        self.assertIn(["steam_inv_dumper.db.db", "0.6"], rows)
+        self.assertNotIn("argparse", summary)
+
+    def test_cli_imports_are_lazy(self) -> None:
+        code = (
+            "import sys, steam_inv_dumper.cli, steam_inv_dumper.main, steam_inv_dumper.utils.data_structures; "
+            "print(sorted({'sqlalchemy', 'steampy', 'numpy', 'httpx'} & set(sys.modules)))"
+        )
+        environment = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, env=environment, check=True
+        )
+        self.assertEqual(output.stdout.strip(), "[]")
@@ -0,0 +1,132 @@
+import tempfile
+from pathlib import Path
+from typing import Optional
+from unittest import TestCase
+
+from constants import DESCRIPTION
+from steampy.models import Currency, GameOptions
+
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.markets.exchange import Exchange
+from steam_inv_dumper.utils.configuration import load_config
+from steam_inv_dumper.utils.data_structures import ListOnMarket, MarketActionType
+from steam_inv_dumper.utils.inventory_cache import InventoryCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeInventory:
+    currency = Currency.EURO
+
+    def __init__(self, item_ids: list) -> None:
+        self.item_ids = item_ids
+        self.calls = 0
+
+    def get_my_inventory(self, game: Optional[GameOptions] = None) -> dict:
+        self.calls += 1
+        return {
+            item_id: {**DESCRIPTION, "id": item_id, "market_tradable_restriction": 0, "marketable": 1}
+            for item_id in self.item_ids
+        }
+
+
+class TestInventoryCache(TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.path = Path(tempfile.mkdtemp()) / "inventory_test.json.gz"
+        self.cache = InventoryCache(refresh_interval=600, path=self.path, clock=self.clock)
+        self.inventory = FakeInventory(["1", "2", "3"])
+
+    def test_refresh_interval(self) -> None:
+        self.assertEqual(sorted(self.cache.get("730_2", self.inventory.get_my_inventory)), ["1", "2", "3"])
+        self.clock.now += 599
+        self.cache.get("730_2", self.inventory.get_my_inventory)
+        self.assertEqual(self.inventory.calls, 1)
+        self.clock.now += 1
+        self.cache.get("730_2", self.inventory.get_my_inventory)
+        self.assertEqual(self.inventory.calls, 2)
+
+    def test_local_changes_and_invalidation(self) -> None:
+        self.cache.get("730_2", self.inventory.get_my_inventory)
+        self.cache.remove_items(["2"])
+        self.assertEqual(sorted(self.cache.get("730_2", self.inventory.get_my_inventory)), ["1", "3"])
+        self.cache.invalidate("delist")
+        self.assertEqual(sorted(self.cache.get("730_2", self.inventory.get_my_inventory)), ["1", "2", "3"])
+        self.assertEqual(self.inventory.calls, 2)
+        self.assertEqual(self.cache.stats.invalidated_by, {"delist": 1})
+
+    def test_snapshot_survives_restarts(self) -> None:
+        self.cache.get("730_2", self.inventory.get_my_inventory)
+        self.cache.remove_items(["3"])
+        restarted = InventoryCache(refresh_interval=600, path=self.path, clock=self.clock)
+        self.assertEqual(sorted(restarted.get("730_2", self.inventory.get_my_inventory)), ["1", "2"])
+        self.assertEqual(self.inventory.calls, 1)
+
+    def test_snapshot_in_memory_without_directory(self) -> None:
+        self.assertIsNone(InventoryCache.from_config(None, account="test")._path)
+        directory = tempfile.mkdtemp()
+        cache = InventoryCache.from_config({"directory": directory}, account="test")
+        self.assertEqual(cache._path, Path(directory) / "inventory_test.json.gz")
+
+    def test_unreadable_snapshot_is_refetched(self) -> None:
+        self.path.write_bytes(b"not gzip")
+        self.assertEqual(sorted(self.cache.get("730_2", self.inventory.get_my_inventory)), ["1", "2", "3"])
+
+
+class TestExchangeInventoryCache(TestCase):
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.db = Database(config=config)
+        self.db.Listing.query.delete()
+        self.inventory = FakeInventory(["1", "2"])
+        self.exchange = Exchange(
+            config={**config, "inventory_cache": {"directory": tempfile.mkdtemp()}},
+            inventory_provider=self.inventory,  # type: ignore[arg-type]
+            market_provider=self.inventory,  # type: ignore[arg-type]
+            database=self.db,
+        )
+
+    def tearDown(self) -> None:
+        self.db.Listing.query.delete()
+
+    def test_sales_are_applied_locally(self) -> None:
+        self.assertEqual(len(self.exchange.get_own_items()), 2)
+        self.exchange.dispatch_sales(
+            [
+                ListOnMarket(
+                    action_type=MarketActionType.PlaceOnMarket,
+                    item_id="1",
+                    buyer_pays="115",
+                    market_hash_name="market_hash_name",
+                    you_receive="100",
+                )
+            ]
+        )
+        self.assertEqual([item.item_id for item in self.exchange.get_own_items()], ["2"])
+        self.assertEqual(self.inventory.calls, 1)
+
+    def test_snapshot_is_invalidated_when_sales_are_not_stored(self) -> None:
+        self.assertEqual(len(self.exchange.get_own_items()), 2)
+
+        def fail(element: ListOnMarket) -> None:
+            raise ValueError("database is locked")
+
+        setattr(self.exchange, "_record_sale", fail)
+        sale = ListOnMarket(
+            action_type=MarketActionType.PlaceOnMarket,
+            item_id="1",
+            buyer_pays="115",
+            market_hash_name="market_hash_name",
+            you_receive="100",
+        )
+        with self.assertRaises(ValueError):
+            self.exchange.dispatch_sales([sale])
+        self.assertEqual(self.exchange.inventory_cache.stats.invalidated_by, {"rollback": 1})
+        self.assertEqual(sorted(item.item_id for item in self.exchange.get_own_items()), ["1", "2"])
+        self.assertEqual(self.inventory.calls, 2)
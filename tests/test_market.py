@@ -1,5 +1,7 @@
 from datetime import datetime
+from typing import Callable, List, Tuple
 
+from steam_inv_dumper.markets.steam.market import fetch_market_events_since
 from steam_inv_dumper.utils.data_structures import MarketEvent, MarketEventTypes
 
 
@@ -19,3 +21,49 @@ def test__parse_market_events():
     assert market_event.time_event_fraction == 367000000
     assert market_event.steamid_actor == "4331"
     assert market_event.purchaseid is None
+
+
+def _history(n_events: int) -> list:
+    # newest first, as returned by Steam.
+    return [
+        {
+            "listingid": str(number),
+            "event_type": 1,
+            "time_event": 1640000000 + number,
+            "time_event_fraction": 0,
+            "steamid_actor": "4331",
+        }
+        for number in reversed(range(n_events))
+    ]
+
+
+def _page_fetcher(history: list, requests: List[Tuple[int, int]]) -> Callable[[int, int], dict]:
+    def fetch_page(start: int, count: int) -> dict:
+        requests.append((start, count))
+        return {"success": True, "total_count": len(history), "events": history[start : start + count]}
+
+    return fetch_page
+
+
+def test_fetch_market_events_since_stops_at_cursor() -> None:
+    history = _history(1000)
+    requests: List[Tuple[int, int]] = []
+    cursor = (datetime.utcfromtimestamp(1640000000 + 849), 0)
+    events = fetch_market_events_since(_page_fetcher(history, requests), cursor=cursor, page_size=100)
+    assert [event.listingid for event in events] == [str(number) for number in reversed(range(850, 1000))]
+    assert requests == [(0, 100), (100, 100)]
+
+
+def test_fetch_market_events_since_full_history() -> None:
+    history = _history(1234)
+    requests: List[Tuple[int, int]] = []
+    events = fetch_market_events_since(_page_fetcher(history, requests), page_size=500)
+    assert len(events) == 1234
+    assert requests == [(0, 500), (500, 500), (1000, 500)]
+
+
+def test_fetch_market_events_since_max_pages() -> None:
+    requests: List[Tuple[int, int]] = []
+    events = fetch_market_events_since(_page_fetcher(_history(300), requests), page_size=100, max_pages=1)
+    assert len(events) == 100
+    assert requests == [(0, 100)]
@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+from typing import List
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from steampy.models import Currency
+
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.markets.exchange import Exchange
+from steam_inv_dumper.utils.configuration import load_config
+from steam_inv_dumper.utils.price_cache import PriceCache
+
+PRICE = {"success": True, "lowest_price": "2,42€", "volume": "7", "median_price": "2,40€"}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingFetch:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.done = threading.Event()
+
+    def __call__(self) -> dict:
+        self.release.wait(5)
+        self.calls += 1
+        self.done.set()
+        return {**PRICE, "call": self.calls}
+
+
+class TestPriceCache(TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.cache = PriceCache(ttl=60, stale_while_revalidate=120, clock=self.clock)
+        self.fetch = CountingFetch()
+
+    def test_ttl(self) -> None:
+        self.assertEqual(self.cache.get("Case", "EURO", self.fetch)["call"], 1)
+        self.clock.now += 59
+        self.assertEqual(self.cache.get("Case", "EURO", self.fetch)["call"], 1)
+        self.assertEqual(self.cache.get("Case", "USD", self.fetch)["call"], 2)
+        self.clock.now += 200
+        self.assertEqual(self.cache.get("Case", "EURO", self.fetch)["call"], 3)
+        self.assertEqual((self.cache.stats.hits, self.cache.stats.misses), (1, 3))
+
+    def test_stale_while_revalidate(self) -> None:
+        self.cache.get("Case", "EURO", self.fetch)
+        self.clock.now += 90
+        self.fetch.done.clear()
+        self.fetch.release.clear()
+        # Stale prices are served while a single refresh runs.
+        self.assertEqual(self.cache.get("Case", "EURO", self.fetch)["call"], 1)
+        self.assertEqual(self.cache.get("Case", "EURO", self.fetch)["call"], 1)
+        self.fetch.release.set()
+        # Closing waits for the refresh running.
+        self.cache.close()
+        self.assertEqual(self.cache.get("Case", "EURO", self.fetch)["call"], 2)
+        self.assertEqual(self.fetch.calls, 2)
+        self.assertEqual((self.cache.stats.stale_hits, self.cache.stats.refreshes, self.cache.stats.hits), (2, 1, 1))
+
+    def test_refreshes_run_on_bounded_workers(self) -> None:
+        cache = PriceCache(ttl=60, stale_while_revalidate=120, clock=self.clock, workers=2)
+        lock = threading.Lock()
+        running: List[int] = []
+        peak: List[int] = []
+
+        def fetch() -> dict:
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+            return dict(PRICE)
+
+        for number in range(5):
+            cache.get(f"Case {number}", "EURO", fetch)
+        self.clock.now += 90
+        for number in range(5):
+            cache.get(f"Case {number}", "EURO", fetch)
+        deadline = time.monotonic() + 5
+        while cache.stats.refreshes < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(cache.stats.refreshes, 5)
+        self.assertLessEqual(max(peak), 2)
+
+    def test_no_refresh_after_close(self) -> None:
+        self.cache.get("Case", "EURO", self.fetch)
+        self.cache.close()
+        self.clock.now += 90
+        self.assertEqual(self.cache.get("Case", "EURO", self.fetch)["call"], 1)
+        self.assertEqual((self.fetch.calls, self.cache.stats.stale_hits, self.cache.stats.refreshes), (1, 1, 0))
+
+
+class TestPriceCacheAsync(IsolatedAsyncioTestCase):
+    async def test_stale_while_revalidate(self) -> None:
+        clock = FakeClock()
+        cache = PriceCache(ttl=60, stale_while_revalidate=120, clock=clock)
+        calls: List[float] = []
+
+        async def fetch() -> dict:
+            calls.append(clock.now)
+            return {**PRICE, "call": len(calls)}
+
+        self.assertEqual((await cache.get_async("Case", "EURO", fetch))["call"], 1)
+        clock.now += 90
+        self.assertEqual((await cache.get_async("Case", "EURO", fetch))["call"], 1)
+        # Let the background refresh run.
+        for _ in range(3):
+            await asyncio.sleep(0)
+        self.assertEqual((await cache.get_async("Case", "EURO", fetch))["call"], 2)
+        self.assertEqual(len(calls), 2)
+
+    async def test_close_waits_for_refresh_tasks(self) -> None:
+        clock = FakeClock()
+        cache = PriceCache(ttl=60, stale_while_revalidate=120, clock=clock)
+        release = asyncio.Event()
+        calls: List[float] = []
+
+        async def fetch() -> dict:
+            if calls:
+                await release.wait()
+            calls.append(clock.now)
+            return {**PRICE, "call": len(calls)}
+
+        await cache.get_async("Case", "EURO", fetch)
+        clock.now += 90
+        await cache.get_async("Case", "EURO", fetch)
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        await cache.close_async()
+        self.assertEqual(cache.stats.refreshes, 1)
+        self.assertEqual((await cache.get_async("Case", "EURO", fetch))["call"], 2)
+
+
+class TestPriceCacheConfig(TestCase):
+    def test_defaults_follow_the_sell_interval(self) -> None:
+        cache = PriceCache.from_config(None, sell_interval=300)
+        self.assertEqual((cache.ttl, cache.stale_while_revalidate), (300, 600))
+        cache.close()
+        cache = PriceCache.from_config(None, sell_interval=10)
+        self.assertEqual((cache.ttl, cache.stale_while_revalidate), (60, 120))
+        cache.close()
+
+    def test_warns_when_prices_expire_between_loops(self) -> None:
+        with self.assertLogs("steam_inv_dumper.utils.price_cache", level="WARNING"):
+            PriceCache.from_config({"ttl": 60, "stale_while_revalidate": 120}, sell_interval=300).close()
+        # Enough with the default stale_while_revalidate.
+        cache = PriceCache.from_config({"ttl": 60}, sell_interval=300)
+        self.assertEqual(cache.stale_while_revalidate, 600)
+        cache.close()
+
+
+class PriceMarket:
+    currency = Currency.EURO
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def get_item_price(self, market_hash_name: str) -> dict:
+        self.calls += 1
+        return dict(PRICE)
+
+
+class TestPersistedPriceCache(TestCase):
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.config = {**config, "price_cache": {"ttl": 60}}
+        self.db = Database(config=config)
+        self.db.CachedPrice.query.delete()
+
+    def tearDown(self) -> None:
+        self.db.CachedPrice.query.delete()
+
+    def test_prices_survive_restarts(self) -> None:
+        market = PriceMarket()
+        exchange = Exchange(
+            config=self.config,
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=market,  # type: ignore[arg-type]
+            database=self.db,
+        )
+        self.assertEqual(exchange.get_item_price("Case"), 241)
+        self.assertEqual(exchange.get_item_price("Case"), 241)
+        self.assertEqual(market.calls, 1)
+        self.assertEqual(exchange.price_cache.persist(), 1)
+        self.assertEqual(exchange.price_cache.persist(), 0)
+
+        restarted = Exchange(
+            config=self.config,
+            inventory_provider=None,  # type: ignore[arg-type]
+            market_provider=market,  # type: ignore[arg-type]
+            database=self.db,
+        )
+        self.assertEqual(restarted.price_cache.restore(), 1)
+        self.assertEqual(restarted.get_item_price("Case"), 241)
+        self.assertEqual(market.calls, 1)
+
+        # Saving again replaces the stored price.
+        restarted.price_cache.put(("Case", "EURO"), {**PRICE, "lowest_price": "3,00€"})
+        restarted.price_cache.persist()
+        self.assertEqual(self.db.CachedPrice.query.count(), 1)
@@ -0,0 +1,112 @@
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from multiprocessing.queues import Queue
+from pathlib import Path
+from typing import List
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from steam_inv_dumper.utils.rate_limiter import (
+    DEFAULT_RATE_LIMITS,
+    RateLimit,
+    RateLimiter,
+    _FileLock,
+    parse_rate_limits,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def _acquire_times(state_file: str, calls: int, queue: "Queue[float]") -> None:
+    limiter = RateLimiter(limits=[RateLimit(calls=1, period=0.1)], state_file=state_file)
+    for _ in range(calls):
+        limiter.acquire()
+        queue.put(time.time())
+
+
+class TestRateLimiter(TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(limits=DEFAULT_RATE_LIMITS, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_windows(self) -> None:
+        times: List[float] = []
+        for _ in range(80):
+            self.limiter.acquire()
+            times.append(self.clock.now - 1000)
+        # One every 3 seconds until the minute bucket of 15 runs dry, then 15 a minute.
+        self.assertEqual(times[:3], [0, 3, 6])
+        self.assertEqual([round(t - s, 6) for s, t in zip(times[-4:], times[-3:])], [4, 4, 4])
+        self.assertEqual(self.limiter.stats.acquired, 80)
+        self.assertEqual(self.limiter.stats.waited, 79)
+        self.assertAlmostEqual(self.limiter.stats.total_wait, times[-1])
+
+    def test_non_blocking(self) -> None:
+        self.assertTrue(self.limiter.try_acquire())
+        self.assertFalse(self.limiter.try_acquire())
+        self.assertAlmostEqual(self.limiter.time_until_available(), 3)
+        self.assertFalse(self.limiter.acquire(timeout=2))
+        self.assertEqual(self.limiter.stats.rejected, 2)
+        self.assertEqual(self.clock.now, 1000)
+        self.clock.sleep(3)
+        self.assertTrue(self.limiter.try_acquire())
+
+    def test_parse_rate_limits(self) -> None:
+        self.assertEqual(parse_rate_limits(None), DEFAULT_RATE_LIMITS)
+        self.assertEqual(parse_rate_limits([[2, 5]]), (RateLimit(calls=2, period=5.0),))
+        with self.assertRaises(ValueError):
+            parse_rate_limits([[0, 5]])
+
+    def test_state_file_is_shared_between_processes(self) -> None:
+        state_file = str(Path(tempfile.mkdtemp()) / "ratelimit.json")
+        queue: "Queue[float]" = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_acquire_times, args=(state_file, 3, queue)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        times = sorted(queue.get() for _ in range(6))
+        # A burst of one then one every 0.1 seconds, whatever the process.
+        self.assertGreaterEqual(times[-1] - times[0], 0.45)
+
+
+class TestRateLimiterAsync(IsolatedAsyncioTestCase):
+    async def test_acquire_async(self) -> None:
+        limiter = RateLimiter(limits=[RateLimit(calls=2, period=0.2)])
+        begin = time.monotonic()
+        await asyncio.gather(*(limiter.acquire_async() for _ in range(5)))
+        # Burst of 2, then one every 0.1 seconds.
+        self.assertGreaterEqual(time.monotonic() - begin, 0.29)
+        self.assertEqual(limiter.stats.acquired, 5)
+
+    async def test_file_lock_does_not_block_the_loop(self) -> None:
+        state_file = Path(tempfile.mkdtemp()) / "ratelimit.json"
+        limiter = RateLimiter(limits=[RateLimit(calls=1, period=1)], state_file=state_file)
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        # Held as another process would: acquire_async waits for it.
+        with _FileLock(state_file)():
+            acquire = asyncio.create_task(limiter.acquire_async())
+            await asyncio.sleep(0.2)
+            self.assertFalse(acquire.done())
+            self.assertGreater(ticks, 5)
+        await acquire
+        ticker.cancel()
+        self.assertEqual(limiter.stats.acquired, 1)
@@ -0,0 +1,109 @@
+import io
+from datetime import datetime
+from unittest import TestCase
+
+from constants import TEST_ITEM_KWARGS
+from sqlalchemy import column
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.sql.expression import Select
+from test_database import clean_all_db
+
+from steam_inv_dumper.cli import REPORT_NAMES, parse_args
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.db.reports import (
+    REPORTS,
+    active_listings,
+    report_columns,
+    revenue_per_day,
+    sales_summary,
+    seconds_between,
+    stream_report,
+    time_to_sell,
+)
+from steam_inv_dumper.main import write_report
+from steam_inv_dumper.utils.configuration import load_config
+
+# item_id: (account, market_hash_name, you_receive, created, sold)
+LISTINGS = {
+    "1": ("test", "Chroma 2 Case", 100, datetime(2023, 1, 1, 10), datetime(2023, 1, 1, 12)),
+    "2": ("test", "Chroma 2 Case", 120, datetime(2023, 1, 1, 10), datetime(2023, 1, 2, 10)),
+    "3": ("test", "Snakebite Case", 30, datetime(2023, 1, 2, 10), datetime(2023, 1, 2, 11)),
+    "4": ("test", "Snakebite Case", 35, datetime(2023, 1, 3, 10), None),
+    "5": ("other", "Chroma 2 Case", 110, datetime(2023, 1, 1, 10), datetime(2023, 1, 3, 10)),
+}
+
+
+class TestReports(TestCase):
+    def setUp(self) -> None:
+        config = load_config("test_config.json").unwrap()
+        self.db = Database(config=config)
+        clean_all_db(self.db)
+        session = self.db.Item.query.session
+        for item_id, (account, market_hash_name, you_receive, created, sold) in LISTINGS.items():
+            listing_id = f"listing{item_id}"
+            item_kwargs = dict(item_id=item_id, account=account, market_hash_name=market_hash_name)
+            session.add(self.db.Item(**{**TEST_ITEM_KWARGS, **item_kwargs}))
+            session.add(
+                self.db.Listing(item_id=item_id, listing_id=listing_id, you_receive=you_receive, buyer_pay=you_receive)
+            )
+            session.flush()
+            events = [("ListingCreated", created)] + ([("ListingSold", sold)] if sold else [])
+            for event_type, event_datetime in events:
+                session.add(
+                    self.db.Event(
+                        listing_id=listing_id,
+                        event_type=event_type,
+                        event_datetime=event_datetime,
+                        time_event_fraction=0,
+                        steam_id_actor="1",
+                    )
+                )
+                session.flush()
+
+    def tearDown(self) -> None:
+        clean_all_db(self.db)
+
+    def rows(self, statement: Select) -> list:
+        return list(stream_report(self.db.engine, statement, chunk_size=2))
+
+    def test_sales_summary(self) -> None:
+        rows = self.rows(sales_summary(account="test"))
+        self.assertEqual([row[:3] for row in rows], [("Chroma 2 Case", 2, 220), ("Snakebite Case", 1, 30)])
+        since = self.rows(sales_summary(since=datetime(2023, 1, 2)))
+        self.assertEqual([row[:3] for row in since], [("Chroma 2 Case", 2, 230), ("Snakebite Case", 1, 30)])
+
+    def test_revenue_per_day(self) -> None:
+        rows = self.rows(revenue_per_day())
+        self.assertEqual(
+            [(str(day), sold, you_receive) for day, sold, you_receive, buyer_pay in rows],
+            [("2023-01-01", 1, 100), ("2023-01-02", 2, 150), ("2023-01-03", 1, 110)],
+        )
+
+    def test_active_listings(self) -> None:
+        rows = self.rows(active_listings())
+        columns = ["market_hash_name", "listing_id", "buyer_pay", "you_receive", "listed_at"]
+        self.assertEqual(report_columns(active_listings()), columns)
+        self.assertEqual(rows, [("Snakebite Case", "listing4", 35, 35, datetime(2023, 1, 3, 10))])
+
+    def test_time_to_sell(self) -> None:
+        rows = self.rows(time_to_sell(account="test"))
+        self.assertEqual(rows, [("Snakebite Case", 1, 3600, 3600, 3600), ("Chroma 2 Case", 2, 46800, 7200, 86400)])
+
+    def test_report_csv(self) -> None:
+        output = io.StringIO()
+        write_report(self.db, "sales", account="other", output=output)
+        header, row = output.getvalue().splitlines()
+        self.assertEqual(header, "market_hash_name,sold,you_receive,buyer_pay,avg_you_receive,last_sold_at")
+        self.assertEqual(row, "Chroma 2 Case,1,110,110,110.0,2023-01-03 10:00:00")
+
+    def test_report_command(self) -> None:
+        self.assertEqual(set(REPORT_NAMES), set(REPORTS))
+        args = parse_args(["report", "time-to-sell", "--since", "2023-01-02"])
+        self.assertEqual((args.command, args.name, args.since), ("report", "time-to-sell", datetime(2023, 1, 2)))
+
+
+class TestSecondsBetween(TestCase):
+    def test_dialects(self) -> None:
+        expression = seconds_between(column("created"), column("sold"))
+        self.assertEqual(str(expression.compile(dialect=postgresql.dialect())), "EXTRACT(EPOCH FROM (sold - created))")
+        self.assertEqual(str(expression.compile(dialect=mysql.dialect())), "TIMESTAMPDIFF(SECOND, created, sold)")
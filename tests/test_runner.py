@@ -0,0 +1,209 @@
+import os
+import signal
+from types import SimpleNamespace
+from typing import List, cast
+from unittest import TestCase
+
+from steam_inv_dumper.db.db import Database
+from steam_inv_dumper.markets.runner import ExchangeDaemon, MultiAccountRunner
+from steam_inv_dumper.utils.configuration import account_configs
+from steam_inv_dumper.utils.scheduler import Scheduler
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class FakeExchange:
+    def __init__(self, config: dict) -> None:
+        self.config = config
+        self.sales = 0
+
+    def sell(self) -> None:
+        if self.config.get("fail_sell"):
+            raise Exception("Steam is down")
+        self.sales += 1
+
+
+CONFIG = {
+    "db_url": "sqlite://",
+    "debug": True,
+    "market_sell_timeout": 100,
+    "account_stagger": 10,
+    "heartbeat_interval": 0,
+    "items_to_sell": {"Snakebite Case": {"min_price": 20, "quantity": 1}},
+    "accounts": [
+        {"username": "first"},
+        {"username": "second", "fail_sell": True},
+        {"username": "third", "fail_login": True},
+        {"username": "fourth", "market_sell_timeout": 50},
+    ],
+}
+
+
+def fake_exchange_factory(config: dict, database: Database) -> FakeExchange:
+    if config.get("fail_login"):
+        raise ValueError("The session files are corrupted or something.")
+    return FakeExchange(config)
+
+
+class FakeDaemonExchange:
+    def __init__(self) -> None:
+        self.inventory_cache = SimpleNamespace(refresh_interval=600)
+        self.calls: List[str] = []
+
+    def sell(self) -> None:
+        self.calls.append("sell")
+
+    def refresh_inventory(self) -> None:
+        self.calls.append("inventory")
+
+    def sync_history(self) -> None:
+        self.calls.append("history")
+
+    def close(self) -> None:
+        self.calls.append("close")
+
+    def heartbeat(self) -> None:
+        self.calls.append("heartbeat")
+
+
+class TestAccountConfigs(TestCase):
+    def test_accounts_override_shared_settings(self) -> None:
+        configs = account_configs(CONFIG)
+        self.assertEqual([config["username"] for config in configs], ["first", "second", "third", "fourth"])
+        self.assertEqual([config["market_sell_timeout"] for config in configs], [100, 100, 100, 50])
+        self.assertTrue(all("accounts" not in config for config in configs))
+        self.assertEqual(configs[0]["items_to_sell"], CONFIG["items_to_sell"])
+
+    def test_single_account(self) -> None:
+        config = {"username": "only"}
+        self.assertEqual(account_configs(config), [config])
+
+    def test_duplicated_accounts(self) -> None:
+        with self.assertRaises(ValueError):
+            account_configs({"accounts": [{"username": "first"}, {"username": "first"}]})
+
+    def test_account_without_username(self) -> None:
+        with self.assertRaisesRegex(ValueError, "without a username"):
+            account_configs({"accounts": [{"username": "first"}, {"password": "secret"}]})
+
+
+class TestMultiAccountRunner(TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.runner = MultiAccountRunner(
+            config=CONFIG,
+            database=None,  # type: ignore[arg-type]
+            scheduler=Scheduler(clock=self.clock, sleep=self.clock.sleep),
+            exchange_factory=fake_exchange_factory,  # type: ignore[arg-type]
+        )
+        self.runner.schedule()
+
+    def run_until(self, seconds: float) -> None:
+        while self.clock.now < seconds:
+            self.runner.scheduler.run_pending()
+            self.clock.sleep(self.runner.scheduler.idle_seconds())
+
+    def sales(self, username: str) -> int:
+        return cast(FakeExchange, self.runner.exchanges[username]).sales
+
+    def test_failures_are_isolated_per_account(self) -> None:
+        self.run_until(200)
+        self.assertEqual(self.sales("first"), 2)
+        self.assertEqual(self.sales("fourth"), 4)
+        self.assertEqual(self.sales("second"), 0)
+        self.assertNotIn("third", self.runner.exchanges)
+        failures = {job.name: job.consecutive_failures for job in self.runner.scheduler.jobs}
+        self.assertEqual(failures, {"sell first": 0, "sell second": 2, "sell third": 2, "sell fourth": 0})
+
+    def test_first_runs_are_staggered(self) -> None:
+        self.assertEqual([job.next_run for job in self.runner.scheduler.jobs], [0, 10, 20, 30])
+
+
+class TestScheduler(TestCase):
+    def test_failing_job_backs_off(self) -> None:
+        clock = FakeClock()
+        scheduler = Scheduler(clock=clock, sleep=clock.sleep)
+
+        def fail() -> None:
+            raise Exception("failed")
+
+        job = scheduler.add_job(name="fail", func=fail, interval=10, max_backoff=40)
+        delays = []
+        for _ in range(5):
+            scheduler.run_pending()
+            delays.append(scheduler.idle_seconds())
+            clock.sleep(scheduler.idle_seconds())
+        self.assertEqual(delays, [10, 20, 40, 40, 40])
+        self.assertEqual(job.consecutive_failures, 5)
+
+    def test_jitter_and_overruns(self) -> None:
+        clock = FakeClock()
+        scheduler = Scheduler(clock=clock, sleep=clock.sleep, random_fraction=lambda: 0.5)
+
+        def slow() -> None:
+            clock.sleep(15)
+
+        job = scheduler.add_job(name="slow", func=slow, interval=10, jitter=4)
+        scheduler.run_pending()
+        self.assertEqual((job.overruns, job.last_duration), (1, 15))
+        self.assertEqual(job.next_run, 15 + 10 + 2)
+
+    def test_stop_from_a_job(self) -> None:
+        clock = FakeClock()
+        scheduler = Scheduler(clock=clock, sleep=clock.sleep)
+        runs: List[str] = []
+
+        def first() -> None:
+            runs.append("first")
+            scheduler.stop()
+
+        scheduler.add_job(name="first", func=first, interval=10)
+        scheduler.add_job(name="second", func=lambda: runs.append("second"), interval=10)
+        scheduler.run_forever(handle_signals=False)
+        self.assertEqual(runs, ["first"])
+
+    def test_sigterm_stops_after_the_running_job(self) -> None:
+        scheduler = Scheduler()
+        runs: List[str] = []
+
+        def terminate() -> None:
+            os.kill(os.getpid(), signal.SIGTERM)
+            runs.append("terminate")
+
+        scheduler.add_job(name="terminate", func=terminate, interval=10)
+        previous = signal.getsignal(signal.SIGTERM)
+        scheduler.run_forever()
+        self.assertEqual(runs, ["terminate"])
+        self.assertIs(signal.getsignal(signal.SIGTERM), previous)
+
+
+class TestExchangeDaemon(TestCase):
+    def test_jobs_are_timed_independently(self) -> None:
+        clock = FakeClock()
+        exchange = FakeDaemonExchange()
+        config = {
+            "market_sell_timeout": 300,
+            "heartbeat_interval": 100,
+            "daemon": {"history_interval": 450, "jitter": 0},
+        }
+        daemon = ExchangeDaemon(
+            exchange=exchange,  # type: ignore[arg-type]
+            config=config,
+            scheduler=Scheduler(clock=clock, sleep=clock.sleep),
+        )
+        daemon.schedule()
+        while clock.now < 900:
+            daemon.scheduler.run_pending()
+            clock.sleep(daemon.scheduler.idle_seconds())
+        counts = {name: exchange.calls.count(name) for name in ("sell", "inventory", "history", "heartbeat")}
+        self.assertEqual(counts, {"sell": 3, "inventory": 1, "history": 1, "heartbeat": 9})
+        self.assertEqual(exchange.calls[:2], ["sell", "heartbeat"])
@@ -1,8 +1,16 @@
+from typing import List, Optional, Tuple
 from unittest import TestCase
 
+import requests
 from data import listings
+from steampy.models import Currency, GameOptions
+from test_async_market import _listing_hover, _listing_html
 
-from steam_inv_dumper.markets.steam.market import SteamMarketLimited
+from steam_inv_dumper.markets.steam.market import (
+    SteamMarketLimited,
+    iter_market_listings,
+)
+from steam_inv_dumper.utils.rate_limiter import RateLimiter
 
 
 class TestSteamLimited(TestCase):
@@ -16,3 +24,103 @@ class TestSteamLimited(TestCase):
             self.assertTrue(link["link"].startswith("steam://rungame"))
             self.assertTrue(isinstance(link["price"], int))
             self.assertTrue(isinstance(link["listingid"], str))
+
+
+class CountingLimiter(RateLimiter):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        self.calls += 1
+        return True
+
+
+class FakePriceMarket(SteamMarketLimited):
+    def fetch_price(self, item_hash_name: str, game: GameOptions, currency: str = "1") -> dict:
+        return {"success": True, "lowest_price": "2,42€", "volume": "7"}
+
+
+class FakeHistoryMarket(SteamMarketLimited):
+    def _fetch_market_history_page(self, start: int, count: int) -> dict:
+        return {"total_count": 5, "events": []}
+
+
+class TestRateLimitedMethods(TestCase):
+    def setUp(self) -> None:
+        self.limiter = CountingLimiter()
+        self.market = FakePriceMarket(
+            session=requests.Session(),
+            steamguard={"steamid": "7656"},
+            session_id="session",
+            currency=Currency.EURO,
+            rate_limiter=self.limiter,
+        )
+
+    def test_market_calls_are_rate_limited(self) -> None:
+        self.market.get_item_price("Chroma 2 Case")
+        self.market.get_item_price("Chroma 2 Case")
+        self.assertEqual(self.limiter.calls, 2)
+
+    def test_attribute_access_is_not_rate_limited(self) -> None:
+        self.market.currency, self.market._session, self.market.parse_listings_for_item
+        self.assertEqual(self.limiter.calls, 0)
+
+    def test_methods_are_wrapped_once(self) -> None:
+        for name in SteamMarketLimited.rate_limited_methods:
+            method = getattr(FakePriceMarket, name)
+            self.assertTrue(method.__rate_limited__)
+            self.assertFalse(getattr(method.__wrapped__, "__rate_limited__", False))
+
+    def test_market_history_pages_are_rate_limited(self) -> None:
+        market = FakeHistoryMarket(
+            session=requests.Session(),
+            steamguard={"steamid": "7656"},
+            session_id="session",
+            currency=Currency.EURO,
+            rate_limiter=self.limiter,
+        )
+        market.get_market_events(start=0, count=2)
+        market.get_new_market_events(cursor=None)
+        self.assertEqual(self.limiter.calls, 2)
+
+
+class CannedListingPages:
+    """
+    Pages of the mylistings/render endpoint over `total` listings, recording the (start, count) requested.
+    """
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.requests: List[Tuple[int, int]] = []
+
+    def __call__(self, start: int, count: int) -> dict:
+        self.requests.append((start, count))
+        listing_ids = [str(number) for number in range(self.total)][start : start + count]
+        return {
+            "success": True,
+            "total_count": self.total,
+            "results_html": "".join(_listing_html(listing_id) for listing_id in listing_ids),
+            "hovers": "".join(_listing_hover(listing_id) for listing_id in listing_ids),
+            "assets": {"730": {"2": {listing_id: {"id": listing_id} for listing_id in listing_ids}}},
+        }
+
+
+class TestIterMarketListings(TestCase):
+    def test_pages_until_total_count(self) -> None:
+        pages = CannedListingPages(total=5)
+        listing_ids = [listing_id for listing_id, listing in iter_market_listings(pages, page_size=2)]
+        self.assertEqual(listing_ids, ["0", "1", "2", "3", "4"])
+        self.assertEqual(pages.requests, [(0, 2), (2, 2), (4, 2)])
+
+    def test_stops_fetching_when_iteration_stops(self) -> None:
+        pages = CannedListingPages(total=5)
+        for listing_id, listing in iter_market_listings(pages, page_size=2):
+            if listing_id == "1":
+                break
+        self.assertEqual(pages.requests, [(0, 2)])
+
+    def test_empty_page_stops(self) -> None:
+        pages = CannedListingPages(total=0)
+        self.assertEqual(list(iter_market_listings(pages, page_size=2)), [])
+        self.assertEqual(pages.requests, [(0, 2)])
@@ -0,0 +1,37 @@
+import csv
+import gzip
+import importlib.util
+import tempfile
+from pathlib import Path
+from unittest import TestCase, skipUnless
+
+from steam_inv_dumper.utils.tabular_writers import table_format, write_table
+
+ROWS = [(number, f"Case {number}", number * 1.5) for number in range(25)]
+
+
+class TestTabularWriters(TestCase):
+    def setUp(self) -> None:
+        self.directory = Path(tempfile.mkdtemp())
+
+    def test_table_format(self) -> None:
+        formats = [table_format(name) for name in ("a.parquet", "a.csv.gz", "a.csv", "a")]
+        self.assertEqual(formats, ["parquet", "csv.gz", "csv", "csv"])
+
+    def test_gzip_csv_in_chunks(self) -> None:
+        path = self.directory / "rows.csv.gz"
+        self.assertEqual(write_table(path, ["id", "name", "price"], iter(ROWS), chunk_size=10), 25)
+        with gzip.open(path, "rt", newline="") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(rows[0], ["id", "name", "price"])
+        self.assertEqual(rows[-1], ["24", "Case 24", "36.0"])
+
+    @skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_parquet_in_chunks(self) -> None:
+        import pyarrow.parquet
+
+        path = self.directory / "rows.parquet"
+        write_table(path, ["id", "name", "price"], ROWS, chunk_size=10)
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(parquet_file.read().to_pydict()["name"][-1], "Case 24")
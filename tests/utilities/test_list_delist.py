@@ -7,6 +7,7 @@ from steam_inv_dumper.utils.data_structures import (
     InventoryItem,
     MarketActionType,
     MyMarketListing,
+    SkuIndex,
 )
 from steam_inv_dumper.utils.price_utils import (
     get_items_to_delist,
@@ -161,3 +162,37 @@ class TestItemListDelist(TestCase):
         self.assertEqual(how_many_can_list(5, 5, 10), 0)
         self.assertEqual(how_many_can_list(1, 5, 10), 4)
         self.assertEqual(how_many_can_list(1, 0, 10), 0)
+
+
+class TestSkuIndex(TestCase):
+    def _listing(self, listing_id: str, market_hash_name: str, buyer_pay: str) -> MyMarketListing:
+        return MyMarketListing.from_dict(
+            {
+                "listing_id": listing_id,
+                "buyer_pay": buyer_pay,
+                "you_receive": 0,
+                "created_on": "",
+                "need_confirmation": False,
+                "description": {**DESCRIPTION, "market_hash_name": market_hash_name, "id": listing_id},
+            }
+        )
+
+    def test_build(self) -> None:
+        items = [
+            InventoryItem.from_my_listing_dict({**DESCRIPTION, "market_hash_name": name, "id": item_id})
+            for item_id, name in [("1", "aaa"), ("2", "bbbb"), ("3", "aaa")]
+        ]
+        listings = [
+            self._listing("10", "aaa", "2,42€"),
+            self._listing("20", "aaa", "1,99€"),
+            self._listing("30", "bbbb", "5,00€"),
+        ]
+        index = SkuIndex.build(items=items, listings=listings)
+
+        self.assertEqual([item.item_id for item in index.items_for("aaa")], ["1", "3"])
+        self.assertEqual([listing.listing_id for listing in index.listings_for("aaa")], ["10", "20"])
+        self.assertEqual(index.min_listed_price_for("aaa"), 199)
+        self.assertEqual(index.min_listed_price_for("bbbb"), 500)
+        self.assertEqual(index.items_for("cccc"), [])
+        self.assertEqual(index.listings_for("cccc"), [])
+        self.assertEqual(index.min_listed_price_for("cccc"), 0)
@@ -1,6 +1,15 @@
 from unittest import TestCase
 
-from steam_inv_dumper.utils.steam_prices_utils import get_steam_fees_object
+import numpy as np
+
+from steam_inv_dumper.utils.steam_prices_utils import (
+    SteamFeesTable,
+    _compute_steam_fees_object,
+    amount_to_send_desired_received_amt,
+    get_buyer_pays_for_you_receive,
+    get_steam_fees_batch,
+    get_steam_fees_object,
+)
 
 
 class TestSteamFeeObjects(TestCase):
@@ -27,3 +36,47 @@ class TestSteamFeeObjects(TestCase):
         self.assertEqual(fees["money_to_ask"], 58831)
         self.assertEqual(type(fees["you_receive"]), int)
         self.assertEqual(type(fees["money_to_ask"]), int)
+
+
+class TestSteamFeesTable(TestCase):
+    def test_table_matches_computation(self) -> None:
+        table = SteamFeesTable(ceiling=5000)
+        table.precompute()
+        for price in range(0, 5001):
+            self.assertEqual(table.lookup(price), _compute_steam_fees_object(price))
+
+    def test_above_ceiling_falls_back(self) -> None:
+        table = SteamFeesTable(ceiling=10)
+        self.assertEqual(table.lookup(58831), _compute_steam_fees_object(58831))
+
+    def test_inverse_lookup(self) -> None:
+        for you_receive in range(1, 3000):
+            buyer_pays = get_buyer_pays_for_you_receive(you_receive)
+            self.assertEqual(get_steam_fees_object(buyer_pays)["you_receive"], you_receive)
+            self.assertLess(get_steam_fees_object(buyer_pays - 1)["you_receive"], you_receive)
+
+    def test_inverse_lookup_matches_computation(self) -> None:
+        table = SteamFeesTable()
+        for you_receive in range(0, table.lookup(table.ceiling)["you_receive"] + 1):
+            expected = int(amount_to_send_desired_received_amt(you_receive)["amount"])
+            self.assertEqual(table.buyer_pays_for(you_receive), expected)
+
+    def test_inverse_lookup_above_ceiling(self) -> None:
+        table = SteamFeesTable(ceiling=10)
+        self.assertEqual(table.buyer_pays_for(51159), int(amount_to_send_desired_received_amt(51159)["amount"]))
+        self.assertEqual(sum(table._filled), 1)
+
+
+class TestSteamFeesBatch(TestCase):
+    def test_batch_matches_scalar(self) -> None:
+        prices = np.concatenate([np.arange(0, 20000), np.array([58831, 123456, 9999999])])
+        fees = get_steam_fees_batch(prices)
+        for price, row in zip(prices, fees):
+            expected = _compute_steam_fees_object(int(price))
+            self.assertEqual({key: int(row[key]) for key in expected}, expected)
+
+    def test_batch_keeps_shape(self) -> None:
+        fees = get_steam_fees_batch(np.array([[3, 22], [58831, 10]]))
+        self.assertEqual(fees.shape, (2, 2))
+        self.assertEqual(int(fees["you_receive"][0][1]), 19)
+        self.assertEqual(int(fees["money_to_ask"][1][0]), 58831)
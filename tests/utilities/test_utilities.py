@@ -1,7 +1,10 @@
 from decimal import Decimal as D
 from unittest import TestCase
 
-from steam_inv_dumper.utils.steam_prices_utils import convert_string_prices
+from steam_inv_dumper.utils.steam_prices_utils import (
+    convert_string_prices,
+    convert_string_prices_batch,
+)
 
 
 class TestConversions(TestCase):
@@ -41,3 +44,28 @@ class TestConversions(TestCase):
         for price in prices:
             decimal_price = convert_string_prices(price)
             self.assertEqual(decimal_price, 231)
+
+    def test_convert_string_prices_locales(self) -> None:
+        prices = {
+            "1 234,56 pуб.": 123456,
+            "1\u00a0234,56€": 123456,
+            "R$ 1.234,56": 123456,
+            "$1,234.56 USD": 123456,
+            "CHF 1'234.56": 123456,
+            "¥ 1,234": 123400,
+            "Rp 1 234 567": 123456700,
+            "12.345₫": 1234500,
+            "₹ 1,23,456.78": 12345678,
+            "0,03€": 3,
+            "2,5€": 250,
+        }
+        for price, expected in prices.items():
+            self.assertEqual(convert_string_prices(price), expected, price)
+
+    def test_convert_string_prices_no_amount(self) -> None:
+        with self.assertRaises(ValueError):
+            convert_string_prices("USD")
+
+    def test_convert_string_prices_batch(self) -> None:
+        prices = ["2,42€", "", "4,234.35 USD", "2.-- HK$"]
+        self.assertEqual(convert_string_prices_batch(prices), [242, 0, 423435, 200])